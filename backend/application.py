@@ -1,16 +1,39 @@
-from flask import Flask, request, jsonify, redirect, send_from_directory
+from flask import Flask, request, jsonify, redirect, send_from_directory, url_for, make_response, g, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
 from dotenv import load_dotenv
 from enum import Enum
 from itsdangerous import URLSafeTimedSerializer
+from datetime import datetime, timezone
+import functools
+import hashlib
+import hmac
+import base64
+import json
+import mimetypes
 import os
-import uuid
+import re
 import sys
-import requests
+import tempfile
+import time
+import uuid
 from werkzeug.utils import secure_filename
-import psycopg2
-import psycopg2.extras
+from werkzeug.security import safe_join
+import db
+import cache
+import changes
+import archive
+import payloads
+import resumable
+import snapshot
+import jobs
+import media
+import metrics
+import storage
+import youtube
+from db import bump_content_version, get_db_connection, tuple_cursor
+from payloads import parse_bool
+from models import Post, POST_COLUMNS, POST_SELECT, posts_from_rows
 
 
 load_dotenv()
@@ -30,6 +53,16 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# how /uploads is served: "" streams from the worker, "x-sendfile" (Apache,
+# lighttpd) or "x-accel" (nginx) hand the byte transfer to the front server
+MEDIA_SENDFILE = os.environ.get("MEDIA_SENDFILE", "")
+# nginx internal location aliased to UPLOAD_FOLDER, used with x-accel
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-uploads/")
+MEDIA_MAX_AGE = 365 * 24 * 3600
+# uploads are named by their content hash (uuid4().hex for older ones),
+# so a given URL never changes content
+IMMUTABLE_MEDIA_RE = re.compile(r'^[0-9a-f]{32,}(_\d+)?\.[a-z0-9]+$')
+
 CORS(app, resources={
     r"/api/*": {
         "origins": [
@@ -37,7 +70,8 @@ CORS(app, resources={
             "http://127.0.0.1:5173"
         ],
         "supports_credentials": True,
-        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
+        "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "Upload-Offset"],
+        "expose_headers": ["X-Next-Cursor", "Link"]
     }
 })
 
@@ -49,7 +83,36 @@ s = URLSafeTimedSerializer(app.secret_key)
 
 
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")  
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+# lets a scraper read the stats endpoints and /metrics without logging in,
+# as "Authorization: Bearer <token>"; unset means admin session only
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+POSTS_PAGE_DEFAULT = 20
+POSTS_PAGE_MAX = 100
+SEARCH_MAX_OFFSET = 1000
+# post ids one batch request may touch, summed over its operations
+BATCH_MAX_IDS = 1000
+# fields a batch patch may set; media changes need per-post processing, so
+# they still go through PUT /api/posts/<id>
+BATCH_PATCH_FIELDS = ('title', 'blurb', 'writeup', 'is_visible')
+SEARCH_HEADLINE_OPTIONS = 'MaxFragments=2, MaxWords=30, MinWords=10, StartSel=<mark>, StopSel=</mark>'
+
+# fields a client may request through ?fields=; has_writeup lets the feed
+# know whether to link to the full post without downloading the writeup
+POST_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'blurb': 'blurb',
+    'writeup': 'writeup',
+    'media_type': 'media_type',
+    'media_href': 'media_href',
+    'timestamp': 'timestamp',
+    'is_visible': 'is_visible',
+    'embeddable': 'embeddable',
+    'media_meta': 'media_meta',
+    'has_writeup': "(writeup IS NOT NULL AND writeup <> '') AS has_writeup",
+}
+DEFAULT_POST_FIELDS = list(POST_COLUMNS)
 
 app.config.update(
     SESSION_COOKIE_SAMESITE="Lax",
@@ -57,28 +120,6 @@ app.config.update(
     SESSION_COOKIE_DOMAIN=None
 )
 
-class Post:
-    def __init__(self, id, title, blurb, writeup, media_type, media_href, timestamp, is_visible):
-        self.id = id
-        self.title = title
-        self.blurb = blurb
-        self.writeup = writeup
-        self.media_type = media_type
-        self.media_href = media_href
-        self.timestamp = timestamp
-        self.is_visible = is_visible
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'blurb': self.blurb,
-            'writeup': self.writeup,
-            'media_type': self.media_type,
-            'media_href': self.media_href,
-            'timestamp': self.timestamp,
-            'is_visible': self.is_visible
-        }
-
 class MediaType(Enum):
     VIDEO = "video"
     IMAGE = "image"
@@ -100,71 +141,80 @@ class About:
         self.body = body
         self.last_updated = last_updated
 
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def local_upload_url(key, token):
+    return url_for('local_upload', key=key, token=token, _external=True)
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=os.environ.get("DB_HOST"),
-        user=os.environ.get("DB_USER"),
-        password=os.environ.get("DB_PASS"),
-        dbname=os.environ.get("DB_NAME"),
-        port=os.environ.get("DB_PORT", 5432),
-        cursor_factory=psycopg2.extras.RealDictCursor
-    )
-    return conn
+# where uploaded media lives; with STORAGE_BACKEND=s3 the browser PUTs
+# straight to the bucket and media bytes never pass through our workers
+upload_storage = storage.from_env(UPLOAD_FOLDER, app.secret_key, local_upload_url)
 
-def init_db():
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
+# side effects of post writes, run by the job worker (worker.py) after commit
+@jobs.handler('media.process')
+def process_media_job(payload):
+    media.process_post_media(upload_storage, payload['post_id'], payload['media_type'], payload['media_href'])
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS posts (
-                    id SERIAL PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    blurb TEXT,
-                    writeup TEXT,
-                    media_type TEXT NOT NULL,
-                    media_href TEXT,
-                    timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    is_visible BOOLEAN DEFAULT TRUE NOT NULL
-                );
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS posts_timestamp_idx
-                ON posts (timestamp DESC);
-            """)
+@jobs.handler('media.delete')
+def delete_media_job(payload):
+    media.delete_media(upload_storage, payload['hrefs'])
 
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS posts_visibility_idx
-                ON posts (is_visible);
-            """)
+@jobs.handler('post.check_embed')
+def check_embed_job(payload):
+    media.check_post_embed(payload['post_id'], payload['media_href'])
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS about (
-                    id SERIAL PRIMARY KEY,
-                    header TEXT,
-                    body TEXT,
-                    last_updated TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
-            
-            cursor.execute("SELECT COUNT(*) FROM about")
-            count = cursor.fetchone()["count"]
+@jobs.handler('snapshot.publish')
+def publish_snapshot_job(payload):
+    return snapshot.publish(payload['post_ids'], payload['about'], payload['full'])
 
-            if count == 0:
-                cursor.execute(
-                    "INSERT INTO about (header, body) VALUES (%s, %s)",
-                    ("", "")
-                )
-            conn.commit()
-    return True
+@jobs.handler('changes.prune', every=changes.CHANGES_PRUNE_INTERVAL)
+def prune_changes_job(payload):
+    return {'deleted': changes.prune()}
+
+@jobs.handler('media.gc', every=media.MEDIA_GC_INTERVAL)
+def media_gc_job(payload):
+    report = media.collect_garbage(upload_storage, dry_run=payload.get('dry_run', False))
+    print("Media GC:", report, file=sys.stderr)
+    return report
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-init_db()
+def reads_pinned_to_primary():
+    """True for a session that wrote recently, so it reads its own writes.
+    Only a request carrying a session cookie looks, so public reads don't
+    pick up Vary: Cookie."""
+    if app.session_cookie_name not in request.cookies:
+        return False
+    return session.get('primary_until', 0) > time.time()
+
+def read_connection():
+    # one replica per request: a replica only moves forward, so rows read
+    # after the content version are never older than the version they're
+    # served under
+    if 'read_replica' not in g:
+        # the admin edits what it reads, so it never reads a lagging replica
+        pinned = current_user.is_authenticated or reads_pinned_to_primary()
+        g.read_replica = None if pinned else db.choose_replica()
+    return db.get_read_connection(g.read_replica)
+
+def use_response_cache():
+    # a replica may have filled the cache with rows from before this
+    # session's own write
+    return not (db.DB_REPLICAS and reads_pinned_to_primary())
+
+def cache_ttl(tags):
+    """TTL for an entry built in this request, None for the default.
+
+    Rows read from a replica just after a write may predate it, so such an
+    entry only lives until the replica has surely caught up.
+    """
+    if g.get('read_replica') is not None and \
+            cache.get_cache().invalidated_within(tags, db.DB_STICKY_SECONDS):
+        return db.DB_STICKY_SECONDS
+    return None
 
 def get_about():
-    with get_db_connection() as conn:
+    with read_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute('SELECT id, header, body, last_updated FROM about')
             row = cursor.fetchone()
@@ -180,38 +230,284 @@ def get_about():
         return None
 
 
-def get_post_by_id(post_id):
-    with get_db_connection() as conn:
+def fetch_post(cursor, post_id, include_hidden=True, lock=False):
+    query = POST_SELECT + ' WHERE id = %s'
+    if not include_hidden:
+        query += ' AND is_visible'
+    if lock:
+        query += ' FOR UPDATE'
+    cursor.execute(query, (post_id,))
+    row = cursor.fetchone()
+    return Post.from_row(row) if row else None
+
+def get_post_by_id(post_id, include_hidden=False):
+    with read_connection() as conn:
+        with tuple_cursor(conn) as cursor:
+            return fetch_post(cursor, post_id, include_hidden)
+
+
+def get_all_posts(limit=None, cursor=None, fields=None, include_hidden=False):
+    """Return (posts, next_cursor) newest first; limit=None returns every post."""
+    projected = fields is not None
+    fields = fields or DEFAULT_POST_FIELDS
+    # id and timestamp are always fetched so we can build the next cursor
+    selected = list(dict.fromkeys(fields + ['id', 'timestamp']))
+    columns = ', '.join(POST_FIELDS[f] for f in selected)
+
+    conditions = []
+    params = []
+    if not include_hidden:
+        conditions.append('is_visible')
+    if cursor:
+        conditions.append('(timestamp, id) < (%s, %s)')
+        params.extend(cursor)
+
+    query = f'SELECT {columns} FROM posts'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY timestamp DESC, id DESC'
+    if limit is not None:
+        # fetch one extra row to find out whether another page exists
+        query += ' LIMIT %s'
+        params.append(limit + 1)
+
+    with read_connection() as conn:
+        with tuple_cursor(conn) as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[selected.index('timestamp')], last[selected.index('id')])
+
+    if not projected:
+        # selected is exactly POST_COLUMNS here, so rows map straight onto Post
+        return posts_from_rows(rows), next_cursor
+    positions = [selected.index(f) for f in fields]
+    posts = [{f: row[i] for f, i in zip(fields, positions)} for row in rows]
+    return posts, next_cursor
+
+def search_posts(q, limit, offset=0, include_hidden=False):
+    """Return one page of posts matching q, best match first, with snippets."""
+    visibility = '' if include_hidden else 'AND is_visible'
+    # rank and page inside the GIN-indexed subquery; ts_headline is costly so
+    # it only runs over the rows actually returned
+    query = f'''
+        SELECT id, title, blurb, media_type, media_href, timestamp, is_visible, rank,
+               ts_headline('english', concat_ws(' ', blurb, writeup), query, %s) AS snippet
+        FROM (
+            SELECT posts.*, query, ts_rank_cd(search_vector, query) AS rank
+            FROM posts, websearch_to_tsquery('english', %s) AS query
+            WHERE search_vector @@ query {visibility}
+            ORDER BY rank DESC, id DESC
+            LIMIT %s OFFSET %s
+        ) AS matches
+        ORDER BY rank DESC, id DESC
+    '''
+    with read_connection() as conn:
         with conn.cursor() as cursor:
-            cursor.execute('SELECT id, title, blurb, writeup, media_type, media_href, timestamp, is_visible FROM posts WHERE id = %s', (post_id,))
+            # one extra row tells us whether there is another page
+            cursor.execute(query, (SEARCH_HEADLINE_OPTIONS, q, limit + 1, offset))
+            rows = cursor.fetchall()
+    return rows[:limit], len(rows) > limit
+
+def get_content_version(name):
+    """Return (version, updated_at) for 'posts' or 'about'.
+
+    Always read from the database: a copy cached in this process misses
+    writes other workers made, and would answer 304 for stale content.
+    """
+    with read_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT version, updated_at FROM content_versions WHERE name = %s', (name,))
             row = cursor.fetchone()
-    if row:
-        post = Post(
-            row['id'],
-            row['title'],
-            row['blurb'],
-            row['writeup'],
-            row['media_type'],
-            row['media_href'],
-            row['timestamp'],
-            row['is_visible']
-        )
-        return post
-    else:
-        return None
-
+    return (row['version'], row['updated_at']) if row else (0, None)
 
-def get_all_posts():
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute('SELECT id, title, blurb, writeup, media_type, media_href, timestamp, is_visible FROM posts ORDER BY timestamp DESC')
-            posts = [Post(row['id'], row['title'], row['blurb'], row['writeup'], row['media_type'], row['media_href'], row['timestamp'], row['is_visible']) for row in cursor.fetchall()]
-    return posts
+def encode_cursor(timestamp, post_id):
+    raw = json.dumps([timestamp.isoformat(), post_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
 
-def parse_bool(value, default=True):
-    if value is None:
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        timestamp, post_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(post_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def parse_limit(value, default=None):
+    if value is None or value == '':
         return default
-    return str(value).lower() in ("true", "1", "yes", "on")
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("Invalid limit")
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    return min(limit, POSTS_PAGE_MAX)
+
+def parse_fields(value):
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in POST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+def parse_batch(data):
+    """Validate a batch body into [(op, ids, values)], op being 'update' or 'delete'."""
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("operations must be a non-empty list")
+
+    parsed = []
+    total = 0
+    for i, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            raise ValueError(f"operations[{i}] must be an object")
+        ids = operation.get('ids')
+        if not isinstance(ids, list) or not ids or \
+                not all(isinstance(id, int) and not isinstance(id, bool) for id in ids):
+            raise ValueError(f"operations[{i}].ids must be a non-empty list of post ids")
+        total += len(ids)
+
+        op = operation.get('op')
+        if op == 'set_visibility':
+            if 'is_visible' not in operation:
+                raise ValueError(f"operations[{i}].is_visible is required")
+            parsed.append(('update', sorted(set(ids)), {'is_visible': parse_bool(operation['is_visible'])}))
+        elif op == 'patch':
+            fields = operation.get('fields')
+            if not isinstance(fields, dict) or not fields:
+                raise ValueError(f"operations[{i}].fields must be a non-empty object")
+            unknown = set(fields) - set(BATCH_PATCH_FIELDS)
+            if unknown:
+                raise ValueError(f"operations[{i}] cannot patch {', '.join(sorted(unknown))}")
+            if 'title' in fields and not fields['title']:
+                raise ValueError(f"operations[{i}] cannot clear the title")
+            values = dict(fields)
+            if 'is_visible' in values:
+                values['is_visible'] = parse_bool(values['is_visible'])
+            parsed.append(('update', sorted(set(ids)), values))
+        elif op == 'delete':
+            parsed.append(('delete', sorted(set(ids)), None))
+        else:
+            raise ValueError(f"operations[{i}].op must be set_visibility, patch or delete")
+
+    if total > BATCH_MAX_IDS:
+        raise ValueError(f"A batch may touch at most {BATCH_MAX_IDS} post ids")
+    return parsed
+
+def wants_hidden():
+    # hidden posts are only ever returned to the logged-in admin who asks for them
+    return current_user.is_authenticated and parse_bool(request.args.get('include_hidden'), False)
+
+def to_http_date(value):
+    # HTTP dates have second precision and werkzeug compares them as naive UTC
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(microsecond=0)
+
+def conditional_response(name, variant, build):
+    """Answer If-None-Match / If-Modified-Since from the content version alone."""
+    version, updated_at = get_content_version(name)
+    g.content_version = version
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    etag = f"{name}-{version}-{digest}"
+    last_modified = to_http_date(updated_at)
+
+    # each content-coding is its own representation, so it gets its own strong tag
+    candidates = [etag] + [f"{etag}-{encoding}" for encoding in payloads.ENCODINGS]
+    matched = None
+    if request.if_none_match:
+        matched = next((c for c in candidates if request.if_none_match.contains_weak(c)), None)
+    else:
+        since = to_http_date(request.if_modified_since)
+        if since is not None and last_modified is not None and last_modified <= since:
+            matched = etag
+
+    if matched:
+        response = app.response_class(status=304)
+        response.vary.add('Accept-Encoding')
+        etag = matched
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+        if response.content_encoding:
+            etag = f"{etag}-{response.content_encoding}"
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def cached_response(key, tags, build):
+    """Serve a public read from the response cache, filling it on a miss."""
+    response_cache = cache.get_cache()
+    if 'content_version' in g:
+        # a body cached under an older version is never served for a newer
+        # one, even if this worker missed the invalidation
+        key = f"{key}@{g.content_version}"
+    payload = response_cache.get(key) if use_response_cache() else None
+    if payload is None:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+        headers = [(k, v) for k, v in response.headers.items() if k.lower() != 'content-length']
+        payload = payloads.Payload(response.get_data(), headers)
+        response_cache.set(key, payload, tags, ttl=cache_ttl(tags))
+    # compressed variants are produced once per cached body, not per request
+    return payload.to_response()
+
+@app.before_request
+def start_request_metrics():
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_stats = metrics.start_request()
+
+@app.after_request
+def stick_to_primary(response):
+    # read-your-writes: with replicas, an admin who just changed something
+    # reads from the primary until the replicas have surely caught up
+    if db.DB_REPLICAS and request.method in ('POST', 'PUT', 'PATCH', 'DELETE') \
+            and response.status_code < 400 and current_user.is_authenticated:
+        session['primary_until'] = time.time() + db.DB_STICKY_SECONDS
+    return response
+
+@app.after_request
+def finish_request_metrics(response):
+    metrics.finish_request()
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    # the URL rule, not the path, so /api/post/1 and /api/post/2 share a series
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    duration = metrics.record_request(request.method, route, response.status_code, stats)
+    response.headers['X-Request-ID'] = g.request_id
+    response.headers['Server-Timing'] = metrics.server_timing(duration, stats)
+    # the query string is left out, it can carry upload tokens
+    metrics.log_request(
+        request_id=g.request_id,
+        method=request.method,
+        path=request.path,
+        route=route,
+        status=response.status_code,
+        duration_ms=round(duration * 1000, 2),
+        db_ms=round(stats.db_seconds * 1000, 2),
+        db_queries=stats.db_queries,
+        http_ms=round(stats.http_seconds * 1000, 2),
+        http_calls=stats.http_calls,
+        bytes=response.content_length,
+        remote_addr=request.remote_addr,
+    )
+    return response
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -219,6 +515,19 @@ def load_user(user_id):
         return Admin()
     return None
 
+def stats_access_required(view):
+    """Operational stats name hosts and errors and some cost a query: the
+    admin, or a scraper holding METRICS_TOKEN, only."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            if not (METRICS_TOKEN and scheme.lower() == 'bearer'
+                    and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())):
+                return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json(silent=True)
@@ -239,20 +548,133 @@ def logout():
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+    if MEDIA_SENDFILE:
+        path = safe_join(app.config["UPLOAD_FOLDER"], filename)
+        if path is None or not os.path.isfile(path):
+            return jsonify({"error": "File not found"}), 404
+        # empty body; the front server sends the file and handles Range itself
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        if MEDIA_SENDFILE == 'x-accel':
+            response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + filename
+        else:
+            response.headers['X-Sendfile'] = path
+    else:
+        # conditional=True answers Range requests with 206 so audio can seek
+        response = send_from_directory(
+            app.config["UPLOAD_FOLDER"], filename, conditional=True, cache_timeout=MEDIA_MAX_AGE
+        )
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    if IMMUTABLE_MEDIA_RE.match(filename):
+        response.headers['Cache-Control'] = f'public, max-age={MEDIA_MAX_AGE}, immutable'
+    return response
 
 
 @app.route('/api/posts', methods=['GET'])
 def get_posts():
-    posts = get_all_posts()
-    return jsonify([post.to_dict() for post in posts])
+    try:
+        cursor = decode_cursor(request.args.get('cursor'))
+        # a cursor implies paging even if the client forgot the limit
+        limit = parse_limit(request.args.get('limit'), POSTS_PAGE_DEFAULT if cursor else None)
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    include_hidden = wants_hidden()
+
+    def build():
+        posts, next_cursor = get_all_posts(limit, cursor, fields, include_hidden)
+        response = payloads.json_response(posts)
+        if next_cursor:
+            args = {'limit': limit, 'cursor': next_cursor}
+            if fields:
+                args['fields'] = ','.join(fields)
+            if include_hidden:
+                args['include_hidden'] = 1
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = f'<{url_for("get_posts", **args)}>; rel="next"'
+        return response
+
+    key = f"posts:{limit}:{request.args.get('cursor') or ''}:{','.join(fields or [])}"
+    if include_hidden:
+        return conditional_response('posts', key + ':hidden', build)
+    return conditional_response('posts', key, lambda: cached_response(key, ('posts',), build))
+
+@app.route('/api/posts/search', methods=['GET'])
+def search():
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({"error": "Missing search query"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'), POSTS_PAGE_DEFAULT)
+        offset = int(request.args.get('offset') or 0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not 0 <= offset <= SEARCH_MAX_OFFSET:
+        return jsonify({"error": "Invalid offset"}), 400
+
+    include_hidden = wants_hidden()
+
+    def build():
+        results, has_more = search_posts(q, limit, offset, include_hidden)
+        response = payloads.json_response(results)
+        if has_more:
+            args = {'q': q, 'limit': limit, 'offset': offset + limit}
+            if include_hidden:
+                args['include_hidden'] = 1
+            response.headers['Link'] = f'<{url_for("search", **args)}>; rel="next"'
+        return response
+
+    key = f"search:{limit}:{offset}:{q}"
+    if include_hidden:
+        return conditional_response('posts', key + ':hidden', build)
+    return conditional_response('posts', key, lambda: cached_response(key, ('posts',), build))
+
+@app.route('/api/posts/changes', methods=['GET'])
+def post_changes():
+    """Server-Sent Events for every post created, updated or deleted after
+    ?since= (or the Last-Event-ID a reconnecting browser sends).
+
+    Visitors only get a stream with CHANGES_PUBLIC (gevent workers, where
+    a stream costs a greenlet rather than a thread); otherwise a 204 tells
+    their browser not to reconnect, and the page stays as it loaded."""
+    admin = current_user.is_authenticated
+    if not (admin or changes.CHANGES_PUBLIC):
+        return '', 204
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since and not since.isdigit():
+        return jsonify({"error": "Invalid since"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields')) or DEFAULT_POST_FIELDS
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        stream = changes.open_stream(int(since) if since else None, fields, wants_hidden(), admin)
+    except changes.TooManyStreams:
+        # answered at once, so it holds nothing; the browser retries later
+        stream = changes.overflow_body()
+
+    response = app.response_class(stream, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx would otherwise buffer the stream until it closes
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/post/<int:id>', methods=['GET'])
 def get_post(id):
-    post = get_post_by_id(id)
-    if not post:
-        return jsonify({"error": "Post not found"}), 404
-    return jsonify(post.to_dict())
+    include_hidden = wants_hidden()
+
+    def build():
+        post = get_post_by_id(id, include_hidden)
+        if not post:
+            return jsonify({"error": "Post not found"}), 404
+        return payloads.json_response(post)
+
+    key = f"post:{id}"
+    if include_hidden:
+        return conditional_response('posts', key + ':hidden', build)
+    return conditional_response('posts', key, lambda: cached_response(key, (key,), build))
 
 @app.route('/api/admin')
 @login_required
@@ -269,7 +691,9 @@ def check_auth():
 @app.route('/api/posts', methods=['POST'])
 @login_required
 def create_post():
-    data = request.form
+    # the admin UI uploads media via /api/uploads/presign and sends JSON;
+    # multipart form posts with the file attached still work
+    data = request.get_json(silent=True) or request.form
     files = request.files
 
     title = data.get('title') or None
@@ -284,49 +708,33 @@ def create_post():
 
 
     media_href = None
-    saved_file_path = None
-    if media_type == 'image' and image_file and allowed_file(image_file.filename):
-        filename = secure_filename(image_file.filename)
-
-        if not allowed_file(filename):
-            return jsonify({"error": "Invalid file type"}), 400
-
-        ext = filename.rsplit('.', 1)[1].lower()
-        filename = f"{uuid.uuid4().hex}.{ext}"
-
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        image_file.save(filepath)
-        saved_file_path = filepath
-
-        media_type = 'image'
-        media_href = f"http://localhost:5050/uploads/{filename}"
-    elif media_type == 'audio' and audio_file and allowed_file(audio_file.filename):
-        filename = secure_filename(audio_file.filename)
+    form_file = {'image': image_file, 'audio': audio_file}.get(media_type)
+    if form_file and allowed_file(form_file.filename):
+        filename = secure_filename(form_file.filename)
 
         if not allowed_file(filename):
             return jsonify({"error": "Invalid file type"}), 400
 
         ext = filename.rsplit('.', 1)[1].lower()
-        filename = f"{uuid.uuid4().hex}.{ext}"
 
-        filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        audio_file.save(filepath)
-        saved_file_path = filepath
-
-        media_type = 'audio'
-        media_href = f"http://localhost:5050/uploads/{filename}"
+        # stored under its content hash through the backend, so a repeat
+        # upload reuses the object and the href is one media GC can resolve
+        with tempfile.NamedTemporaryFile() as tmp:
+            form_file.save(tmp)
+            tmp.flush()
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            saved_key, _ = resumable.store_file(
+                upload_storage, tmp.name, resumable.file_sha256(tmp.name), ext, content_type
+            )
+        media_href = upload_storage.public_url(saved_key)
     else:
         media_type = data.get('media_type')
         media_href = data.get('media_href')
 
     # validate
     if not (title and (blurb or writeup or (media_type and media_href))):
-        # If we saved an uploaded file but validation failed, remove the file to avoid orphaned uploads
-        try:
-            if saved_file_path and os.path.exists(saved_file_path):
-                os.remove(saved_file_path)
-        except Exception:
-            pass
+        # an upload we just saved is left to media GC, which removes it after
+        # the grace period unless a post has taken it up by then
         return jsonify({"error": "Missing fields"}), 400
 
     try:
@@ -341,10 +749,18 @@ def create_post():
                     (title, blurb, writeup, media_type, media_href, is_visible)
                 )
                 new_id = cursor.fetchone()["id"]
+                bump_content_version(cursor, 'posts')
+                # embed checks and media processing happen in the job worker
+                media.schedule_post_media(cursor, new_id, media_type, media_href)
+                snapshot.schedule(cursor, [new_id])
                 conn.commit()
+    except db.PoolExhausted:
+        raise
     except Exception as e:
         return jsonify({"error": f"Failed to create post: {str(e)}"}), 500
 
+    cache.invalidate("posts")
+
     return jsonify({
         "id": new_id,
         "title": title,
@@ -352,36 +768,22 @@ def create_post():
         "writeup": writeup,
         "media_type": media_type,
         "media_href": media_href,
-        "is_visible": is_visible
+        "is_visible": is_visible,
+        "embeddable": None
     }), 201
 
 
 @app.route('/api/posts/<int:post_id>', methods=['PUT'])
 @login_required
 def update_post(post_id):
-    with get_db_connection() as conn:
-        with conn.cursor() as cursor:
+    data = request.get_json()
 
-            cursor.execute('SELECT id, title, blurb, writeup, media_type, media_href, timestamp, is_visible FROM posts WHERE id = %s', (post_id,))
-            row = cursor.fetchone()
+    with get_db_connection() as conn:
+        with tuple_cursor(conn) as cursor:
 
-            if row is None:
+            post = fetch_post(cursor, post_id, lock=True)
+            if post is None:
                 return jsonify({"error": "Post not found"}), 404
-            
-            if row:
-                post = Post(
-                    row['id'],
-                    row['title'],
-                    row['blurb'],
-                    row['writeup'],
-                    row['media_type'],
-                    row['media_href'],
-                    row['timestamp'],
-                    row['is_visible']
-                )
-
-
-            data = request.get_json()
 
             title = data.get("title", post.title)
             blurb = data.get("blurb", post.blurb)
@@ -390,16 +792,9 @@ def update_post(post_id):
             media_href = data.get("media_href", post.media_href)
             is_visible = parse_bool(data.get("is_visible"), True)
 
-            old_media_href = post.media_href
-
-            # Delete old media ONLY if it changed
-            if old_media_href and old_media_href.startswith("/uploads/") and old_media_href != media_href:
-                try:
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], old_media_href.split("/")[-1])
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                except Exception as e:
-                    print("File delete error:", e)
+            media_changed = media_href != post.media_href
+            # a changed video link is rechecked by the job worker
+            embeddable = post.embeddable if media_type == 'video' and not media_changed else None
 
             cursor.execute(
                 '''
@@ -409,7 +804,9 @@ def update_post(post_id):
                     writeup=%s,
                     media_type=%s,
                     media_href=%s,
-                    is_visible=%s
+                    is_visible=%s,
+                    embeddable=%s,
+                    media_meta=CASE WHEN media_href IS DISTINCT FROM %s THEN NULL ELSE media_meta END
                 WHERE id=%s
                 ''',
                 (
@@ -419,11 +816,23 @@ def update_post(post_id):
                     media_type,
                     media_href,
                     is_visible,
+                    embeddable,
+                    media_href,
                     post_id
                 )
             )
+            bump_content_version(cursor, 'posts')
+
+            # old files are only deleted once the new href is committed
+            if media_changed:
+                media.schedule_media_delete(cursor, post.media_href, post.media_meta)
+            if media_changed or (post.media_meta is None and post.embeddable is None):
+                media.schedule_post_media(cursor, post_id, media_type, media_href)
+            snapshot.schedule(cursor, [post_id])
             conn.commit()
 
+    cache.invalidate("posts", f"post:{post_id}")
+
     return jsonify({
         "id": post_id,
         "title": title,
@@ -431,7 +840,8 @@ def update_post(post_id):
         "writeup": writeup,
         "media_type": media_type,
         "media_href": media_href,
-        "is_visible": is_visible
+        "is_visible": is_visible,
+        "embeddable": embeddable
     })
 
 
@@ -440,43 +850,215 @@ def update_post(post_id):
 @login_required
 def delete_post(post_id):
     with get_db_connection() as conn:
-        with conn.cursor() as cursor:
-            
-            cursor.execute('SELECT id, title, blurb, writeup, media_type, media_href, timestamp, is_visible FROM posts WHERE id = %s', (post_id,))
-            row = cursor.fetchone()
+        with tuple_cursor(conn) as cursor:
 
-            if row is None:
+            post = fetch_post(cursor, post_id, lock=True)
+            if post is None:
                 return jsonify({"error": "Post not found"}), 404
-            
-            if row:
-                post = Post(
-                    row['id'],
-                    row['title'],
-                    row['blurb'],
-                    row['writeup'],
-                    row['media_type'],
-                    row['media_href'],
-                    row['timestamp'],
-                    row['is_visible']
-                )
 
-            
-
-            # Remove file if exists
-            if post.media_href and post.media_href.startswith("/uploads/"):
-                try:
-                    filepath = os.path.join(app.config["UPLOAD_FOLDER"], post.media_href.split("/")[-1])
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                except Exception as e:
-                    print("File delete error:", e)
             cursor.execute('DELETE FROM posts WHERE id=%s', (post_id,))
+            bump_content_version(cursor, 'posts')
+            media.schedule_media_delete(cursor, post.media_href, post.media_meta)
+            snapshot.schedule(cursor, [post_id])
             conn.commit()
 
+    cache.invalidate("posts", f"post:{post_id}")
+
     return jsonify({"message": "Post deleted"}), 200
 
 
-# Get API key from environment variable
+@app.route('/api/posts/batch', methods=['POST'])
+@login_required
+def batch_posts():
+    """Apply operations to many posts in one transaction, one set-based
+    statement each, in order; returns the final rows of the posts touched."""
+    try:
+        operations = parse_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    all_ids = sorted({id for _, ids, _ in operations for id in ids})
+    updated = {}
+    deleted = []
+    with get_db_connection() as conn:
+        with tuple_cursor(conn) as cursor:
+            # lock every row up front in id order, so concurrent batches
+            # (or single-post writes) can't deadlock against this one
+            cursor.execute('SELECT id FROM posts WHERE id = ANY(%s) ORDER BY id FOR UPDATE', (all_ids,))
+            found = {row[0] for row in cursor.fetchall()}
+
+            for op, ids, values in operations:
+                if op == 'delete':
+                    cursor.execute(
+                        'DELETE FROM posts WHERE id = ANY(%s) RETURNING id, media_href, media_meta',
+                        (ids,)
+                    )
+                    rows = cursor.fetchall()
+                    media.schedule_posts_media_delete(cursor, [(href, meta) for _, href, meta in rows])
+                    for row in rows:
+                        updated.pop(row[0], None)
+                        deleted.append(row[0])
+                else:
+                    assignments = ', '.join(f"{name} = %s" for name in values)
+                    cursor.execute(
+                        f"UPDATE posts SET {assignments} WHERE id = ANY(%s) RETURNING {', '.join(POST_COLUMNS)}",
+                        (*values.values(), ids)
+                    )
+                    for post in posts_from_rows(cursor.fetchall()):
+                        updated[post.id] = post
+
+            if updated or deleted:
+                bump_content_version(cursor, 'posts')
+                snapshot.schedule(cursor, found)
+            conn.commit()
+
+    if updated or deleted:
+        cache.invalidate("posts", *(f"post:{id}" for id in sorted(found)))
+
+    return payloads.json_response({
+        "posts": [updated[id] for id in sorted(updated)],
+        "deleted": sorted(deleted),
+        # ids that didn't exist when the batch started
+        "missing": [id for id in all_ids if id not in found]
+    })
+
+
+@app.route('/api/uploads/presign', methods=['POST'])
+@login_required
+def presign_upload():
+    data = request.get_json(silent=True) or {}
+    file_ext = (data.get('file_ext') or '').lower()
+    if file_ext and not allowed_file(f"upload.{file_ext}"):
+        return jsonify({"error": "Invalid file type"}), 400
+    try:
+        presigned = upload_storage.presign_upload(data.get('content_type'), data.get('size'))
+    except storage.UploadRejected as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(presigned)
+
+def upload_error(e):
+    if isinstance(e, resumable.SessionNotFound):
+        return jsonify({"error": str(e)}), 404
+    if isinstance(e, resumable.OffsetMismatch):
+        # the client resumes from here
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    return jsonify({"error": str(e)}), 400
+
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+def start_upload():
+    """Open an upload; with the file's sha256, media we already have
+    completes immediately without sending any bytes.
+
+    With S3 storage the client gets a presigned PUT ("direct") and sends
+    the file straight to the bucket; only local storage takes the bytes
+    through us, in chunks.
+    """
+    data = request.get_json(silent=True) or {}
+    sha256 = (data.get('sha256') or '').lower()
+    try:
+        ext = storage.validate_upload(data.get('content_type'), data.get('size'))
+        key = resumable.existing_key(upload_storage, sha256, ext)
+        if key is not None:
+            return jsonify({
+                "complete": True,
+                "key": key,
+                "public_url": upload_storage.public_url(key),
+                "deduplicated": True
+            })
+        if isinstance(upload_storage, storage.S3Storage):
+            presigned = upload_storage.presign_upload(data.get('content_type'), data.get('size'), sha256=sha256)
+            return jsonify({"direct": True, **presigned}), 201
+        return jsonify(resumable.create_session(data.get('content_type'), data.get('size'))), 201
+    except storage.UploadRejected as e:
+        return upload_error(e)
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    try:
+        return jsonify(resumable.session_state(upload_id))
+    except storage.UploadRejected as e:
+        return upload_error(e)
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+@login_required
+def append_upload(upload_id):
+    # tus-style: the body is the raw chunk, Upload-Offset says where it goes
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset header is required"}), 400
+    try:
+        offset = resumable.append_chunk(upload_id, offset, request.stream, request.content_length)
+    except storage.UploadRejected as e:
+        return upload_error(e)
+    return jsonify({"upload_id": upload_id, "offset": offset})
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        key, sha256, deduplicated = resumable.finalize(upload_storage, upload_id, data.get('sha256'))
+    except storage.UploadRejected as e:
+        return upload_error(e)
+    return jsonify({
+        "complete": True,
+        "key": key,
+        "sha256": sha256,
+        "public_url": upload_storage.public_url(key),
+        "deduplicated": deduplicated
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def abort_upload(upload_id):
+    try:
+        resumable.abort(upload_id)
+    except storage.UploadRejected as e:
+        return upload_error(e)
+    return '', 204
+
+@app.route('/api/uploads/local/<key>', methods=['PUT'])
+def local_upload(key):
+    # stand-in for the bucket during local development; the signed token
+    # authorizes the upload just like an S3 presigned URL would
+    if not isinstance(upload_storage, storage.LocalStorage):
+        return jsonify({"error": "Not found"}), 404
+    try:
+        claims = upload_storage.verify_token(key, request.args.get('token', ''))
+        upload_storage.write(key, request.stream, claims, request.mimetype)
+    except storage.UploadRejected as e:
+        return jsonify({"error": str(e)}), 400
+    return '', 200
+
+@app.route('/api/admin/export', methods=['GET'])
+@login_required
+def export_archive():
+    compress = parse_bool(request.args.get('gzip'), False)
+    filename = 'posts.ndjson.gz' if compress else 'posts.ndjson'
+    return app.response_class(
+        archive.export_posts(compress),
+        mimetype='application/gzip' if compress else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@app.route('/api/admin/import', methods=['POST'])
+@login_required
+def import_archive():
+    # read the body as a stream so large archives never sit in memory
+    compressed = request.headers.get('Content-Encoding') == 'gzip' or request.mimetype == 'application/gzip'
+    preserve_ids = parse_bool(request.args.get('preserve_ids'), False)
+    try:
+        imported = archive.import_posts(request.stream, compressed, preserve_ids)
+    except archive.ArchiveError as e:
+        return jsonify({"error": str(e)}), 400
+
+    cache.invalidate("posts")
+    return jsonify({"imported": imported}), 201
+
+
 @app.route("/api/check-youtube-embed")
 def check_youtube_embed():
     video_id = request.args.get("id")
@@ -484,73 +1066,66 @@ def check_youtube_embed():
     if not video_id:
         return jsonify({"embeddable": False, "error": "Missing video id"}), 400
 
-    if not YOUTUBE_API_KEY:
+    if not youtube.YOUTUBE_API_KEY:
         return jsonify({"embeddable": False, "error": "No API key"}), 500
 
-    api_url = (
-        f"https://www.googleapis.com/youtube/v3/videos"
-        f"?part=status,contentDetails&id={video_id}&key={YOUTUBE_API_KEY}"
-    )
-    print("Fetching:", api_url, file=sys.stderr)
+    if not youtube.is_video_id(video_id):
+        return jsonify({"embeddable": False, "error": "Invalid video id"}), 400
 
     try:
-        response = requests.get(api_url, timeout=5)
-        data = response.json()
-
-        items = data.get("items", [])
-        if not items:
-            return jsonify({"embeddable": False, "error": "Video not found"}), 404
-
-        status = items[0].get("status", {})
-        content_details = items[0].get("contentDetails", {})
-
-        embeddable = status.get("embeddable", False)
-        privacy_status = status.get("privacyStatus", "")
-        region_restrictions = content_details.get("regionRestriction", {})
-        content_rating = content_details.get("contentRating", {})
+        result = youtube.check_video(video_id)
+    except Exception as e:
+        print("Error in check_youtube_embed:", str(e), file=sys.stderr)
+        return jsonify({"embeddable": False, "error": str(e)}), 500
 
-        # Initial check
-        can_embed = embeddable and privacy_status == "public"
+    if not result["found"]:
+        return jsonify({"embeddable": False, "error": "Video not found"}), 404
+    return jsonify({"embeddable": result["embeddable"]})
 
-        # Block region- or age-restricted videos
-        if region_restrictions or content_rating.get("ytRating") == "ytAgeRestricted":
-            can_embed = False
+@app.route("/api/check-youtube-embed/batch")
+def check_youtube_embed_batch():
+    video_ids = [v for v in (request.args.get("ids") or "").split(",") if v]
 
-        # Final oEmbed verification
-        oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
-        try:
-            oembed_resp = requests.get(oembed_url, timeout=5)
-            if oembed_resp.status_code != 200:
-                can_embed = False
-        except Exception as e:
-            print("oEmbed check failed:", e, file=sys.stderr)
-            can_embed = False
+    if not video_ids:
+        return jsonify({"error": "Missing video ids"}), 400
+    if len(video_ids) > youtube.YOUTUBE_BATCH_MAX:
+        return jsonify({"error": f"At most {youtube.YOUTUBE_BATCH_MAX} video ids per request"}), 400
+    invalid = [v for v in video_ids if not youtube.is_video_id(v)]
+    if invalid:
+        return jsonify({"error": f"Invalid video ids: {', '.join(invalid)}"}), 400
 
-        print("Embeddable (final):", can_embed, file=sys.stderr)
-        return jsonify({"embeddable": can_embed})
+    if not youtube.YOUTUBE_API_KEY:
+        return jsonify({"error": "No API key"}), 500
 
+    try:
+        results = youtube.check_videos(video_ids)
     except Exception as e:
-        print("Error in check_youtube_embed:", str(e), file=sys.stderr)
-        return jsonify({"embeddable": False, "error": str(e)}), 500
+        print("Error in check_youtube_embed_batch:", str(e), file=sys.stderr)
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify(results)
 
 
 @app.route("/api/about", methods=["GET"])
 def about():
-    about = get_about()
-    if about:
-        return jsonify({
-            "id": about.id,
-            "header": about.header,
-            "body": about.body,
-            "last_updated": about.last_updated
-        })
-    else:
-        return jsonify({
-            "id": None,
-            "header": "",
-            "body": "",
-            "last_updated": None
-        }), 404
+    def build():
+        about = get_about()
+        if about:
+            return payloads.json_response({
+                "id": about.id,
+                "header": about.header,
+                "body": about.body,
+                "last_updated": about.last_updated
+            })
+        else:
+            return jsonify({
+                "id": None,
+                "header": "",
+                "body": "",
+                "last_updated": None
+            }), 404
+
+    return conditional_response("about", "about", lambda: cached_response("about", ("about",), build))
 
 @app.route("/api/about", methods=["POST", "PUT"])
 @login_required
@@ -568,15 +1143,76 @@ def update_about():
                 "UPDATE about SET header = %s, body = %s, last_updated = CURRENT_TIMESTAMP WHERE id = 1",
                 (header, body)
             )
+            bump_content_version(cursor, 'about')
+            snapshot.schedule(cursor, about=True)
             conn.commit()
 
+    cache.invalidate("about")
+
     return jsonify({"message": "About page updated successfully"}), 200
 
+@app.route("/api/pool-stats")
+@stats_access_required
+def get_pool_stats():
+    return jsonify(db.pool_stats() or {})
+
+@app.route("/api/cache-stats")
+@stats_access_required
+def get_cache_stats():
+    return jsonify(cache.cache_stats() or {})
+
+@app.route("/metrics")
+@stats_access_required
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return app.response_class(body, content_type=content_type)
+
+@app.route("/api/job-stats")
+@stats_access_required
+def get_job_stats():
+    return jsonify(jobs.job_stats())
+
+@app.route("/api/admin/media-gc", methods=["GET"])
+@login_required
+def media_gc_runs():
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, status, payload, result, last_error, created_at, finished_at
+                FROM jobs
+                WHERE kind = 'media.gc'
+                ORDER BY id DESC
+                LIMIT 10
+            """)
+            runs = cursor.fetchall()
+    return payloads.json_response(runs)
+
+@app.route("/api/admin/media-gc", methods=["POST"])
+@login_required
+def start_media_gc():
+    data = request.get_json(silent=True) or {}
+    dry_run = parse_bool(data.get("dry_run"), True)
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            jobs.enqueue(cursor, 'media.gc', {'dry_run': dry_run})
+    return jsonify({"message": "Media GC queued", "dry_run": dry_run}), 202
+
 @app.errorhandler(413)
 def too_large(e):
     return "File too large!", 413
 
+@app.errorhandler(db.PoolExhausted)
+def pool_exhausted(e):
+    response = jsonify({"error": "Database busy, try again shortly"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
 if __name__ == '__main__':
+    # the dev server brings its own schema up to date; deployments run
+    # `python migrate.py` as a release step instead
+    import migrate
+    migrate.migrate()
     app.run(host='0.0.0.0', port=5050,debug=True)
 
 application = app
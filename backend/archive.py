@@ -0,0 +1,151 @@
+import gzip
+import zlib
+from datetime import datetime
+
+import orjson
+import psycopg2.extras
+
+import media
+import payloads
+import snapshot
+from db import TimedCursor, bump_content_version, get_db_connection, tuple_cursor
+from models import POST_SELECT, Post
+
+
+EXPORT_ITERSIZE = 500
+IMPORT_BATCH_SIZE = 500
+
+IMPORT_COLUMNS = ('title', 'blurb', 'writeup', 'media_type', 'media_href', 'timestamp', 'is_visible')
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def export_posts(compress=False):
+    """Yield every post as NDJSON, optionally gzip-compressed, in constant memory."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    with get_db_connection() as conn:
+        # a named cursor keeps the result set on the server and pulls
+        # EXPORT_ITERSIZE rows per round trip instead of materializing it all
+        with conn.cursor(name='posts_export', cursor_factory=TimedCursor) as cursor:
+            cursor.itersize = EXPORT_ITERSIZE
+            cursor.execute(POST_SELECT + ' ORDER BY id')
+
+            chunk = []
+            for row in cursor:
+                chunk.append(payloads.dumps(Post.from_row(row)))
+                if len(chunk) >= EXPORT_ITERSIZE:
+                    data = b'\n'.join(chunk) + b'\n'
+                    chunk = []
+                    yield compressor.compress(data) if compressor else data
+            if chunk:
+                data = b'\n'.join(chunk) + b'\n'
+                yield compressor.compress(data) if compressor else data
+
+    if compressor:
+        yield compressor.flush()
+
+
+def _parse_line(line, number, preserve_ids):
+    try:
+        data = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise ArchiveError(f"Line {number}: invalid JSON ({e})")
+    if not isinstance(data, dict) or not data.get('title') or not data.get('media_type'):
+        raise ArchiveError(f"Line {number}: title and media_type are required")
+
+    timestamp = data.get('timestamp')
+    if timestamp:
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except (TypeError, ValueError):
+            raise ArchiveError(f"Line {number}: invalid timestamp")
+
+    values = (
+        data['title'],
+        data.get('blurb'),
+        data.get('writeup'),
+        data['media_type'],
+        data.get('media_href'),
+        timestamp,
+        payloads.parse_bool(data.get('is_visible')),
+    )
+    if preserve_ids:
+        if not isinstance(data.get('id'), int):
+            raise ArchiveError(f"Line {number}: id is required when preserving ids")
+        return (data['id'],) + values
+    return values
+
+
+def _insert_batch(cursor, batch, preserve_ids):
+    """Insert a batch of parsed lines; returns (id, media_type, media_href) of the rows inserted."""
+    if preserve_ids:
+        query = f"""
+            INSERT INTO posts (id, {', '.join(IMPORT_COLUMNS)})
+            VALUES %s
+            ON CONFLICT (id) DO NOTHING
+            RETURNING id, media_type, media_href
+        """
+        template = '(%s, %s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), %s)'
+    else:
+        query = f"""
+            INSERT INTO posts ({', '.join(IMPORT_COLUMNS)}) VALUES %s
+            RETURNING id, media_type, media_href
+        """
+        template = '(%s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP), %s)'
+    return psycopg2.extras.execute_values(
+        cursor, query, batch, template=template, page_size=IMPORT_BATCH_SIZE, fetch=True
+    )
+
+
+def _lines(stream):
+    try:
+        yield from stream
+    except (OSError, EOFError, zlib.error) as e:
+        # a truncated or corrupt gzip body fails while it is being read
+        raise ArchiveError(f"Could not read archive: {e}")
+
+
+def _insert_and_schedule(cursor, batch, preserve_ids):
+    rows = _insert_batch(cursor, batch, preserve_ids)
+    # imported media gets the same variants and embed checks as a new post
+    for post_id, media_type, media_href in rows:
+        media.schedule_post_media(cursor, post_id, media_type, media_href)
+    return len(rows)
+
+
+def import_posts(stream, compressed=False, preserve_ids=False):
+    """Bulk-insert NDJSON posts from a file-like stream in one transaction.
+
+    Returns the number of rows inserted; raises ArchiveError on the first bad line.
+    """
+    if compressed:
+        # GzipFile inflates incrementally as lines are read
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+
+    inserted = 0
+    with get_db_connection() as conn:
+        with tuple_cursor(conn) as cursor:
+            batch = []
+            for number, line in enumerate(_lines(stream), 1):
+                line = line.strip()
+                if not line:
+                    continue
+                batch.append(_parse_line(line, number, preserve_ids))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    inserted += _insert_and_schedule(cursor, batch, preserve_ids)
+                    batch = []
+            if batch:
+                inserted += _insert_and_schedule(cursor, batch, preserve_ids)
+
+            bump_content_version(cursor, 'posts')
+            snapshot.schedule(cursor, full=True)
+            if preserve_ids:
+                # keep SERIAL from handing out ids we just imported
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence('posts', 'id'), GREATEST((SELECT MAX(id) FROM posts), 1))"
+                )
+    return inserted
+
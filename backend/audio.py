@@ -0,0 +1,164 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", 300))
+
+# "format:kbps" pairs; opus for browsers that play it, mp3 for the rest
+AUDIO_RENDITIONS = tuple(
+    (fmt, int(kbps))
+    for fmt, kbps in (pair.split(":") for pair in os.getenv("AUDIO_RENDITIONS", "opus:64,mp3:128").split(","))
+)
+# number of bars in the precomputed waveform
+AUDIO_PEAKS = int(os.getenv("AUDIO_PEAKS", 200))
+# peaks only need a rough envelope, so decode at a low mono rate
+PEAK_SAMPLE_RATE = 8000
+
+# extension -> (ffmpeg encoder, content type for <source type>)
+AUDIO_FORMATS = {
+    'opus': ('libopus', 'audio/ogg; codecs=opus'),
+    'mp3': ('libmp3lame', 'audio/mpeg'),
+}
+
+
+class AudioError(RuntimeError):
+    pass
+
+
+def have_ffmpeg():
+    return shutil.which(FFMPEG_BIN) is not None
+
+
+def _ffmpeg(args, capture=False):
+    cmd = [FFMPEG_BIN, '-nostdin', '-hide_banner', '-loglevel', 'error', '-y'] + args
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=FFMPEG_TIMEOUT,
+            check=False,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise AudioError(f"ffmpeg failed: {e}")
+    if result.returncode != 0:
+        raise AudioError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+
+def _decode_mono(src_path):
+    """Samples as a float32 mono array in [-1, 1], plus their sample rate."""
+    if have_ffmpeg():
+        pcm = _ffmpeg(['-i', src_path, '-vn', '-ac', '1', '-ar', str(PEAK_SAMPLE_RATE),
+                       '-f', 's16le', '-acodec', 'pcm_s16le', '-'], capture=True)
+        return np.frombuffer(pcm, dtype='<i2').astype(np.float32) / 32768.0, PEAK_SAMPLE_RATE
+
+    # without ffmpeg we can still read plain PCM wav files
+    try:
+        with wave.open(src_path, 'rb') as f:
+            channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+            frames = f.readframes(f.getnframes())
+    except (wave.Error, EOFError) as e:
+        raise AudioError(f"Cannot decode audio without ffmpeg: {e}")
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 3:
+        # widen each little-endian 24-bit sample to 32 bits, sign from the top byte
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((len(raw), 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        samples = padded.view('<i4').ravel().astype(np.float32) / 2147483648.0
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise AudioError(f"Unsupported wav sample width: {width}")
+
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+        # loudest channel per frame, so a hard-panned part still shows up
+        samples = np.abs(samples).max(axis=1)
+    return samples, rate
+
+
+def compute_peaks(samples, count=AUDIO_PEAKS):
+    """Downsample to `count` peak amplitudes as ints 0-255."""
+    if len(samples) == 0:
+        return []
+    count = min(count, len(samples))
+    # spread the bucket edges evenly, so no bucket ends up empty at the tail
+    # (ceil-sized buckets would draw silence after the clip has ended)
+    edges = np.linspace(0, len(samples), count + 1).astype(np.intp)[:-1]
+    peaks = np.maximum.reduceat(np.abs(samples), edges)
+    return np.clip(np.rint(peaks * 255), 0, 255).astype(np.uint8).tolist()
+
+
+def transcode(src_path, dest_path, ext, kbps):
+    encoder, _ = AUDIO_FORMATS[ext]
+    # -map_metadata -1 drops tags, -vn drops embedded cover art
+    _ffmpeg(['-i', src_path, '-vn', '-map_metadata', '-1', '-c:a', encoder,
+             '-b:a', f"{kbps}k", dest_path])
+    return os.path.getsize(dest_path)
+
+
+def generate_renditions(src_path, out_dir, stem):
+    """Analyse an audio file and transcode it to the configured renditions.
+
+    Returns (meta, files) in the same shape as images.generate_variants.
+    Renditions that come out no smaller than the original are skipped.
+    """
+    samples, rate = _decode_mono(src_path)
+    meta = {
+        'kind': 'audio',
+        'duration': round(len(samples) / rate, 3),
+        'peaks': compute_peaks(samples),
+        'renditions': [],
+    }
+    files = []
+    if not have_ffmpeg():
+        return meta, files
+
+    original_bytes = os.path.getsize(src_path)
+    for ext, kbps in AUDIO_RENDITIONS:
+        name = f"{stem}_{kbps}.{ext}"
+        path = os.path.join(out_dir, name)
+        size = transcode(src_path, path, ext, kbps)
+        if size >= original_bytes:
+            continue
+        content_type = AUDIO_FORMATS[ext][1]
+        files.append((name, path, content_type.split(';')[0]))
+        meta['renditions'].append({
+            'name': name,
+            'format': ext,
+            'bitrate': kbps,
+            'bytes': size,
+            'content_type': content_type,
+        })
+    return meta, files
+
+
+def process_stored_audio(storage, key, href):
+    """Build renditions and peaks for audio already in storage; returns media meta."""
+    directory, filename = os.path.split(key)
+    stem, ext = os.path.splitext(filename)
+    prefix = f"{directory}/" if directory else ''
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src_path = os.path.join(tmp, f"source{ext}")
+        storage.download(key, src_path)
+        meta, files = generate_renditions(src_path, tmp, stem)
+        for name, path, content_type in files:
+            storage.upload(prefix + name, path, content_type)
+
+    base_href = href.rsplit('/', 1)[0]
+    for rendition in meta['renditions']:
+        rendition['href'] = f"{base_href}/{rendition.pop('name')}"
+    return meta
@@ -0,0 +1,343 @@
+"""Reproducible API benchmark through the real gunicorn entry point.
+
+    python bench/api_bench.py --posts 1000 100000 --concurrency 1 16 64
+
+For each post count it seeds the database named by the DB_* env vars,
+starts `gunicorn application:application`, and drives each scenario at each
+concurrency level. It reports throughput, latency percentiles and the RSS
+of every worker, and writes the results as JSON to bench/results/. The
+last comparable run, same post count and server settings, is printed
+alongside, so a regression between commits stands out.
+
+The database is migrated first. Seeding REPLACES the posts table, so it
+only runs against a scratch database: BENCH_DB_NAME must name the database
+the DB_* settings connect to, and the posts table must be empty or hold
+only a previous seed. The write scenario needs ADMIN_PASSWORD.
+
+    BENCH_DB_NAME=jackrabbit_bench DB_NAME=jackrabbit_bench python bench/api_bench.py
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from load_test import free_port, run_level, start_server, wait_ready  # noqa: E402
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, 'bench', 'results')
+
+WORDS = (
+    "the of and to in is was for on that with as by at from his her it an were are which this "
+    "be or has had not first one their its new after but who they have two been other when there "
+    "all during into school time may years more most only over city some world would where later "
+    "up such used many can state about national out known university united then made between "
+    "music record song album band track live tour studio guitar drum bass vocal sound night show "
+    "video photo light color summer winter road river town friend story book film water house"
+).split()
+# titles written by the write scenario start with this, and are removed afterwards
+WRITE_MARKER = 'bench-write'
+# the database we may wipe; must match the one DB_* connects to
+BENCH_DB_NAME = os.environ.get("BENCH_DB_NAME")
+
+
+class NotScratchDatabase(Exception):
+    pass
+
+
+def db_connect():
+    import db
+    conn = db.connect()
+    conn.autocommit = True
+    return conn
+
+
+def check_scratch_database(cursor):
+    """Raise NotScratchDatabase unless we may replace this database's posts.
+
+    Returns the post count of the seed already there, or None.
+    """
+    cursor.execute("SELECT current_database() AS name")
+    name = cursor.fetchone()['name']
+    if not BENCH_DB_NAME or BENCH_DB_NAME != name:
+        raise NotScratchDatabase(
+            f"seeding replaces every post; set BENCH_DB_NAME={name} if {name} is a scratch database"
+        )
+    cursor.execute("SELECT to_regclass('posts') IS NOT NULL AS migrated")
+    if not cursor.fetchone()['migrated']:
+        return None
+    cursor.execute("SELECT to_regclass('bench_seed') IS NOT NULL AS seeded")
+    seeded = None
+    if cursor.fetchone()['seeded']:
+        cursor.execute("SELECT posts FROM bench_seed")
+        row = cursor.fetchone()
+        seeded = row['posts'] if row else None
+    # anything past the seed's ids, other than the write scenario's leftovers,
+    # was put there by someone else
+    cursor.execute(
+        "SELECT count(*) AS n FROM posts WHERE id > %s AND title NOT LIKE %s",
+        (seeded or 0, WRITE_MARKER + '%')
+    )
+    if cursor.fetchone()['n']:
+        raise NotScratchDatabase(f"posts in {name} holds rows the benchmark seed did not create")
+    return seeded
+
+
+def seed(posts, seed_value=42):
+    """Fill posts with `posts` rows of realistic shape, unless it already is that seed."""
+    conn = db_connect()
+    with conn.cursor() as cursor:
+        seeded = check_scratch_database(cursor)
+        cursor.execute("SELECT count(*) AS n, coalesce(max(id), 0) AS max_id FROM posts")
+        row = cursor.fetchone()
+        if seeded == posts and row['n'] == posts and row['max_id'] == posts:
+            print(f"posts already seeded with {posts} rows")
+            return
+
+        print(f"seeding {posts} posts...", flush=True)
+        started = time.monotonic()
+        cursor.execute("CREATE TABLE IF NOT EXISTS bench_seed (posts INTEGER NOT NULL)")
+        cursor.execute("DELETE FROM bench_seed")
+        cursor.execute("TRUNCATE posts RESTART IDENTITY CASCADE")
+        cursor.execute("SELECT setseed(%s)", (seed_value / 100,))
+        batch = 50_000
+        for start in range(1, posts + 1, batch):
+            end = min(start + batch - 1, posts)
+            # about 30% of posts have no writeup; the rest run 50-1500 words,
+            # so the generated search vector does real work as well
+            cursor.execute(
+                '''
+                INSERT INTO posts (title, blurb, writeup, media_type, media_href, timestamp, is_visible)
+                SELECT
+                    'Post ' || g || ' ' || (%(words)s::text[])[1 + g %% %(nwords)s],
+                    (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(nwords)s)::int], ' ')
+                     FROM generate_series(1, 10 + g %% 30)),
+                    CASE WHEN g %% 10 < 3 THEN NULL ELSE
+                        (SELECT string_agg((%(words)s::text[])[1 + floor(random() * %(nwords)s)::int], ' ')
+                         FROM generate_series(1, 50 + (g * 7919) %% 1450))
+                    END,
+                    (ARRAY['none', 'none', 'none', 'none', 'none', 'none', 'image', 'image', 'video', 'link'])[1 + g %% 10],
+                    CASE g %% 10
+                        WHEN 6 THEN '/uploads/' || md5(g::text) || '.jpg'
+                        WHEN 7 THEN '/uploads/' || md5(g::text) || '.jpg'
+                        WHEN 8 THEN 'https://youtu.be/' || left(md5(g::text), 11)
+                        WHEN 9 THEN 'https://example.com/' || g
+                    END,
+                    now() - (%(posts)s - g) * interval '37 minutes',
+                    g %% 20 <> 0
+                FROM generate_series(%(start)s, %(end)s) g
+                ''',
+                {'words': WORDS, 'nwords': len(WORDS), 'posts': posts, 'start': start, 'end': end}
+            )
+            print(f"  {end}/{posts}", flush=True)
+        cursor.execute("INSERT INTO bench_seed (posts) VALUES (%s)", (posts,))
+        cursor.execute("UPDATE content_versions SET version = version + 1, updated_at = now()")
+        cursor.execute("ANALYZE posts")
+        print(f"seeded in {time.monotonic() - started:.1f}s")
+    conn.close()
+
+
+def remove_written_posts():
+    conn = db_connect()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM posts WHERE title LIKE %s", (WRITE_MARKER + '%',))
+    conn.close()
+
+
+def login_cookie(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('POST', '/api/login', body=json.dumps({'password': os.environ.get('ADMIN_PASSWORD', '')}),
+                 headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError("login failed; set ADMIN_PASSWORD to run the write scenario")
+    cookie = response.getheader('Set-Cookie').split(';', 1)[0]
+    conn.close()
+    return cookie
+
+
+def scenario_source(name, posts, cookie=None):
+    """request_source for run_level: each client gets its own seeded RNG."""
+    counter = iter(range(1_000_000))
+
+    def source():
+        rng = random.Random(next(counter))
+
+        def requests():
+            while True:
+                if name == 'feed':
+                    yield 'GET', '/api/posts?limit=20', None, None
+                elif name == 'post':
+                    yield 'GET', f'/api/post/{rng.randint(1, posts)}', None, None
+                elif name == 'about':
+                    yield 'GET', '/api/about', None, None
+                elif name == 'write':
+                    headers = {'Content-Type': 'application/json', 'Cookie': cookie}
+                    if rng.random() < 0.5:
+                        body = {'blurb': f"edited {rng.random()}"}
+                        yield 'PUT', f'/api/posts/{rng.randint(1, posts)}', json.dumps(body), headers
+                    else:
+                        body = {'title': f"{WRITE_MARKER} {rng.random()}", 'blurb': 'b', 'media_type': 'none'}
+                        yield 'POST', '/api/posts', json.dumps(body), headers
+        return requests()
+    return source
+
+
+def worker_pids(master_pid):
+    pids = []
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path) as f:
+                # the command name is in parens and may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:
+            pids.append(int(stat_path.split('/')[2]))
+    return sorted(pids)
+
+
+def memory(pid):
+    """Current and peak RSS in MiB, from /proc (Linux only)."""
+    values = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'VmHWM:')):
+                    key, kb = line.split()[:2]
+                    values[key.rstrip(':')] = int(kb) / 1024
+    except OSError:
+        return None
+    return {'rss_mib': round(values.get('VmRSS', 0), 1), 'peak_mib': round(values.get('VmHWM', 0), 1)}
+
+
+def git_revision():
+    def run(*cmd):
+        return subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return {'commit': run('git', 'rev-parse', 'HEAD'), 'dirty': bool(run('git', 'status', '--porcelain', '--', '.'))}
+
+
+def previous_result(config):
+    """The newest stored result with the same posts and server settings."""
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, 'api-*.json')), reverse=True):
+        with open(path) as f:
+            result = json.load(f)
+        if result.get('config') == config:
+            return result
+    return None
+
+
+def delta(current, previous):
+    if not previous:
+        return ''
+    return f"{(current - previous) / previous * 100:+.0f}%"
+
+
+def bench_posts(posts, args, extra_env):
+    seed(posts)
+    config = {
+        'posts': posts,
+        'worker_class': args.worker_class,
+        'workers': args.workers,
+        'threads': args.threads,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'scenarios': args.scenarios,
+    }
+    previous = previous_result(config)
+
+    port = free_port()
+    server = start_server(args.worker_class, port, extra_env)
+    result = {
+        'ts': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'host': {'python': platform.python_version(), 'cpus': os.cpu_count(), 'machine': platform.machine()},
+        'config': config,
+        'scenarios': {},
+        'memory': {},
+    }
+    try:
+        wait_ready('127.0.0.1', port, '/api/about')
+        cookie = login_cookie(port) if 'write' in args.scenarios else None
+        # fill caches and pools before anything is measured
+        run_level('127.0.0.1', port, scenario_source('feed', posts), 4, args.warmup)
+
+        print(f"\n{posts} posts, gunicorn {args.worker_class}"
+              + (f" (previous: {previous['git']['commit'][:8]} {previous['ts']})" if previous else ''))
+        print(f"{'scenario':<8}{'conc':>6}{'req/s':>10}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'errors':>8}{'vs prev':>14}")
+        for name in args.scenarios:
+            levels = {}
+            for concurrency in args.concurrency:
+                r = run_level('127.0.0.1', port, scenario_source(name, posts, cookie), concurrency, args.duration)
+                levels[str(concurrency)] = r
+                prev = ((previous or {}).get('scenarios', {}).get(name) or {}).get(str(concurrency))
+                vs = f"{delta(r['rps'], prev['rps'])} / {delta(r['p99'], prev['p99'])}" if prev else ''
+                print(f"{name:<8}{concurrency:>6}{r['rps']:>10.0f}{r['p50']:>9.1f}{r['p90']:>9.1f}"
+                      f"{r['p99']:>9.1f}{r['errors']:>8}{vs:>14}")
+            result['scenarios'][name] = levels
+            result['memory'][name] = {str(pid): memory(pid) for pid in worker_pids(server.pid)}
+
+        print("worker memory after each scenario (MiB, rss/peak):")
+        for name, workers in result['memory'].items():
+            print(f"  {name:<8}" + '  '.join(f"{m['rss_mib']:.0f}/{m['peak_mib']:.0f}" for m in workers.values() if m))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+        if 'write' in args.scenarios:
+            remove_written_posts()
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(RESULTS_DIR, f"api-{stamp}-{result['git']['commit'][:8]}-{posts}.json")
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {os.path.relpath(path, BACKEND_DIR)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--posts', type=int, nargs='+', default=[1000])
+    parser.add_argument('--scenarios', nargs='+', choices=['feed', 'post', 'about', 'write'],
+                        default=['feed', 'post', 'about', 'write'])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per scenario and level')
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--worker-class', default=os.environ.get('GUNICORN_WORKER_CLASS', 'gthread'),
+                        choices=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--workers', type=int, default=2, help='WEB_CONCURRENCY')
+    parser.add_argument('--threads', type=int, default=8, help='GUNICORN_THREADS for gthread')
+    args = parser.parse_args()
+
+    extra_env = {
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        # per-request log lines would cost more than some of the requests
+        'REQUEST_LOG': 'off',
+    }
+    # refuse before migrating, so a real database is left exactly as it was
+    conn = db_connect()
+    try:
+        with conn.cursor() as cursor:
+            check_scratch_database(cursor)
+    except NotScratchDatabase as e:
+        sys.exit(f"Refusing to run: {e}")
+    finally:
+        conn.close()
+
+    import migrate
+    migrate.migrate()
+    for posts in args.posts:
+        bench_posts(posts, args, extra_env)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Requests/sec and latency percentiles for the API at several concurrency levels.
+
+Drives an already running server:
+
+    python bench/load_test.py --url http://127.0.0.1:8000 --concurrency 1 8 32 64
+
+or starts gunicorn itself once per worker class, so they can be compared on
+the same machine and database (DB_* env vars as for the app):
+
+    python bench/load_test.py --serve sync gthread gevent --path /api/posts?limit=20
+
+Each client thread keeps one HTTP/1.1 connection open, like a browser would.
+"""
+import argparse
+import http.client
+import itertools
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def client(host, port, requests, deadline, latencies, errors):
+    """Send (method, path, body, headers) from `requests` until the deadline."""
+    conn = None
+    while time.monotonic() < deadline:
+        method, path, body, headers = next(requests)
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - started)
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            if conn is not None:
+                conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def get_paths(paths):
+    """A request source cycling GETs over `paths`."""
+    return lambda: itertools.cycle([('GET', path, None, None) for path in paths])
+
+
+def run_level(host, port, request_source, concurrency, duration):
+    """Run `concurrency` clients for `duration` seconds.
+
+    request_source() is called once per client and returns an iterator of
+    (method, path, body, headers), so clients don't share state.
+    """
+    deadline = time.monotonic() + duration
+    results = [([], []) for _ in range(concurrency)]
+    threads = [
+        threading.Thread(target=client, args=(host, port, request_source(), deadline, lat, err), daemon=True)
+        for lat, err in results
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+    latencies = sorted(x for lat, _ in results for x in lat)
+    errors = sum(len(err) for _, err in results)
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p90': percentile(latencies, 90) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'max': (latencies[-1] if latencies else 0) * 1000,
+        'ok': len(latencies),
+        'errors': errors,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(host, port, path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request('GET', path)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server on {host}:{port} did not come up")
+
+
+def start_server(worker_class, port, extra_env):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_BIND=f"127.0.0.1:{port}", **extra_env)
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'application:application'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def report(label, levels, host, port, paths, duration):
+    print(f"\n{label}")
+    print(f"{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for concurrency in levels:
+        r = run_level(host, port, get_paths(paths), concurrency, duration)
+        print(f"{concurrency:>6}{r['rps']:>10.0f}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['max']:>10.1f}{r['errors']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='server to drive when not using --serve')
+    parser.add_argument('--serve', nargs='+', choices=['sync', 'gthread', 'gevent'],
+                        help='start gunicorn with each worker class in turn')
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY for --serve')
+    parser.add_argument('--path', action='append', dest='paths', help='request path, repeatable (round-robin)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 64])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    args = parser.parse_args()
+    paths = args.paths or ['/api/posts?limit=20']
+
+    if not args.serve:
+        target = urlsplit(args.url)
+        report(args.url, args.concurrency, target.hostname, target.port or 80, paths, args.duration)
+        return
+
+    extra_env = {'WEB_CONCURRENCY': str(args.workers)} if args.workers else {}
+    for worker_class in args.serve:
+        port = free_port()
+        server = start_server(worker_class, port, extra_env)
+        try:
+            wait_ready('127.0.0.1', port, paths[0])
+            report(f"gunicorn --worker-class {worker_class}", args.concurrency, '127.0.0.1', port, paths, args.duration)
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Allocations and throughput of row -> Post -> JSON for large feeds.
+
+Compares the old mapping (RealDictCursor dict rows, a __dict__-backed Post
+built by eight key lookups, then to_dict()) with tuple rows mapped straight
+onto the slotted Post dataclass.
+
+    python bench/post_mapping.py --sizes 10000 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import payloads  # noqa: E402
+from models import POST_COLUMNS, posts_from_rows  # noqa: E402
+
+
+class LegacyPost:
+    def __init__(self, id, title, blurb, writeup, media_type, media_href, timestamp, is_visible):
+        self.id = id
+        self.title = title
+        self.blurb = blurb
+        self.writeup = writeup
+        self.media_type = media_type
+        self.media_href = media_href
+        self.timestamp = timestamp
+        self.is_visible = is_visible
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'blurb': self.blurb,
+            'writeup': self.writeup,
+            'media_type': self.media_type,
+            'media_href': self.media_href,
+            'timestamp': self.timestamp,
+            'is_visible': self.is_visible
+        }
+
+
+def make_rows(n):
+    now = datetime.now(timezone.utc)
+    writeup = 'lorem ipsum dolor sit amet ' * 40
+    # columns added after the original eight are left empty
+    padding = (None,) * (len(POST_COLUMNS) - 8)
+    return [
+        (i, f"post {i}", f"blurb for post {i}", writeup, 'image',
+         f"/uploads/{i:032x}.jpg", now - timedelta(minutes=i), True) + padding
+        for i in range(n, 0, -1)
+    ]
+
+
+def legacy(rows):
+    # RealDictCursor builds one dict per row before we ever see it
+    dict_rows = [dict(zip(POST_COLUMNS, row)) for row in rows]
+    posts = [LegacyPost(row['id'], row['title'], row['blurb'], row['writeup'], row['media_type'],
+                        row['media_href'], row['timestamp'], row['is_visible']) for row in dict_rows]
+    return payloads.dumps([post.to_dict() for post in posts])
+
+
+def current(rows):
+    return payloads.dumps(posts_from_rows(rows))
+
+
+def measure(fn, rows, repeat):
+    gc.collect()
+    tracemalloc.start()
+    fn(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gc.collect()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(rows)
+    elapsed = (time.perf_counter() - started) / repeat
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}  {'path':<8}{'peak MiB':>10}{'ms':>10}{'rows/s':>12}")
+    for n in args.sizes:
+        rows = make_rows(n)
+        for name, fn in (('legacy', legacy), ('current', current)):
+            peak, elapsed = measure(fn, rows, args.repeat)
+            print(f"{n:>8}  {name:<8}{peak / 2**20:>10.1f}{elapsed * 1000:>10.1f}{n / elapsed:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Compare bytes and CPU per /api/posts response: jsonify vs orjson + precompression.
+
+    python bench/serialization.py --posts 500 --repeat 50
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import payloads  # noqa: E402
+
+
+def make_posts(n, writeup_words):
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+
+    def words(count):
+        return ' '.join(
+            ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 10)))
+            for _ in range(count)
+        )
+
+    return [{
+        'id': i,
+        'title': words(6),
+        'blurb': words(30),
+        'writeup': words(rng.randint(writeup_words // 2, writeup_words * 2)),
+        'media_type': rng.choice(['image', 'audio', 'video', 'link', 'none']),
+        'media_href': f"/uploads/{rng.getrandbits(128):032x}.jpg",
+        'timestamp': now - timedelta(hours=i),
+        'is_visible': True,
+    } for i in range(n, 0, -1)]
+
+
+def measure(fn, repeat):
+    fn()
+    started = time.process_time()
+    for _ in range(repeat):
+        result = fn()
+    return (time.process_time() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--posts', type=int, default=500)
+    parser.add_argument('--writeup-words', type=int, default=400)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts, args.writeup_words)
+    app = Flask(__name__)
+
+    with app.test_request_context(headers={'Accept-Encoding': 'br, gzip'}):
+        rows = [
+            ('jsonify', lambda: jsonify(posts).get_data()),
+            ('orjson', lambda: payloads.dumps(posts)),
+            ('orjson+gzip', lambda: payloads.compress(payloads.dumps(posts), 'gzip')),
+            ('orjson+br', lambda: payloads.compress(payloads.dumps(posts), 'br')),
+        ]
+
+        body = payloads.dumps(posts)
+        payload = payloads.Payload(body, [('Content-Type', 'application/json')])
+        payload.variant('br')
+        # what a cache hit costs once the compressed variant exists
+        rows.append(('cached br', lambda: payload.to_response().get_data()))
+
+        print(f"{args.posts} posts, ~{args.writeup_words} words per writeup, {args.repeat} runs")
+        print(f"{'path':<14}{'bytes':>12}{'cpu ms/req':>14}")
+        for name, fn in rows:
+            cpu, data = measure(fn, args.repeat)
+            print(f"{name:<14}{len(data):>12}{cpu * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+import json
+import os
+import select
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import db
+
+
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 512))
+CACHE_TTL = float(os.environ.get("CACHE_TTL", 60))
+# "local" (one process only; gunicorn.conf.py picks postgres for more than
+# one worker), "postgres" (LISTEN/NOTIFY) or a redis:// URL
+CACHE_BUS = os.environ.get("CACHE_BUS", "local")
+CACHE_CHANNEL = os.environ.get("CACHE_CHANNEL", "cache_invalidate")
+
+
+class ResponseCache:
+    """Bounded LRU + TTL cache of serialized responses, invalidated by tag."""
+
+    def __init__(self, maxsize, ttl, bus=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.bus = bus
+        self._lock = threading.Lock()
+        # key -> (expires_at, value, tags)
+        self._entries = OrderedDict()
+        self._tags = {}
+        # tag -> monotonic time it was last invalidated
+        self._invalidated_at = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        if bus is not None:
+            bus.start(self._invalidate_local)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=(), ttl=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (expires_at, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying one of the tags, here and in other workers."""
+        self._invalidate_local(list(tags))
+        if self.bus is not None:
+            try:
+                self.bus.publish(list(tags))
+            except Exception as e:
+                print("Cache invalidation publish failed:", e, file=sys.stderr)
+
+    def clear(self):
+        self._invalidate_local(None)
+
+    def _invalidate_local(self, tags):
+        with self._lock:
+            self.invalidations += 1
+            if tags is None:
+                self._entries.clear()
+                self._tags.clear()
+                return
+            now = time.monotonic()
+            if len(self._invalidated_at) > 4 * self.maxsize:
+                # per-post tags would otherwise accumulate forever
+                self._invalidated_at = {
+                    tag: at for tag, at in self._invalidated_at.items() if at > now - self.ttl
+                }
+            for tag in tags:
+                self._invalidated_at[tag] = now
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def invalidated_within(self, tags, seconds):
+        """Whether any of the tags was invalidated in the last `seconds`."""
+        cutoff = time.monotonic() - seconds
+        with self._lock:
+            return any(self._invalidated_at.get(tag, float('-inf')) > cutoff for tag in tags)
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "bus": type(self.bus).__name__ if self.bus else None,
+            }
+
+
+class PostgresBus:
+    """Fan out invalidations to every worker through LISTEN/NOTIFY."""
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def publish(self, tags):
+        with db.get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, json.dumps(tags)))
+
+    def start(self, callback):
+        thread = threading.Thread(target=self._listen, args=(callback,), daemon=True)
+        thread.start()
+
+    def _listen(self, callback):
+        while True:
+            conn = None
+            try:
+                conn = db.connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                # anything published while we were disconnected was missed
+                callback(None)
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        callback(json.loads(notify.payload))
+            except Exception as e:
+                print("Cache listener error:", e, file=sys.stderr)
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+class RedisBus:
+    """Fan out invalidations through Redis (or any server speaking its pub/sub)."""
+
+    def __init__(self, url, channel):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BUS points at redis but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def publish(self, tags):
+        self.client.publish(self.channel, json.dumps(tags))
+
+    def start(self, callback):
+        thread = threading.Thread(target=self._listen, args=(callback,), daemon=True)
+        thread.start()
+
+    def _listen(self, callback):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                callback(None)
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        callback(json.loads(message["data"]))
+            except Exception as e:
+                print("Cache listener error:", e, file=sys.stderr)
+                time.sleep(1)
+
+
+def make_bus(spec):
+    if not spec or spec == "local":
+        return None
+    if spec == "postgres":
+        return PostgresBus(CACHE_CHANNEL)
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBus(spec, CACHE_CHANNEL)
+    raise ValueError(f"Unknown CACHE_BUS: {spec}")
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    # listener threads don't survive a fork, so each worker builds its own cache
+    global _cache, _cache_pid
+    pid = os.getpid()
+    if _cache is None or _cache_pid != pid:
+        with _cache_lock:
+            if _cache is None or _cache_pid != pid:
+                _cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL, make_bus(CACHE_BUS))
+                _cache_pid = pid
+    return _cache
+
+
+def invalidate(*tags):
+    get_cache().invalidate(*tags)
+
+
+def cache_stats():
+    if _cache is None or _cache_pid != os.getpid():
+        return None
+    return _cache.stats()
@@ -0,0 +1,312 @@
+"""Post change feed: the post_changes log, streamed as Server-Sent Events.
+
+A trigger on posts (migration 0005) logs every created, updated and
+deleted post in the writing transaction and NOTIFYs post_changes on
+commit. Each web process runs one listener thread that reads new changes
+once and keeps the latest CHANGES_BUFFER of them in memory; every stream
+in the process is served from that buffer. A client that reconnects
+(Last-Event-ID) or asks for ?since= further back than the buffer is
+caught up from the log itself.
+
+Events carry the post as it is now, not as it was at the change, so a
+client just upserts created/updated posts and drops deleted ones. Hidden
+posts are sent as deleted unless the stream includes them. A client that
+is further behind than the log goes back gets a reset event and should
+reload the list.
+"""
+import os
+import random
+import select
+import sys
+import threading
+import time
+from collections import deque
+
+import db
+import payloads
+from db import get_db_connection
+from models import POST_COLUMNS
+
+
+# fixed by the posts_log_changes trigger
+CHANGES_CHANNEL = "post_changes"
+# changes older than this are pruned from the log
+CHANGES_RETENTION = float(os.environ.get("CHANGES_RETENTION", 7 * 24 * 3600))
+CHANGES_PRUNE_INTERVAL = float(os.environ.get("CHANGES_PRUNE_INTERVAL", 3600))
+# recent changes each process keeps for its streams
+CHANGES_BUFFER = int(os.environ.get("CHANGES_BUFFER", 1000))
+# whether visitors get streams too, not just the admin; worth it where a
+# stream is a greenlet (gevent workers), not a thread (see gunicorn.conf.py)
+CHANGES_PUBLIC = payloads.parse_bool(os.environ.get("CHANGES_PUBLIC"), False)
+# concurrent streams per process; each holds a thread (a greenlet under gevent)
+CHANGES_MAX_STREAMS = int(os.environ.get("CHANGES_MAX_STREAMS", 100))
+# extra streams only the admin may open, so visitors can't crowd them out
+CHANGES_ADMIN_STREAMS = int(os.environ.get("CHANGES_ADMIN_STREAMS", 4))
+# a comment line this often keeps proxies from timing the stream out
+CHANGES_HEARTBEAT = float(os.environ.get("CHANGES_HEARTBEAT", 15))
+# streams are closed after this long and the browser reconnects where it
+# left off, so a stream never pins a thread for good
+CHANGES_STREAM_MAX_AGE = float(os.environ.get("CHANGES_STREAM_MAX_AGE", 300))
+# milliseconds the browser waits before reconnecting
+CHANGES_RETRY_MS = 3000
+# a client turned away while every stream is taken comes back after
+# somewhere in this range (milliseconds), spread so they don't return at once
+CHANGES_OVERFLOW_RETRY_MS = (15000, 45000)
+CHANGES_FETCH_LIMIT = 500
+
+CHANGE_SELECT = (
+    "SELECT c.id AS change_id, c.op AS change_op, c.post_id AS change_post_id, "
+    + ", ".join(f"p.{column}" for column in POST_COLUMNS)
+    + ", (p.writeup IS NOT NULL AND p.writeup <> '') AS has_writeup "
+    "FROM post_changes c LEFT JOIN posts p ON p.id = c.post_id"
+)
+POST_KEYS = POST_COLUMNS + ('has_writeup',)
+
+
+class TooManyStreams(Exception):
+    pass
+
+
+def fetch_changes(cursor, after, limit=CHANGES_FETCH_LIMIT):
+    """Changes after id `after` as (change_id, op, post_id, post or None), oldest first.
+
+    Each post appears once, at its latest change; the post is read as it
+    is now, so earlier changes to it carry nothing newer.
+    """
+    cursor.execute(CHANGE_SELECT + " WHERE c.id > %s ORDER BY c.id LIMIT %s", (after, limit))
+    latest = {}
+    last_id = after
+    for row in cursor.fetchall():
+        post = {key: row[key] for key in POST_KEYS} if row['id'] is not None else None
+        latest.pop(row['change_post_id'], None)
+        latest[row['change_post_id']] = (row['change_id'], row['change_op'], row['change_post_id'], post)
+        last_id = row['change_id']
+    return list(latest.values()), last_id
+
+
+def log_bounds(cursor):
+    cursor.execute("SELECT coalesce(min(id), 0) AS first, coalesce(max(id), 0) AS last FROM post_changes")
+    row = cursor.fetchone()
+    return row['first'], row['last']
+
+
+def prune(retention=CHANGES_RETENTION):
+    """Delete changes older than `retention` seconds, always keeping the latest."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''
+                DELETE FROM post_changes
+                WHERE changed_at < now() - make_interval(secs => %s)
+                  AND id < (SELECT max(id) FROM post_changes)
+                ''',
+                (retention,)
+            )
+            return cursor.rowcount
+
+
+class ChangeHub:
+    """One LISTEN connection per process, fanned out to every stream in it."""
+
+    def __init__(self, buffer_size):
+        self.buffer_size = buffer_size
+        self._cond = threading.Condition()
+        self._changes = deque()
+        # the buffer holds every change after floor; None until listening
+        self.floor = None
+        self.last_id = None
+        self.streams = 0
+
+    def start(self):
+        thread = threading.Thread(target=self._listen, daemon=True)
+        thread.start()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = db.connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{CHANGES_CHANNEL}"')
+                    if self.last_id is None:
+                        _, last = log_bounds(cursor)
+                        with self._cond:
+                            self.floor = self.last_id = last
+                    # changes made while we were disconnected are still in the log
+                    self._catch_up(cursor)
+                    while True:
+                        if select.select([conn], [], [], 30) == ([], [], []):
+                            continue
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self._catch_up(cursor)
+            except Exception as e:
+                print("Change feed listener error:", e, file=sys.stderr)
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _catch_up(self, cursor):
+        while True:
+            changes, last_id = fetch_changes(cursor, self.last_id)
+            if last_id == self.last_id:
+                return
+            with self._cond:
+                self._changes.extend(changes)
+                while len(self._changes) > self.buffer_size:
+                    self.floor = self._changes.popleft()[0]
+                self.last_id = last_id
+                self._cond.notify_all()
+
+    def changes_after(self, after):
+        """Buffered changes after `after`, or None if the buffer doesn't reach back that far."""
+        with self._cond:
+            if self.floor is None or after < self.floor:
+                return None
+            return [change for change in self._changes if change[0] > after]
+
+    def wait(self, after, timeout):
+        """Block until a change after `after` arrives; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.last_id is not None and self.last_id > after, timeout
+            )
+
+    def acquire_stream(self, limit):
+        with self._cond:
+            if self.streams >= limit:
+                raise TooManyStreams(f"{self.streams} change streams already open")
+            self.streams += 1
+
+    def release_stream(self):
+        with self._cond:
+            self.streams -= 1
+
+
+_hub = None
+_hub_pid = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    # listener threads don't survive a fork, so each worker starts its own
+    global _hub, _hub_pid
+    pid = os.getpid()
+    if _hub is None or _hub_pid != pid:
+        with _hub_lock:
+            if _hub is None or _hub_pid != pid:
+                _hub = ChangeHub(CHANGES_BUFFER)
+                _hub.start()
+                _hub_pid = pid
+    return _hub
+
+
+def _event(change_id, name, data):
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (change_id, name.encode(), payloads.dumps(data))
+
+
+def render(change, fields, include_hidden):
+    change_id, op, post_id, post = change
+    if post is None or not (include_hidden or post['is_visible']):
+        return _event(change_id, 'deleted', {'id': post_id})
+    if op == 'deleted':
+        # the id came back, e.g. an import preserving ids
+        op = 'created'
+    data = {'id': post_id}
+    data.update((field, post[field]) for field in fields)
+    return _event(change_id, op, data)
+
+
+class ChangeStream:
+    """The SSE body of one client; closing it frees its slot, even if it never started."""
+
+    def __init__(self, hub, since, fields, include_hidden, first, last):
+        self.hub = hub
+        self.since = since
+        self.fields = fields
+        self.include_hidden = include_hidden
+        self.first = first
+        self.last = last
+        self._released = False
+        self._events = self._generate()
+
+    def __iter__(self):
+        return self._events
+
+    def close(self):
+        self._events.close()
+        if not self._released:
+            self._released = True
+            self.hub.release_stream()
+
+    def _fetch(self, after):
+        floor = self.hub.floor
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                changes, last_id = fetch_changes(cursor, after)
+        if last_id == after and floor is not None:
+            # nothing in the log between here and what the listener has
+            # already seen, so the buffer can take over
+            last_id = max(after, floor)
+        return changes, last_id
+
+    def _generate(self):
+        yield b"retry: %d\n\n" % CHANGES_RETRY_MS
+        # a gap before the first logged change was pruned (or rolled back;
+        # reloading is harmless then), and an id past the last one belongs
+        # to some other database
+        since = self.since
+        if since is not None and (since < self.first - 1 or since > self.last):
+            yield _event(self.last, 'reset', {})
+            cursor = self.last
+        else:
+            cursor = self.last if since is None else since
+            yield _event(cursor, 'ready', {})
+
+        deadline = time.monotonic() + CHANGES_STREAM_MAX_AGE
+        while time.monotonic() < deadline:
+            changes = self.hub.changes_after(cursor)
+            if changes is None:
+                changes, cursor = self._fetch(cursor)
+            elif changes:
+                cursor = changes[-1][0]
+            for change in changes:
+                yield render(change, self.fields, self.include_hidden)
+            if changes:
+                continue
+            if not self.hub.wait(cursor, min(CHANGES_HEARTBEAT, max(deadline - time.monotonic(), 0))):
+                yield b": keepalive\n\n"
+
+
+def overflow_body():
+    """What a client gets instead of a stream when all are taken.
+
+    An error status would make EventSource give up for good; an empty
+    stream that only sets a retry delay has the browser reconnect later on
+    its own, still sending the Last-Event-ID it had.
+    """
+    return b"retry: %d\n\n" % random.randint(*CHANGES_OVERFLOW_RETRY_MS)
+
+
+def open_stream(since, fields, include_hidden, admin=False):
+    """Start a client's stream, or raise TooManyStreams.
+
+    With since=None the stream starts at the newest change. Call this
+    before the response starts, so a full server can still turn it away.
+    """
+    hub = get_hub()
+    hub.acquire_stream(CHANGES_MAX_STREAMS + (CHANGES_ADMIN_STREAMS if admin else 0))
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                first, last = log_bounds(cursor)
+    except BaseException:
+        hub.release_stream()
+        raise
+    return ChangeStream(hub, since, fields, include_hidden, first, last)
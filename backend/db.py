@@ -0,0 +1,530 @@
+import functools
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+import metrics
+
+
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 1))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", 10))
+# seconds a request will wait for a free connection before we give up with a 503
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+# connections older than this are closed and replaced on checkout
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", 1800))
+# connections idle longer than this get a SELECT 1 before being handed out
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", 30))
+
+# comma-separated read replicas as host or host:port; same user, password and
+# database as the primary. Unset means every query goes to the primary.
+DB_REPLICAS = os.environ.get("DB_REPLICAS", "")
+# "round_robin" or "least_connections"
+DB_REPLICA_POLICY = os.environ.get("DB_REPLICA_POLICY", "round_robin")
+DB_REPLICA_POOL_MAX = int(os.environ.get("DB_REPLICA_POOL_MAX", DB_POOL_MAX))
+# a replica further behind than this many seconds is skipped until it catches up
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 5))
+# seconds between lag checks of each replica, per process
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", 5))
+# a replica that failed is left alone for this long
+DB_REPLICA_RETRY_AFTER = float(os.environ.get("DB_REPLICA_RETRY_AFTER", 30))
+# how long a session that wrote keeps reading from the primary; a replica in
+# use can be up to the max lag behind as of its last check, plus the interval
+DB_STICKY_SECONDS = float(
+    os.environ.get("DB_STICKY_SECONDS", DB_REPLICA_MAX_LAG + DB_REPLICA_CHECK_INTERVAL)
+)
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class TimedCursorMixin:
+    """Reports each statement's latency to metrics, and so to the current request."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.observe_query(time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.observe_query(time.perf_counter() - started)
+
+
+class TimedDictCursor(TimedCursorMixin, psycopg2.extras.RealDictCursor):
+    pass
+
+
+class TimedCursor(TimedCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+
+def connect(host=None, port=None):
+    """Open a new raw connection to the primary database, or to a replica's host."""
+    return psycopg2.connect(
+        host=host or os.environ.get("DB_HOST"),
+        user=os.environ.get("DB_USER"),
+        password=os.environ.get("DB_PASS"),
+        dbname=os.environ.get("DB_NAME"),
+        port=port or os.environ.get("DB_PORT", 5432),
+        cursor_factory=TimedDictCursor
+    )
+
+
+class _Waiter:
+    """A getconn call queued for a connection; putconn hands one over directly."""
+
+    def __init__(self, lock):
+        self.cond = threading.Condition(lock)
+        self.granted = False
+        # the idle entry handed over, or None for a free slot to connect in
+        self.entry = None
+
+
+class ConnectionPool:
+    """Thread-safe pool with bounded waits, recycling and health checks.
+
+    Waiters are served first come, first served: a released connection
+    goes straight to the oldest waiter, so a caller that just arrived
+    can't take it from one that has been waiting.
+    """
+
+    def __init__(self, connect_fn, minconn, maxconn, timeout, recycle, ping_after):
+        self._connect = connect_fn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._lock = threading.Lock()
+        # idle entries are [conn, created_at, last_used]; most recently used last
+        self._idle = []
+        # id -> entry, or a placeholder reserving the slot of a checkout in progress
+        self._in_use = {}
+        self._waiters = deque()
+        self._closed = False
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.recycled = 0
+        self.broken = 0
+
+        for _ in range(minconn):
+            now = time.monotonic()
+            self._idle.append([self._connect(), now, now])
+
+    def _size(self):
+        return len(self._idle) + len(self._in_use)
+
+    def _is_stale(self, entry, now):
+        conn, created_at, last_used = entry
+        if conn.closed:
+            return True
+        if self.recycle and now - created_at > self.recycle:
+            return True
+        if self.ping_after and now - last_used > self.ping_after:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return True
+        return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _hand_off(self, entry):
+        """Give an idle entry, or None for a freed slot, to the oldest waiter.
+
+        Returns False if nobody is waiting. Called with the lock held.
+        """
+        if not self._waiters:
+            return False
+        waiter = self._waiters.popleft()
+        waiter.entry = entry
+        waiter.granted = True
+        # the slot stays reserved until the waiter wakes up and takes it
+        self._in_use[id(waiter)] = waiter
+        waiter.cond.notify()
+        return True
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._lock:
+            if self._closed:
+                raise PoolExhausted("Connection pool is closed")
+            if self._waiters or (not self._idle and self._size() >= self.maxconn):
+                # queue behind everyone already waiting
+                waited = True
+                placeholder = _Waiter(self._lock)
+                self._waiters.append(placeholder)
+                while not placeholder.granted:
+                    remaining = deadline - time.monotonic()
+                    if self._closed or remaining <= 0:
+                        self._waiters.remove(placeholder)
+                        if self._closed:
+                            raise PoolExhausted("Connection pool is closed")
+                        self.timeouts += 1
+                        raise PoolExhausted(
+                            f"No database connection available after {self.timeout:.1f}s"
+                        )
+                    placeholder.cond.wait(remaining)
+                entry = placeholder.entry
+            else:
+                entry = self._idle.pop() if self._idle else None
+                # reserve the slot before releasing the lock so concurrent callers can't overshoot maxconn
+                placeholder = object()
+                self._in_use[id(placeholder)] = placeholder
+
+            wait = time.monotonic() - started
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_time_total += wait
+                self.wait_time_max = max(self.wait_time_max, wait)
+
+        # connecting and pinging happen outside the lock
+        try:
+            now = time.monotonic()
+            if entry is not None and self._is_stale(entry, now):
+                self._discard(entry[0])
+                self.recycled += 1
+                entry = None
+            if entry is None:
+                entry = [self._connect(), now, now]
+        except Exception:
+            with self._lock:
+                del self._in_use[id(placeholder)]
+                # the slot is free again; the next waiter can try to connect
+                self._hand_off(None)
+            raise
+
+        conn = entry[0]
+        with self._lock:
+            del self._in_use[id(placeholder)]
+            self._in_use[id(conn)] = entry
+        return conn
+
+    def putconn(self, conn, close=False):
+        if id(conn) not in self._in_use:
+            return
+        # the rollback is a round trip; nobody else waits on the lock for it
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        with self._lock:
+            entry = self._in_use.pop(id(conn), None)
+            if entry is None:
+                return
+            if close or conn.closed:
+                self.broken += 1
+            if close or conn.closed or self._closed:
+                self._discard(conn)
+                if not self._closed:
+                    self._hand_off(None)
+            else:
+                entry[2] = time.monotonic()
+                if not self._hand_off(entry):
+                    self._idle.append(entry)
+
+    def closeall(self):
+        with self._lock:
+            self._closed = True
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+            for waiter in self._waiters:
+                waiter.cond.notify()
+
+    @property
+    def busy(self):
+        return len(self._in_use)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._size(),
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": len(self._waiters),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "wait_time_avg": round(self.wait_time_total / self.waits, 6) if self.waits else 0.0,
+                "wait_time_max": round(self.wait_time_max, 6),
+                "timeouts": self.timeouts,
+                "recycled": self.recycled,
+                "broken": self.broken,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Pools must never be shared across a fork; a pool created in the gunicorn
+    # master (or before a fork) is dropped and rebuilt in the child.
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    connect,
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    DB_POOL_TIMEOUT,
+                    DB_POOL_RECYCLE,
+                    DB_POOL_PING_AFTER,
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def reset_pool():
+    """Drop the current process's pools; called from gunicorn's post_fork hook."""
+    global _pool, _pool_pid, _replicas, _replicas_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+            for replica in _replicas or ():
+                replica.pool.closeall()
+        # an inherited pool's sockets belong to the parent, so don't close them here
+        _pool = None
+        _pool_pid = None
+        _replicas = None
+        _replicas_pid = None
+
+
+# how far a replica's replay trails what it has received; an idle primary
+# sends nothing, so a replica that has replayed everything counts as current
+REPLICA_LAG_QUERY = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+    END AS lag
+"""
+
+
+class Replica:
+    """One read replica: its own pool, plus the health and lag last seen."""
+
+    def __init__(self, host, port=None):
+        self.name = f"{host}:{port}" if port else host
+        self.pool = ConnectionPool(
+            functools.partial(connect, host, port),
+            0,
+            DB_REPLICA_POOL_MAX,
+            DB_POOL_TIMEOUT,
+            DB_POOL_RECYCLE,
+            DB_POOL_PING_AFTER,
+        )
+        self.lag = None
+        self.checked_at = 0.0
+        self.down_until = 0.0
+        self.last_error = None
+        self._check_lock = threading.Lock()
+
+    def mark_down(self, error):
+        self.down_until = time.monotonic() + DB_REPLICA_RETRY_AFTER
+        self.last_error = f"{type(error).__name__}: {error}".strip()
+        print(f"Read replica {self.name} unavailable, using the primary:", self.last_error, file=sys.stderr)
+
+    def check(self):
+        """Measure lag if the last check is stale; only one thread does it."""
+        now = time.monotonic()
+        if now - self.checked_at < DB_REPLICA_CHECK_INTERVAL or not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            conn = self.pool.getconn()
+            close = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(REPLICA_LAG_QUERY)
+                    self.lag = float(cursor.fetchone()["lag"])
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+                raise
+            finally:
+                self.pool.putconn(conn, close=close)
+            self.last_error = None
+        except (psycopg2.Error, PoolExhausted) as e:
+            self.lag = None
+            self.mark_down(e)
+        finally:
+            self.checked_at = time.monotonic()
+            self._check_lock.release()
+
+    def usable(self):
+        if time.monotonic() < self.down_until:
+            return False
+        self.check()
+        return time.monotonic() >= self.down_until and self.lag is not None and self.lag <= DB_REPLICA_MAX_LAG
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "lag": self.lag,
+            "down": time.monotonic() < self.down_until,
+            "last_error": self.last_error,
+            "pool": self.pool.stats(),
+        }
+
+
+_replicas = None
+_replicas_pid = None
+_round_robin = itertools.count()
+
+
+def parse_replicas(spec):
+    """[(host, port)] from "host[:port],..."; a socket directory has no port."""
+    replicas = []
+    for entry in filter(None, (part.strip() for part in spec.split(','))):
+        host, _, port = entry.rpartition(':')
+        if host and port.isdigit():
+            replicas.append((host, int(port)))
+        else:
+            replicas.append((entry, None))
+    return replicas
+
+
+def get_replicas():
+    global _replicas, _replicas_pid
+    pid = os.getpid()
+    if _replicas is None or _replicas_pid != pid:
+        with _pool_lock:
+            if _replicas is None or _replicas_pid != pid:
+                _replicas = [Replica(host, port) for host, port in parse_replicas(DB_REPLICAS)]
+                _replicas_pid = pid
+    return _replicas
+
+
+def choose_replica():
+    """A healthy replica that is caught up enough to read from, or None for the primary."""
+    candidates = [replica for replica in get_replicas() if replica.usable()]
+    if not candidates:
+        return None
+    start = next(_round_robin) % len(candidates)
+    if DB_REPLICA_POLICY == "least_connections":
+        # rotated first, so ties (an idle site) still spread across replicas
+        rotated = candidates[start:] + candidates[:start]
+        return min(rotated, key=lambda replica: replica.pool.busy)
+    return candidates[start]
+
+
+@contextmanager
+def get_read_connection(replica=None):
+    """Borrow a connection for reads from `replica` (see choose_replica).
+
+    Falls back to the primary if the replica is None, or has been marked
+    down since it was chosen, or can't hand out a connection.
+    """
+    if replica is not None and time.monotonic() >= replica.down_until:
+        try:
+            conn = replica.pool.getconn()
+        except (psycopg2.Error, PoolExhausted) as e:
+            replica.mark_down(e)
+        else:
+            close = False
+            try:
+                yield conn
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.OperationalError as e:
+                close = True
+                if conn.closed:
+                    # the connection died, not just the query; this request
+                    # fails, later ones go to the primary
+                    replica.mark_down(e)
+                raise
+            except BaseException:
+                try:
+                    if not conn.closed:
+                        conn.rollback()
+                except psycopg2.Error:
+                    close = True
+                raise
+            finally:
+                replica.pool.putconn(conn, close=close)
+            return
+
+    with get_db_connection() as conn:
+        yield conn
+
+
+@contextmanager
+def get_db_connection():
+    """Borrow a pooled connection; commits on success, rolls back on error."""
+    pool = get_pool()
+    conn = pool.getconn()
+    close = False
+    try:
+        yield conn
+        if not conn.closed:
+            conn.commit()
+    except BaseException:
+        try:
+            if not conn.closed:
+                conn.rollback()
+        except psycopg2.Error:
+            close = True
+        raise
+    finally:
+        pool.putconn(conn, close=close)
+
+
+def tuple_cursor(conn):
+    """A plain cursor yielding tuples, for hot paths that map rows themselves."""
+    return conn.cursor(cursor_factory=TimedCursor)
+
+
+def bump_content_version(cursor, name):
+    """Mark 'posts' or 'about' as changed; call inside the writing transaction."""
+    cursor.execute(
+        'UPDATE content_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = %s',
+        (name,)
+    )
+
+
+def pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return None
+    stats = _pool.stats()
+    if _replicas and _replicas_pid == os.getpid():
+        stats["replicas"] = [replica.stats() for replica in _replicas]
+    return stats
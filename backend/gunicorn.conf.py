@@ -0,0 +1,106 @@
+"""Gunicorn settings, picked up automatically by `gunicorn application:application`.
+
+GUNICORN_WORKER_CLASS chooses how a worker waits on Postgres and outbound
+HTTP (the YouTube checks):
+
+  sync     one request per worker; a slow query or API call blocks it
+  gthread  (default) GUNICORN_THREADS requests per worker on OS threads
+  gevent   GUNICORN_WORKER_CONNECTIONS requests per worker on greenlets;
+           psycopg2 is made cooperative with psycogreen. Also the only
+           class that streams live feed changes to visitors (changes.py)
+
+Sizing: WEB_CONCURRENCY workers (default 2 x CPUs + 1 for sync, CPUs + 1
+otherwise). Each worker's DB pool defaults to its request concurrency,
+capped at 20. Keep WEB_CONCURRENCY x DB_POOL_MAX, plus one connection per
+job worker, under Postgres max_connections. Requests beyond the pool wait
+up to DB_POOL_TIMEOUT and then get a 503. With DB_REPLICAS set, each worker
+also keeps up to DB_REPLICA_POOL_MAX connections to every replica.
+With more than one worker CACHE_BUS defaults to postgres (one LISTEN
+connection per worker); CACHE_BUS=local is refused.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+if worker_class not in ("sync", "gthread", "gevent"):
+    raise ValueError(f"Unsupported GUNICORN_WORKER_CLASS: {worker_class}")
+
+# same default gunicorn itself uses: $PORT on all interfaces when set
+bind = os.environ.get(
+    "GUNICORN_BIND",
+    f"0.0.0.0:{os.environ['PORT']}" if "PORT" in os.environ else "127.0.0.1:8000"
+)
+
+_cpus = multiprocessing.cpu_count()
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * _cpus + 1 if worker_class == "sync" else _cpus + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8)) if worker_class == "gthread" else 1
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+if worker_class == "gthread":
+    _per_worker = threads
+elif worker_class == "gevent":
+    _per_worker = worker_connections
+else:
+    _per_worker = 1
+# must be set before db is imported, which reads it once
+os.environ.setdefault("DB_POOL_MAX", str(min(_per_worker, 20)))
+# a write must reach every worker's response cache, and "local" only
+# reaches the worker that made it
+if workers > 1:
+    if os.environ.get("CACHE_BUS") == "local":
+        raise ValueError("CACHE_BUS=local needs WEB_CONCURRENCY=1; use postgres or a redis:// URL")
+    os.environ.setdefault("CACHE_BUS", "postgres")
+# an open change stream is held for minutes. Under gevent that is an idle
+# greenlet, so visitors get streams too and most connections may hold one;
+# otherwise streams are for the admin only and may take at most half the
+# threads (sync workers, with one thread, serve none)
+if worker_class == "gevent":
+    os.environ.setdefault("CHANGES_PUBLIC", "1")
+    os.environ.setdefault("CHANGES_MAX_STREAMS", str(worker_connections * 3 // 4))
+else:
+    os.environ.setdefault("CHANGES_PUBLIC", "0")
+    os.environ.setdefault("CHANGES_MAX_STREAMS", str(_per_worker // 2))
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# keep-alive lets a client reuse one connection; sync workers can't hold it open
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# workers share their Prometheus samples through files here, so /metrics
+# reports the whole server whichever worker answers the scrape; must be
+# set before prometheus_client is first imported
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", tempfile.mkdtemp(prefix="jackrabbit-metrics-"))
+
+# nothing here imports db or application: this file runs in the master,
+# and a gevent worker only monkey-patches after the fork, so locks created
+# in the master would be real OS locks that block every greenlet
+
+
+def on_starting(server):
+    # samples left over from a previous run would be counted again
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    # runs after the gevent worker has monkey-patched and loaded the app
+    if worker_class == "gevent":
+        # psycopg2 otherwise blocks the whole worker, greenlets included
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    import db
+    # drop any connection made while the app loaded, before patching
+    db.reset_pool()
+
+
+def worker_exit(server, worker):
+    import db
+    db.reset_pool()
@@ -0,0 +1,123 @@
+import os
+import posixpath
+import tempfile
+
+from PIL import Image, ImageOps, features
+
+import resumable
+
+
+IMAGE_VARIANT_WIDTHS = tuple(
+    sorted(int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,768,1600").split(","))
+)
+# refuse decompression bombs rather than allocating gigabytes for them
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 50_000_000))
+
+# extension -> (Pillow format, content type, save options)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'avif': ('AVIF', 'image/avif', {'quality': 50, 'speed': 6}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', 'image/png', {'optimize': True}),
+}
+
+
+def variant_formats(original_ext):
+    # modern formats first, the original's format last as the <img> fallback
+    formats = ['webp']
+    if features.check('avif'):
+        formats.append('avif')
+    formats.append('png' if original_ext == 'png' else 'jpg')
+    return formats
+
+
+def variant_widths(width):
+    """Target widths for an image; we never upscale past the original."""
+    widths = {w for w in IMAGE_VARIANT_WIDTHS if w < width}
+    widths.add(min(width, IMAGE_VARIANT_WIDTHS[-1]))
+    return sorted(widths)
+
+
+def _save(img, path, ext):
+    pil_format, _, options = IMAGE_FORMATS[ext]
+    if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    elif pil_format != 'PNG' and img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+    # no exif/icc/xmp arguments are passed, so none of the metadata is written
+    img.save(path, pil_format, **options)
+    return os.path.getsize(path)
+
+
+def generate_variants(src_path, out_dir, stem, original_ext):
+    """Write a metadata-free copy of the original plus resized variants.
+
+    Returns (meta, files): meta describes the image and its variants by name,
+    files lists (name, path, content_type) for everything written to out_dir.
+    """
+    original_ext = 'jpg' if original_ext == 'jpeg' else original_ext
+    files = []
+    variants = []
+
+    with Image.open(src_path) as opened:
+        # bake in the EXIF orientation before the EXIF block is dropped
+        img = ImageOps.exif_transpose(opened)
+        img.load()
+    width, height = img.size
+
+    stripped_path = os.path.join(out_dir, f"stripped.{original_ext}")
+    _save(img, stripped_path, original_ext)
+    files.append((None, stripped_path, IMAGE_FORMATS[original_ext][1]))
+
+    formats = variant_formats(original_ext)
+    for target in variant_widths(width):
+        target_height = max(1, round(height * target / width))
+        resized = img if target == width else img.resize((target, target_height), Image.LANCZOS)
+        for ext in formats:
+            name = f"{stem}_{target}.{ext}"
+            path = os.path.join(out_dir, name)
+            size = _save(resized, path, ext)
+            files.append((name, path, IMAGE_FORMATS[ext][1]))
+            variants.append({
+                'name': name,
+                'width': target,
+                'height': target_height,
+                'format': ext,
+                'bytes': size,
+            })
+
+    return {'kind': 'image', 'width': width, 'height': height, 'variants': variants}, files
+
+
+def process_stored_image(storage, key, href):
+    """Build variants for an image already in storage.
+
+    Returns (meta, stripped_href). The upload is never rewritten: its URL
+    is served as immutable and named by its hash, so the copy without
+    EXIF is stored under a content-hash key of its own, and the post
+    should point there. meta['source'] keeps the upload's href.
+    """
+    directory, filename = os.path.split(key)
+    stem, ext = os.path.splitext(filename)
+    prefix = f"{directory}/" if directory else ''
+    original_ext = ext.lstrip('.').lower()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src_path = os.path.join(tmp, f"source{ext}")
+        storage.download(key, src_path)
+        meta, files = generate_variants(src_path, tmp, stem, original_ext)
+
+        for name, path, content_type in files:
+            if name is None:
+                stripped_key, _ = resumable.store_file(
+                    storage, path, resumable.file_sha256(path), original_ext, content_type
+                )
+            else:
+                storage.upload(prefix + name, path, content_type)
+
+    # variants sit next to the original, so their URLs do too
+    base_href = href.rsplit('/', 1)[0]
+    for variant in meta['variants']:
+        variant['href'] = f"{base_href}/{variant.pop('name')}"
+    meta['source'] = href
+    return meta, f"{base_href}/{posixpath.basename(stripped_key)}"
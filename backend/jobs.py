@@ -0,0 +1,288 @@
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+
+import psycopg2.extras
+
+import db
+from db import get_db_connection
+
+
+# seconds between polls when no NOTIFY arrives; NOTIFY normally wakes us sooner
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 5))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+# retry n waits roughly JOB_BACKOFF_BASE * 2**(n-1) seconds, capped
+JOB_BACKOFF_BASE = float(os.environ.get("JOB_BACKOFF_BASE", 10))
+JOB_BACKOFF_MAX = float(os.environ.get("JOB_BACKOFF_MAX", 3600))
+# a running job whose worker hasn't finished it in this long is assumed dead
+JOB_LEASE = float(os.environ.get("JOB_LEASE", 900))
+# finished jobs are kept this long for inspection, then deleted
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 7 * 24 * 3600))
+JOB_CHANNEL = os.environ.get("JOB_CHANNEL", "jobs")
+
+
+_handlers = {}
+# kind -> seconds between runs, for jobs the worker keeps scheduled itself
+_periodic = {}
+
+
+def handler(kind, every=None):
+    """Register the function that runs jobs of `kind`; it gets the payload dict.
+
+    With `every`, workers also keep one such job queued, due that many
+    seconds after the previous run finished. Whatever the function returns
+    is stored on the job as its result.
+    """
+    def decorator(fn):
+        _handlers[kind] = fn
+        if every:
+            _periodic[kind] = every
+        return fn
+    return decorator
+
+
+def enqueue(cursor, kind, payload, delay=0, max_attempts=JOB_MAX_ATTEMPTS):
+    """Queue a job inside the caller's transaction.
+
+    The job only becomes visible if that transaction commits, so a side
+    effect is never scheduled for a write that rolled back.
+    """
+    cursor.execute(
+        '''
+        INSERT INTO jobs (kind, payload, run_at, max_attempts)
+        VALUES (%s, %s, now() + make_interval(secs => %s), %s)
+        ''',
+        (kind, psycopg2.extras.Json(payload), delay, max_attempts)
+    )
+    # delivered on commit; wakes an idle worker without waiting for its poll
+    cursor.execute("SELECT pg_notify(%s, %s)", (JOB_CHANNEL, kind))
+
+
+def backoff(attempts):
+    delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+    # jitter so a burst of failures doesn't retry in lockstep
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(worker_id):
+    """Lock and mark the next due job as running; returns it or None.
+
+    SKIP LOCKED lets any number of workers claim concurrently without
+    blocking on, or double-claiming, each other's rows.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1,
+                    locked_at = now(), locked_by = %s
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' AND run_at <= now()
+                    ORDER BY run_at, id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+                ''',
+                (worker_id,)
+            )
+            return cursor.fetchone()
+
+
+def complete(job_id, result=None):
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''
+                UPDATE jobs
+                SET status = 'done', finished_at = now(), last_error = NULL, result = %s
+                WHERE id = %s
+                ''',
+                (psycopg2.extras.Json(result) if result is not None else None, job_id)
+            )
+
+
+def fail(job, error):
+    """Schedule a retry with backoff, or give up once attempts run out."""
+    final = job["attempts"] >= job["max_attempts"]
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            if final:
+                cursor.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = now(), last_error = %s WHERE id = %s",
+                    (error, job["id"])
+                )
+            else:
+                cursor.execute(
+                    '''
+                    UPDATE jobs
+                    SET status = 'queued', run_at = now() + make_interval(secs => %s),
+                        locked_at = NULL, locked_by = NULL, last_error = %s
+                    WHERE id = %s
+                    ''',
+                    (backoff(job["attempts"]), error, job["id"])
+                )
+    return final
+
+
+def reap():
+    """Requeue jobs whose worker died mid-run and purge old finished jobs."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                    finished_at = CASE WHEN attempts >= max_attempts THEN now() END,
+                    locked_at = NULL, locked_by = NULL,
+                    last_error = 'lease expired'
+                WHERE status = 'running' AND locked_at < now() - make_interval(secs => %s)
+                ''',
+                (JOB_LEASE,)
+            )
+            requeued = cursor.rowcount
+            cursor.execute(
+                '''
+                DELETE FROM jobs
+                WHERE status IN ('done', 'failed')
+                  AND finished_at < now() - make_interval(secs => %s)
+                ''',
+                (JOB_RETENTION,)
+            )
+    return requeued
+
+
+def schedule_periodic():
+    """Queue the next run of each periodic kind that has nothing queued or running."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            for kind, every in _periodic.items():
+                # serialise workers doing this at the same moment
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"jobs:{kind}",))
+                cursor.execute(
+                    '''
+                    INSERT INTO jobs (kind, run_at)
+                    SELECT %s, coalesce(max(finished_at) + make_interval(secs => %s), now())
+                    FROM jobs
+                    WHERE kind = %s
+                    HAVING count(*) FILTER (WHERE status IN ('queued', 'running')) = 0
+                    ''',
+                    (kind, every, kind)
+                )
+
+
+def run_one(worker_id):
+    """Claim and run a single job; returns False when nothing was due."""
+    job = claim(worker_id)
+    if job is None:
+        return False
+
+    fn = _handlers.get(job["kind"])
+    started = time.monotonic()
+    try:
+        if fn is None:
+            raise LookupError(f"No handler for job kind {job['kind']!r}")
+        result = fn(job["payload"])
+    except Exception as e:
+        final = fail(job, f"{type(e).__name__}: {e}")
+        print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed"
+              f"{'' if not final else ', giving up'}:", e, file=sys.stderr)
+    else:
+        complete(job["id"], result)
+        print(f"Job {job['id']} ({job['kind']}) done in {time.monotonic() - started:.2f}s",
+              file=sys.stderr)
+    return True
+
+
+def _listen_connection():
+    conn = db.connect()
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f'LISTEN "{JOB_CHANNEL}"')
+    return conn
+
+
+def run_worker(worker_id=None):
+    """Process jobs until SIGTERM/SIGINT; drains due jobs before sleeping."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Job worker {worker_id} started, handling: {', '.join(sorted(_handlers))}", file=sys.stderr)
+    listener = None
+    last_reap = 0.0
+    while not stopping:
+        try:
+            if listener is None:
+                listener = _listen_connection()
+            if time.monotonic() - last_reap > 60:
+                reap()
+                schedule_periodic()
+                last_reap = time.monotonic()
+
+            while not stopping and run_one(worker_id):
+                pass
+
+            # the current job always finishes; a signal only stops us between jobs
+            if not stopping and select.select([listener], [], [], JOB_POLL_INTERVAL) != ([], [], []):
+                listener.poll()
+                listener.notifies.clear()
+        except db.PoolExhausted:
+            time.sleep(1)
+        except Exception as e:
+            print("Job worker error:", e, file=sys.stderr)
+            if listener is not None:
+                try:
+                    listener.close()
+                except Exception:
+                    pass
+                listener = None
+            time.sleep(1)
+
+    if listener is not None:
+        listener.close()
+    db.reset_pool()
+    print(f"Job worker {worker_id} stopped", file=sys.stderr)
+
+
+def job_stats():
+    """Queue depth, lag, and recent throughput and failures per kind."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                '''
+                SELECT kind,
+                       count(*) FILTER (WHERE status = 'queued') AS queued,
+                       count(*) FILTER (WHERE status = 'queued' AND run_at <= now()) AS due,
+                       count(*) FILTER (WHERE status = 'running') AS running,
+                       count(*) FILTER (WHERE status = 'done') AS done,
+                       count(*) FILTER (WHERE status = 'failed') AS failed,
+                       count(*) FILTER (WHERE status = 'queued' AND attempts > 0) AS retrying,
+                       extract(epoch FROM max(now() - run_at)
+                           FILTER (WHERE status = 'queued' AND run_at <= now())) AS lag_seconds,
+                       avg(extract(epoch FROM finished_at - locked_at))
+                           FILTER (WHERE status = 'done') AS avg_run_seconds
+                FROM jobs
+                GROUP BY kind
+                ORDER BY kind
+                '''
+            )
+            rows = cursor.fetchall()
+    return {
+        row["kind"]: {
+            key: (float(value) if key.endswith('_seconds') and value is not None else value)
+            for key, value in row.items() if key != "kind"
+        }
+        for row in rows
+    }
@@ -0,0 +1,229 @@
+import itertools
+import os
+import posixpath
+import sys
+import time
+
+import psycopg2.extras
+
+import audio
+import cache
+import images
+import jobs
+import snapshot
+import youtube
+from db import bump_content_version, get_db_connection
+from storage import UploadRejected
+
+
+# media types that get post-upload processing
+PROCESSED_MEDIA_TYPES = ('image', 'audio')
+
+# seconds between garbage collection runs; 0 leaves it to manual runs
+MEDIA_GC_INTERVAL = float(os.environ.get("MEDIA_GC_INTERVAL", 24 * 3600))
+# unreferenced objects younger than this are left alone, which covers
+# uploads whose post hasn't been saved yet
+MEDIA_GC_GRACE = float(os.environ.get("MEDIA_GC_GRACE", 24 * 3600))
+MEDIA_GC_BATCH = int(os.environ.get("MEDIA_GC_BATCH", 1000))
+
+
+def _save_post_columns(post_id, media_href, values):
+    assignments = ', '.join(f'{column} = %s' for column in values)
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # the post may have switched media while we worked; only attach
+            # the results if it still points at the file we processed
+            cursor.execute(
+                f'UPDATE posts SET {assignments} WHERE id = %s AND media_href = %s',
+                (*values.values(), post_id, media_href)
+            )
+            updated = cursor.rowcount
+            if updated:
+                bump_content_version(cursor, 'posts')
+                snapshot.schedule(cursor, [post_id])
+    if updated:
+        cache.invalidate('posts', f'post:{post_id}')
+    return bool(updated)
+
+
+def save_media_meta(post_id, media_href, meta, new_href=None):
+    """Attach processed meta; new_href also moves the post onto a derived
+    copy of its upload (an image without EXIF)."""
+    values = {'media_meta': psycopg2.extras.Json(meta)}
+    if new_href and new_href != media_href:
+        values['media_href'] = new_href
+    return _save_post_columns(post_id, media_href, values)
+
+
+def shared_media_meta(post_id, media_href):
+    """(href, meta) of another post already processed from the same
+    (content-addressed) upload, or None."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # a processed image's post points at its stripped copy, and
+            # names the upload it came from in meta
+            cursor.execute(
+                '''
+                SELECT media_href, media_meta
+                FROM posts
+                WHERE id <> %s AND media_meta IS NOT NULL
+                  AND (media_href = %s OR media_meta->>'source' = %s)
+                LIMIT 1
+                ''',
+                (post_id, media_href, media_href)
+            )
+            row = cursor.fetchone()
+    return (row["media_href"], row["media_meta"]) if row else None
+
+
+def process_post_media(storage, post_id, media_type, media_href):
+    key = storage.key_for_url(media_href)
+    if key is None:
+        # external link, nothing of ours to process
+        return None
+    # the variants already exist, and stay while any post refers to them
+    shared = shared_media_meta(post_id, media_href)
+    if shared is not None:
+        shared_href, meta = shared
+        save_media_meta(post_id, media_href, meta, shared_href)
+        return meta
+    new_href = None
+    if media_type == 'image':
+        # the upload itself is left to media GC once nothing points at it
+        meta, new_href = images.process_stored_image(storage, key, media_href)
+    elif media_type == 'audio':
+        meta = audio.process_stored_audio(storage, key, media_href)
+    else:
+        return None
+    save_media_meta(post_id, media_href, meta, new_href)
+    return meta
+
+
+def media_hrefs(media_href, media_meta):
+    """Every URL a post's media occupies: the upload plus anything derived from it."""
+    hrefs = [media_href] if media_href else []
+    for derived in (media_meta or {}).get('variants', []) + (media_meta or {}).get('renditions', []):
+        hrefs.append(derived['href'])
+    return hrefs
+
+
+def referenced_names(cursor, names):
+    """The subset of object names some post still points at (see media_refs)."""
+    cursor.execute('SELECT DISTINCT name FROM media_refs WHERE name = ANY(%s)', (list(names),))
+    return {row['name'] for row in cursor.fetchall()}
+
+
+def delete_media(storage, hrefs, grace=MEDIA_GC_GRACE):
+    """Delete a post's former media, unless it is still referenced or recent.
+
+    A new upload of the same content reuses the object and only touches
+    it, before any post points at it; like media GC, objects modified
+    within `grace` are left alone and collected later if still orphaned.
+    """
+    keys = {}
+    for href in hrefs:
+        key = storage.key_for_url(href)
+        if key is not None:
+            keys[posixpath.basename(key)] = key
+    if not keys:
+        return
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            # another post may share the file, e.g. after an archive import
+            keep = referenced_names(cursor, keys)
+    cutoff = time.time() - grace
+    for name, key in keys.items():
+        if name in keep:
+            continue
+        try:
+            mtime = storage.mtime(key)
+            if mtime is None or mtime > cutoff:
+                continue
+            storage.delete(key)
+        except UploadRejected:
+            # not a key we could have written, so nothing of ours to remove
+            print(f"Skipping delete of {key}: not a stored key", file=sys.stderr)
+
+
+def collect_garbage(storage, grace=MEDIA_GC_GRACE, batch_size=MEDIA_GC_BATCH, dry_run=False):
+    """Delete stored objects no post references, and report what it found.
+
+    The storage listing is streamed and checked against media_refs a batch
+    at a time, so memory stays flat however many objects there are.
+    """
+    report = {
+        'scanned': 0, 'scanned_bytes': 0,
+        'referenced': 0, 'referenced_bytes': 0,
+        'recent': 0, 'recent_bytes': 0,
+        'orphaned': 0, 'orphaned_bytes': 0,
+        'deleted': 0, 'reclaimed_bytes': 0,
+        'errors': 0, 'dry_run': dry_run,
+    }
+    cutoff = time.time() - grace
+    listing = iter(storage.list_objects())
+    while True:
+        batch = list(itertools.islice(listing, batch_size))
+        if not batch:
+            break
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                keep = referenced_names(cursor, {posixpath.basename(key) for key, _, _ in batch})
+
+        for key, size, mtime in batch:
+            report['scanned'] += 1
+            report['scanned_bytes'] += size
+            if posixpath.basename(key) in keep:
+                report['referenced'] += 1
+                report['referenced_bytes'] += size
+                continue
+            if mtime > cutoff:
+                report['recent'] += 1
+                report['recent_bytes'] += size
+                continue
+            report['orphaned'] += 1
+            report['orphaned_bytes'] += size
+            if dry_run:
+                continue
+            try:
+                storage.delete(key)
+            except Exception as e:
+                report['errors'] += 1
+                print(f"Media GC could not delete {key}:", e, file=sys.stderr)
+            else:
+                report['deleted'] += 1
+                report['reclaimed_bytes'] += size
+    return report
+
+
+def check_post_embed(post_id, media_href):
+    video_id = youtube.extract_video_id(media_href)
+    if not video_id or not youtube.YOUTUBE_API_KEY:
+        return None
+    # let errors propagate so the job is retried with backoff
+    embeddable = youtube.check_video(video_id)["embeddable"]
+    _save_post_columns(post_id, media_href, {'embeddable': embeddable})
+    return embeddable
+
+
+def schedule_post_media(cursor, post_id, media_type, media_href):
+    """Queue processing of a post's uploaded media; runs once the write commits."""
+    if media_type == 'video' and media_href:
+        jobs.enqueue(cursor, 'post.check_embed', {'post_id': post_id, 'media_href': media_href})
+    elif media_type in PROCESSED_MEDIA_TYPES and media_href:
+        jobs.enqueue(cursor, 'media.process', {
+            'post_id': post_id,
+            'media_type': media_type,
+            'media_href': media_href,
+        })
+
+
+def schedule_media_delete(cursor, media_href, media_meta):
+    schedule_posts_media_delete(cursor, [(media_href, media_meta)])
+
+
+def schedule_posts_media_delete(cursor, post_media):
+    """One delete job for the media of several posts, given (media_href, media_meta) pairs."""
+    hrefs = [href for media_href, media_meta in post_media for href in media_hrefs(media_href, media_meta)]
+    if hrefs:
+        jobs.enqueue(cursor, 'media.delete', {'hrefs': hrefs})
@@ -0,0 +1,154 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import orjson
+import requests
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+
+
+# "json" writes one line per request to stderr, "off" disables it
+REQUEST_LOG = os.environ.get("REQUEST_LOG", "json")
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests served',
+    ['method', 'route', 'status'],
+)
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response',
+    ['method', 'route'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time per request spent waiting on SQL',
+    ['method', 'route'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements executed per request',
+    ['method', 'route'], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_HTTP_SECONDS = Histogram(
+    'http_request_outbound_seconds', 'Time per request spent waiting on outbound HTTP',
+    ['method', 'route'], buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'Latency of individual SQL statements',
+    buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_SECONDS = Histogram(
+    'outbound_http_duration_seconds', 'Latency of outbound HTTP calls',
+    ['host'], buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_ERRORS = Counter(
+    'outbound_http_errors_total', 'Outbound HTTP calls that raised before a response',
+    ['host'],
+)
+
+
+class RequestStats:
+    __slots__ = ('started', 'db_seconds', 'db_queries', 'http_seconds', 'http_calls')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.http_seconds = 0.0
+        self.http_calls = 0
+
+
+# per thread under gthread, per greenlet under gevent
+_current = contextvars.ContextVar('request_stats', default=None)
+_http_stats_lock = threading.Lock()
+
+
+def start_request():
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def finish_request():
+    stats = _current.get()
+    _current.set(None)
+    return stats
+
+
+def observe_query(seconds):
+    DB_QUERY_SECONDS.observe(seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.db_queries += 1
+
+
+def observe_http(host, seconds, failed=False):
+    OUTBOUND_SECONDS.labels(host).observe(seconds)
+    if failed:
+        OUTBOUND_ERRORS.labels(host).inc()
+    stats = _current.get()
+    if stats is not None:
+        # concurrent calls made for one request (youtube's oEmbed checks)
+        # all add to its stats
+        with _http_stats_lock:
+            stats.http_seconds += seconds
+            stats.http_calls += 1
+
+
+class TimedSession(requests.Session):
+    """A requests session that records every call's latency by host."""
+
+    def request(self, method, url, *args, **kwargs):
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = super().request(method, url, *args, **kwargs)
+            failed = False
+            return response
+        finally:
+            observe_http(urlsplit(url).hostname or 'unknown', time.perf_counter() - started, failed)
+
+
+def record_request(method, route, status, stats):
+    """Feed one finished request into the histograms; returns its duration in seconds."""
+    duration = time.perf_counter() - stats.started
+    REQUESTS.labels(method, route, str(status)).inc()
+    REQUEST_SECONDS.labels(method, route).observe(duration)
+    REQUEST_DB_SECONDS.labels(method, route).observe(stats.db_seconds)
+    REQUEST_DB_QUERIES.labels(method, route).observe(stats.db_queries)
+    REQUEST_HTTP_SECONDS.labels(method, route).observe(stats.http_seconds)
+    return duration
+
+
+def server_timing(duration, stats):
+    # shows the split in the browser's network panel
+    parts = [f"app;dur={duration * 1000:.1f}", f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"']
+    if stats.http_calls:
+        parts.append(f'http;dur={stats.http_seconds * 1000:.1f};desc="{stats.http_calls} calls"')
+    return ', '.join(parts)
+
+
+def log_request(**fields):
+    if REQUEST_LOG != "json":
+        return
+    record = {'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), 'event': 'request'}
+    record.update(fields)
+    sys.stderr.write(orjson.dumps(record).decode() + '\n')
+
+
+def render():
+    """The Prometheus exposition for this process, or for every gunicorn worker
+    when PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
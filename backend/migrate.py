@@ -0,0 +1,235 @@
+"""Versioned schema migrations.
+
+    python migrate.py            apply pending migrations
+    python migrate.py --status   list applied and pending migrations
+    python migrate.py --check    exit 1 if any are pending
+
+Run it as a release step (the Procfile's `release`), before new web and job
+workers start; they do no DDL themselves. Concurrent runs queue on an
+advisory lock, so only one applies anything.
+
+migrations/NNNN_description.sql files are applied in version order, each in
+one transaction together with its schema_version row. A file starting with
+`-- migrate: no-transaction` instead runs statement by statement outside a
+transaction, which CREATE INDEX CONCURRENTLY requires. Such files are split
+on semicolons, so keep them to plain statements, and make each idempotent
+(IF [NOT] EXISTS): a failure part way leaves the earlier ones applied.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+
+import db
+
+
+MIGRATIONS_DIR = os.environ.get("MIGRATIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations"))
+# how long a transactional migration waits for a table lock before failing;
+# waiting longer would queue every request touching that table behind it
+MIGRATE_LOCK_TIMEOUT = os.environ.get("MIGRATE_LOCK_TIMEOUT", "5s")
+MIGRATE_LOCK_KEY = "jackrabbit:migrate"
+
+NO_TRANSACTION = "-- migrate: no-transaction"
+FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", re.IGNORECASE
+)
+
+
+class MigrationError(Exception):
+    pass
+
+
+def load_migrations(path=MIGRATIONS_DIR):
+    """Every migration file under `path`, in version order."""
+    migrations = []
+    for filename in sorted(os.listdir(path)):
+        match = FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(path, filename), encoding="utf-8") as f:
+            sql = f.read()
+        migrations.append({
+            "version": int(match.group(1)),
+            "name": match.group(2),
+            "sql": sql,
+            "transactional": not sql.startswith(NO_TRANSACTION),
+            "checksum": hashlib.sha256(sql.encode("utf-8")).hexdigest(),
+        })
+    versions = [m["version"] for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise MigrationError(f"Duplicate migration versions in {path}")
+    return migrations
+
+
+def _statements(sql):
+    # comments are dropped first, so a semicolon in one doesn't split a statement
+    code = "\n".join(line for line in sql.splitlines() if not line.strip().startswith("--"))
+    for statement in code.split(";"):
+        if statement.strip():
+            yield statement.strip()
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INTEGER
+        );
+    """)
+
+
+def applied_migrations(cursor):
+    cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL AS present")
+    if not cursor.fetchone()["present"]:
+        return {}
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_version ORDER BY version")
+    return {row["version"]: row for row in cursor.fetchall()}
+
+
+def _warn_changed(migrations, applied):
+    for m in migrations:
+        row = applied.get(m["version"])
+        if row and row["checksum"] != m["checksum"]:
+            print(f"Warning: migration {m['version']:04d}_{m['name']} changed after it was applied",
+                  file=sys.stderr)
+
+
+def _drop_invalid_indexes(cursor, sql):
+    """A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind, which
+    IF NOT EXISTS would then skip on the next run; drop the ones this file builds."""
+    for name in CONCURRENT_INDEX.findall(sql):
+        cursor.execute(
+            '''
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+            ''',
+            (name,)
+        )
+        if cursor.fetchone():
+            print(f"Dropping invalid index {name}", file=sys.stderr)
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def _apply(conn, migration):
+    started = time.monotonic()
+    if migration["transactional"]:
+        conn.autocommit = False
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = %s", (MIGRATE_LOCK_TIMEOUT,))
+                cursor.execute(migration["sql"])
+                _record(cursor, migration, started)
+    else:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            try:
+                for statement in _statements(migration["sql"]):
+                    cursor.execute(statement)
+            except Exception:
+                _drop_invalid_indexes(cursor, migration["sql"])
+                raise
+            _record(cursor, migration, started)
+    conn.autocommit = True
+
+
+def _record(cursor, migration, started):
+    cursor.execute(
+        "INSERT INTO schema_version (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+        (migration["version"], migration["name"], migration["checksum"],
+         round((time.monotonic() - started) * 1000))
+    )
+
+
+def _lock(cursor):
+    """Take the session-level advisory lock, which holds across each
+    migration's own transaction.
+
+    Polls rather than blocking in pg_advisory_lock: a blocked call is an open
+    transaction, and CREATE INDEX CONCURRENTLY in the run holding the lock
+    would wait for it to finish, deadlocking the two.
+    """
+    waiting = False
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s)) AS locked", (MIGRATE_LOCK_KEY,))
+        if cursor.fetchone()["locked"]:
+            return
+        if not waiting:
+            print("Waiting for another migration run to finish...", file=sys.stderr)
+            waiting = True
+        time.sleep(1)
+
+
+def migrate(target=None, path=MIGRATIONS_DIR):
+    """Apply pending migrations up to `target` (default all); returns the ones applied."""
+    migrations = load_migrations(path)
+    conn = db.connect()
+    conn.autocommit = True
+    done = []
+    try:
+        with conn.cursor() as cursor:
+            _lock(cursor)
+            _ensure_version_table(cursor)
+            applied = applied_migrations(cursor)
+        _warn_changed(migrations, applied)
+
+        for m in migrations:
+            if m["version"] in applied or (target is not None and m["version"] > target):
+                continue
+            label = f"{m['version']:04d}_{m['name']}"
+            print(f"Applying {label}...", file=sys.stderr)
+            try:
+                _apply(conn, m)
+            except Exception as e:
+                raise MigrationError(f"Migration {label} failed: {e}") from e
+            done.append(label)
+    finally:
+        conn.close()  # releases the advisory lock
+    return done
+
+
+def status(path=MIGRATIONS_DIR):
+    """(migration, applied row or None) for every migration file."""
+    migrations = load_migrations(path)
+    conn = db.connect()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            applied = applied_migrations(cursor)
+    finally:
+        conn.close()
+    _warn_changed(migrations, applied)
+    return [(m, applied.get(m["version"])) for m in migrations]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="list migrations and exit")
+    parser.add_argument("--check", action="store_true", help="exit 1 if migrations are pending")
+    parser.add_argument("--target", type=int, help="apply migrations up to this version only")
+    args = parser.parse_args()
+
+    if args.status or args.check:
+        rows = status()
+        pending = [m for m, row in rows if row is None]
+        for m, row in rows:
+            state = row["applied_at"].isoformat(timespec="seconds") if row else "pending"
+            print(f"{m['version']:04d}_{m['name']:<40} {state}")
+        return 1 if args.check and pending else 0
+
+    try:
+        done = migrate(args.target)
+    except MigrationError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Applied {len(done)} migration(s)" if done else "Schema is up to date", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,23 @@
+-- The schema the app started with. Written idempotently so databases
+-- created before migrations existed adopt it as a no-op.
+
+CREATE TABLE IF NOT EXISTS posts (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    blurb TEXT,
+    writeup TEXT,
+    media_type TEXT NOT NULL,
+    media_href TEXT,
+    timestamp TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    is_visible BOOLEAN DEFAULT TRUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS about (
+    id SERIAL PRIMARY KEY,
+    header TEXT,
+    body TEXT,
+    last_updated TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO about (header, body)
+SELECT '', '' WHERE NOT EXISTS (SELECT 1 FROM about);
@@ -0,0 +1,93 @@
+-- Columns and tables added for media processing, search, conditional GETs
+-- and the job queue, previously created by init_db() on every boot.
+
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS embeddable BOOLEAN;
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS media_meta JSONB;
+
+-- full-text search; title outranks blurb, which outranks writeup
+ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(blurb, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(writeup, '')), 'C')
+) STORED;
+
+-- one row per content type, bumped in the same transaction as every
+-- write, so conditional GETs can be answered without loading rows
+CREATE TABLE IF NOT EXISTS content_versions (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO content_versions (name) VALUES ('posts'), ('about')
+ON CONFLICT (name) DO NOTHING;
+
+-- durable queue for post-write side effects, see jobs.py
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMPTZ,
+    locked_by TEXT,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMPTZ
+);
+ALTER TABLE jobs ADD COLUMN IF NOT EXISTS result JSONB;
+-- workers only ever scan due, queued jobs
+CREATE INDEX IF NOT EXISTS jobs_due_idx
+ON jobs (run_at, id)
+WHERE status = 'queued';
+
+-- every stored object name a post points at (upload, variants,
+-- renditions); media GC deletes whatever isn't in here
+CREATE TABLE IF NOT EXISTS media_refs (
+    name TEXT NOT NULL,
+    post_id INTEGER NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    PRIMARY KEY (name, post_id)
+);
+CREATE INDEX IF NOT EXISTS media_refs_post_idx ON media_refs (post_id);
+
+CREATE OR REPLACE FUNCTION post_media_names(href TEXT, meta JSONB)
+RETURNS SETOF TEXT AS $$
+    SELECT DISTINCT name FROM (
+        SELECT regexp_replace(h, '^.*/', '') AS name FROM (
+            SELECT href AS h
+            UNION ALL
+            SELECT d->>'href' FROM jsonb_array_elements(coalesce(meta->'variants', '[]')) d
+            UNION ALL
+            SELECT d->>'href' FROM jsonb_array_elements(coalesce(meta->'renditions', '[]')) d
+        ) hrefs
+        WHERE h IS NOT NULL
+    ) names
+    WHERE name <> ''
+$$ LANGUAGE sql IMMUTABLE;
+
+-- kept in sync by the database, so every write path (API, import,
+-- job worker) maintains it without having to remember to
+CREATE OR REPLACE FUNCTION posts_sync_media_refs() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND NEW.media_href IS NOT DISTINCT FROM OLD.media_href
+       AND NEW.media_meta IS NOT DISTINCT FROM OLD.media_meta THEN
+        RETURN NULL;
+    END IF;
+    DELETE FROM media_refs WHERE post_id = NEW.id;
+    INSERT INTO media_refs (name, post_id)
+    SELECT name, NEW.id FROM post_media_names(NEW.media_href, NEW.media_meta) AS name;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS posts_media_refs ON posts;
+CREATE TRIGGER posts_media_refs
+AFTER INSERT OR UPDATE OF media_href, media_meta ON posts
+FOR EACH ROW EXECUTE FUNCTION posts_sync_media_refs();
+
+INSERT INTO media_refs (name, post_id)
+SELECT name, id FROM posts, post_media_names(media_href, media_meta) AS name
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,17 @@
+-- migrate: no-transaction
+-- Built CONCURRENTLY so posts stays writable while they build.
+
+-- supports keyset pagination on (timestamp, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_timestamp_id_idx
+ON posts (timestamp DESC, id DESC);
+
+-- public feed reads only ever touch visible rows; a boolean index on
+-- is_visible alone is never selective enough for the planner to use
+CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_visible_timestamp_idx
+ON posts (timestamp DESC, id DESC)
+WHERE is_visible;
+
+DROP INDEX CONCURRENTLY IF EXISTS posts_visibility_idx;
+
+-- posts_timestamp_id_idx serves every query this one did
+DROP INDEX CONCURRENTLY IF EXISTS posts_timestamp_idx;
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_search_idx
+ON posts USING GIN (search_vector);
@@ -0,0 +1,47 @@
+-- append-only log of post writes, streamed by GET /api/posts/changes
+CREATE TABLE IF NOT EXISTS post_changes (
+    id BIGSERIAL PRIMARY KEY,
+    post_id INTEGER NOT NULL,
+    op TEXT NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS post_changes_changed_at_idx ON post_changes (changed_at);
+
+-- written by the database in the writing transaction, like media_refs, so
+-- every write path (API, batch, import, job worker) is logged. The lock is
+-- held until commit, so writers take change ids one transaction at a time
+-- and ids become visible in order: a reader that has seen change n has
+-- seen every change before it.
+CREATE OR REPLACE FUNCTION posts_log_changes() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('post_changes'));
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO post_changes (post_id, op) SELECT id, 'created' FROM new_rows ORDER BY id;
+    ELSIF TG_OP = 'UPDATE' THEN
+        INSERT INTO post_changes (post_id, op) SELECT id, 'updated' FROM new_rows ORDER BY id;
+    ELSE
+        INSERT INTO post_changes (post_id, op) SELECT id, 'deleted' FROM old_rows ORDER BY id;
+    END IF;
+    IF FOUND THEN
+        -- identical payloads collapse into one notification per transaction
+        PERFORM pg_notify('post_changes', '');
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- statement-level, so a batch or an import logs its rows in one insert
+DROP TRIGGER IF EXISTS posts_log_insert ON posts;
+CREATE TRIGGER posts_log_insert
+AFTER INSERT ON posts REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION posts_log_changes();
+
+DROP TRIGGER IF EXISTS posts_log_update ON posts;
+CREATE TRIGGER posts_log_update
+AFTER UPDATE ON posts REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION posts_log_changes();
+
+DROP TRIGGER IF EXISTS posts_log_delete ON posts;
+CREATE TRIGGER posts_log_delete
+AFTER DELETE ON posts REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION posts_log_changes();
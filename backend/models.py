@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+
+# column order of every posts query that maps onto Post
+POST_COLUMNS = (
+    'id', 'title', 'blurb', 'writeup', 'media_type', 'media_href', 'timestamp', 'is_visible',
+    'embeddable', 'media_meta',
+)
+POST_SELECT = f"SELECT {', '.join(POST_COLUMNS)} FROM posts"
+
+
+@dataclass
+class Post:
+    # slotted so large feeds don't carry a __dict__ per row; orjson serializes
+    # dataclasses directly, so feeds never need an intermediate dict either
+    __slots__ = POST_COLUMNS
+
+    id: int
+    title: str
+    blurb: Optional[str]
+    writeup: Optional[str]
+    media_type: str
+    media_href: Optional[str]
+    timestamp: Optional[datetime]
+    is_visible: bool
+    # YouTube embeddability checked when a video post is saved; None if unknown
+    embeddable: Optional[bool]
+    # derived media (image variants, ...) filled in after upload; None until processed
+    media_meta: Optional[dict]
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a Post from a tuple row selected in POST_COLUMNS order."""
+        return cls(*row)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in POST_COLUMNS}
+
+
+def posts_from_rows(rows):
+    return [Post(*row) for row in rows]
@@ -0,0 +1,78 @@
+import gzip
+import threading
+
+import brotli
+import orjson
+from flask import current_app, request
+
+
+# bodies smaller than this aren't worth the compression headers
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# preferred order when the client accepts several encodings
+ENCODINGS = ('br', 'gzip')
+
+
+def dumps(obj):
+    # orjson writes datetimes (including TIMESTAMPTZ values) as ISO 8601 natively
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
+def parse_bool(value, default=True):
+    # query strings, form fields and JSON all spell booleans differently
+    if value is None:
+        return default
+    return str(value).lower() in ("true", "1", "yes", "on")
+
+
+def json_response(obj, status=200):
+    return current_app.response_class(dumps(obj), status=status, mimetype='application/json')
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def negotiate_encoding(body_size):
+    if body_size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = request.accept_encodings
+    for encoding in ENCODINGS:
+        if accepted[encoding]:
+            return encoding
+    return None
+
+
+class Payload:
+    """An encoded response body plus its compressed variants, built on first use."""
+
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding):
+        data = self._variants.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._variants.get(encoding)
+                if data is None:
+                    data = compress(self.body, encoding)
+                    self._variants[encoding] = data
+        return data
+
+    def to_response(self):
+        response = current_app.response_class(self.body, status=200, headers=self.headers)
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(len(self.body))
+        if encoding:
+            response.set_data(self.variant(encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
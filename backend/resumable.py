@@ -0,0 +1,261 @@
+"""Chunked, resumable uploads stored under their content hash.
+
+A client opens a session with the file's type and size, appends chunks at
+the offset the server last acknowledged, and finalizes. Chunks are
+appended to a staging file and hashed as they arrive; on finalize the
+file is stored as <sha256>.<ext>, so the same media uploaded twice is
+stored once and every post using it shares the object (see media_refs).
+
+Sessions live in UPLOAD_STAGING_DIR as <id>.json plus <id>.part, so every
+web process on the host sees them; the file size is the acknowledged
+offset. Run all web processes against the same staging directory.
+
+Only local storage uses sessions; with S3 the client PUTs straight to
+the bucket under the same content-hash key (see start_upload).
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from storage import SHA256_RE, UploadRejected, content_key, validate_upload
+
+
+UPLOAD_STAGING_DIR = os.environ.get(
+    "UPLOAD_STAGING_DIR", os.path.join(os.environ.get("TMPDIR", "/tmp"), "jackrabbit-uploads")
+)
+# suggested to clients; each append may be at most UPLOAD_CHUNK_MAX
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+UPLOAD_CHUNK_MAX = int(os.environ.get("UPLOAD_CHUNK_MAX", 8 * 1024 * 1024))
+# sessions untouched this long are abandoned and removed
+UPLOAD_SESSION_TTL = float(os.environ.get("UPLOAD_SESSION_TTL", 24 * 3600))
+
+SESSION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+READ_SIZE = 64 * 1024
+
+
+class OffsetMismatch(UploadRejected):
+    """The client appended somewhere other than the acknowledged offset."""
+
+    def __init__(self, offset):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class SessionNotFound(UploadRejected):
+    pass
+
+
+# upload id -> (offset, hasher) for sessions this process appended to, so
+# a chunk normally only hashes its own bytes; another process's appends
+# make the offset disagree, and the hash is rebuilt from the staged file
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+def _paths(upload_id):
+    if not SESSION_ID_RE.match(upload_id or ''):
+        raise SessionNotFound("Unknown upload")
+    base = os.path.join(UPLOAD_STAGING_DIR, upload_id)
+    return base + '.json', base + '.part'
+
+
+def _load(upload_id):
+    meta_path, part_path = _paths(upload_id)
+    try:
+        with open(meta_path) as f:
+            session = json.load(f)
+        session['offset'] = os.path.getsize(part_path)
+    except FileNotFoundError:
+        raise SessionNotFound("Unknown upload")
+    return session, part_path
+
+
+def _discard(upload_id):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+    for path in _paths(upload_id):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _hasher_at(upload_id, f, offset):
+    with _hashers_lock:
+        cached = _hashers.get(upload_id)
+    if cached and cached[0] == offset:
+        return cached[1]
+    hasher = hashlib.sha256()
+    f.seek(0)
+    remaining = offset
+    while remaining:
+        block = f.read(min(READ_SIZE, remaining))
+        if not block:
+            break
+        hasher.update(block)
+        remaining -= len(block)
+    return hasher
+
+
+def _remember(upload_id, offset, hasher):
+    with _hashers_lock:
+        if len(_hashers) > 100:
+            _hashers.clear()
+        _hashers[upload_id] = (offset, hasher)
+
+
+def purge_expired(ttl=UPLOAD_SESSION_TTL):
+    """Remove sessions nobody has appended to within `ttl` seconds."""
+    if not os.path.isdir(UPLOAD_STAGING_DIR):
+        return 0
+    cutoff = time.time() - ttl
+    purged = 0
+    with os.scandir(UPLOAD_STAGING_DIR) as entries:
+        for entry in entries:
+            upload_id, ext = os.path.splitext(entry.name)
+            if ext != '.json' or not SESSION_ID_RE.match(upload_id):
+                continue
+            try:
+                _, part_path = _paths(upload_id)
+                touched = max(entry.stat().st_mtime, os.path.getmtime(part_path))
+            except OSError:
+                touched = 0
+            if touched < cutoff:
+                _discard(upload_id)
+                purged += 1
+    return purged
+
+
+def create_session(content_type, size):
+    """Open an upload session; returns its id and the client-facing state."""
+    ext = validate_upload(content_type, size)
+    os.makedirs(UPLOAD_STAGING_DIR, exist_ok=True)
+    purge_expired()
+
+    upload_id = uuid.uuid4().hex
+    meta_path, part_path = _paths(upload_id)
+    session = {'content_type': content_type, 'ext': ext, 'size': int(size), 'created': time.time()}
+    open(part_path, 'wb').close()
+    with open(meta_path, 'w') as f:
+        json.dump(session, f)
+    return {'upload_id': upload_id, 'offset': 0, 'size': session['size'], 'chunk_size': UPLOAD_CHUNK_SIZE}
+
+
+def session_state(upload_id):
+    session, _ = _load(upload_id)
+    return {'upload_id': upload_id, 'offset': session['offset'], 'size': session['size']}
+
+
+def append_chunk(upload_id, offset, stream, length=None):
+    """Append one chunk at `offset`; returns the new acknowledged offset.
+
+    A chunk that fails part way (dropped connection, too large) is cut back
+    off, so the offset only ever moves by whole acknowledged chunks.
+    """
+    session, part_path = _load(upload_id)
+    if length is not None and length > UPLOAD_CHUNK_MAX:
+        raise UploadRejected(f"Chunks may be at most {UPLOAD_CHUNK_MAX} bytes")
+
+    with open(part_path, 'r+b') as f:
+        # one writer per session across threads and processes
+        fcntl.flock(f, fcntl.LOCK_EX)
+        current = os.fstat(f.fileno()).st_size
+        if offset != current:
+            raise OffsetMismatch(current)
+
+        hasher = _hasher_at(upload_id, f, current)
+        f.seek(current)
+        written = 0
+        try:
+            while True:
+                block = stream.read(READ_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > UPLOAD_CHUNK_MAX:
+                    raise UploadRejected(f"Chunks may be at most {UPLOAD_CHUNK_MAX} bytes")
+                if current + written > session['size']:
+                    raise UploadRejected("Upload is larger than its declared size")
+                f.write(block)
+                hasher.update(block)
+            if length is not None and written != length:
+                raise UploadRejected("Chunk was cut short")
+            f.flush()
+            os.fsync(f.fileno())
+        except BaseException:
+            f.truncate(current)
+            with _hashers_lock:
+                _hashers.pop(upload_id, None)
+            raise
+        _remember(upload_id, current + written, hasher)
+    return current + written
+
+
+def finalize(storage, upload_id, expected_sha256=None):
+    """Store a complete upload under its content hash.
+
+    Returns (key, sha256, deduplicated); deduplicated means the object was
+    already stored and this upload's bytes were discarded.
+    """
+    session, part_path = _load(upload_id)
+    if session['offset'] != session['size']:
+        raise OffsetMismatch(session['offset'])
+
+    try:
+        with open(part_path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            sha256 = _hasher_at(upload_id, f, session['offset']).hexdigest()
+    except FileNotFoundError:
+        # finalized or aborted concurrently
+        raise SessionNotFound("Unknown upload")
+    if expected_sha256 and expected_sha256.lower() != sha256:
+        _discard(upload_id)
+        raise UploadRejected("Upload does not match its checksum")
+
+    key, deduplicated = store_file(storage, part_path, sha256, session['ext'], session['content_type'])
+    _discard(upload_id)
+    return key, sha256, deduplicated
+
+
+def abort(upload_id):
+    _paths(upload_id)
+    _discard(upload_id)
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def existing_key(storage, sha256, ext):
+    """The stored key for this content, if it is already stored; keeps it
+    out of media GC's reach until a post references it again."""
+    if not SHA256_RE.match(sha256 or ''):
+        return None
+    key = content_key(sha256, ext, storage.prefix)
+    if not storage.exists(key):
+        return None
+    try:
+        storage.touch(key)
+    except Exception as e:
+        print(f"Failed to refresh {key}:", e, file=sys.stderr)
+    return key
+
+
+def store_file(storage, path, sha256, ext, content_type):
+    """Upload `path` as <sha256>.<ext> unless that object already exists."""
+    key = existing_key(storage, sha256, ext)
+    if key is not None:
+        return key, True
+    key = content_key(sha256, ext, storage.prefix)
+    storage.upload(key, path, content_type)
+    return key, False
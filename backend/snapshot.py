@@ -0,0 +1,248 @@
+"""Static JSON snapshots of the public site, for a static server or CDN.
+
+    python snapshot.py          # rebuild everything
+
+With SNAPSHOT_DIR set, every content write queues a 'snapshot.publish' job
+in its own transaction, and the job worker rewrites just the files that
+write affected:
+
+    about.json          same body as GET /api/about
+    posts/<id>.json     same body as GET /api/post/<id>, visible posts only
+    feed/index.json     newest posts first: {"posts", "next", "pages"}
+    feed/<n>.json       older feed pages, each linking to the next older one
+
+Feed pages are numbered from the oldest post, so a new post only changes
+the newest page and the index; pages behind it keep their content (and
+their CDN cache). index.json holds the newest page plus the one before it,
+so it never shows just a post or two. Files are written to a temp file
+and renamed into place, so a reader never sees a partial document.
+
+The job may run on any worker, so SNAPSHOT_DIR must be a directory the
+static server shares with every worker.
+"""
+import fcntl
+import os
+import sys
+import tempfile
+
+import orjson
+
+import jobs
+import payloads
+from db import get_db_connection, tuple_cursor
+from models import POST_SELECT, posts_from_rows
+
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "")
+SNAPSHOT_PAGE_SIZE = int(os.environ.get("SNAPSHOT_PAGE_SIZE", 20))
+
+MANIFEST = ".manifest.json"
+MANIFEST_VERSION = 1
+# the fields the feed's cards use, as in GET /api/posts?fields=...
+FEED_COLUMNS = (
+    "id, title, blurb, media_type, media_href, timestamp, is_visible, embeddable, media_meta, "
+    "(writeup IS NOT NULL AND writeup <> '') AS has_writeup"
+)
+
+
+def enabled():
+    return bool(SNAPSHOT_DIR)
+
+
+def schedule(cursor, post_ids=(), about=False, full=False):
+    """Queue a publish of what a write touched; runs once the write commits."""
+    if not enabled():
+        return
+    jobs.enqueue(cursor, 'snapshot.publish', {
+        'post_ids': sorted(set(post_ids)),
+        'about': about,
+        'full': full,
+    })
+
+
+def _path(name):
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def write_atomic(name, body):
+    """Write body to name under SNAPSHOT_DIR via temp-then-rename; False if unchanged."""
+    path = _path(name)
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == body:
+                return False
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600; the static server needs to read it
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+
+def _remove(name):
+    try:
+        os.remove(_path(name))
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _load_manifest():
+    try:
+        with open(_path(MANIFEST), 'rb') as f:
+            manifest = orjson.loads(f.read())
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('page_size') != SNAPSHOT_PAGE_SIZE:
+        return None
+    return manifest
+
+
+def _page_name(number):
+    return f"feed/{number}.json"
+
+
+def _published_numbers(directory):
+    """Numbers n of the n.json files already published under directory."""
+    try:
+        names = os.listdir(_path(directory))
+    except FileNotFoundError:
+        return []
+    return [int(name[:-5]) for name in names if name.endswith('.json') and name[:-5].isdigit()]
+
+
+def _publish_about(cursor):
+    cursor.execute('SELECT id, header, body, last_updated FROM about')
+    row = cursor.fetchone()
+    if row is None:
+        return _remove('about.json')
+    keys = ('id', 'header', 'body', 'last_updated')
+    return write_atomic('about.json', payloads.dumps(dict(zip(keys, row))))
+
+
+def _publish_posts(cursor, post_ids):
+    """Write the documents of visible posts among post_ids, remove the rest."""
+    cursor.execute(POST_SELECT + ' WHERE id = ANY(%s) AND is_visible', (list(post_ids),))
+    visible = {post.id: post for post in posts_from_rows(cursor.fetchall())}
+    changed = 0
+    for post_id in post_ids:
+        name = f"posts/{post_id}.json"
+        if post_id in visible:
+            changed += write_atomic(name, payloads.dumps(visible[post_id]))
+        else:
+            changed += _remove(name)
+    return changed
+
+
+def _publish_feed(cursor, manifest, changed_ids, full):
+    """Rewrite the feed pages whose posts changed; returns (pages, files written)."""
+    cursor.execute('SELECT id FROM posts WHERE is_visible ORDER BY timestamp, id')
+    ids = [row[0] for row in cursor.fetchall()]
+    size = SNAPSHOT_PAGE_SIZE
+    pages = [ids[i:i + size] for i in range(0, len(ids), size)]
+    old_pages = [] if full or manifest is None else manifest['pages']
+    # without a manifest, look at the files to find pages left over from before
+    old_count = len(old_pages) if old_pages else max(_published_numbers('feed'), default=0)
+
+    # a page is stale if its membership moved or one of its posts changed
+    stale = [
+        number for number, page in enumerate(pages, 1)
+        if full or number > len(old_pages) or old_pages[number - 1] != page
+        or not changed_ids.isdisjoint(page)
+    ]
+    newest = len(pages)
+    index_stale = full or newest != len(old_pages) or any(n >= newest - 1 for n in stale)
+
+    wanted = set(stale)
+    if index_stale:
+        wanted.update(n for n in (newest, newest - 1) if n >= 1)
+    cursor.execute(
+        f'SELECT {FEED_COLUMNS} FROM posts WHERE id = ANY(%s) AND is_visible',
+        ([id for n in wanted for id in pages[n - 1]],)
+    )
+    columns = [column.name for column in cursor.description]
+    cards = {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def newest_first(*numbers):
+        return [cards[id] for n in numbers for id in reversed(pages[n - 1]) if id in cards]
+
+    def link(number):
+        return f"{number}.json" if number >= 1 else None
+
+    written = 0
+    for number in stale:
+        written += write_atomic(_page_name(number), payloads.dumps({
+            'posts': newest_first(number),
+            'next': link(number - 1),
+        }))
+    for number in range(newest + 1, old_count + 1):
+        written += _remove(_page_name(number))
+    if index_stale:
+        shown = [n for n in (newest, newest - 1) if n >= 1]
+        written += write_atomic('feed/index.json', payloads.dumps({
+            'posts': newest_first(*shown),
+            'next': link(newest - 2),
+            'pages': newest,
+        }))
+    return pages, written
+
+
+def publish(post_ids=(), about=False, full=False):
+    """Bring the snapshot up to date with the database for what changed.
+
+    Without a manifest (first run, or SNAPSHOT_PAGE_SIZE changed) it
+    rebuilds everything. Returns counts of what it looked at and wrote.
+    """
+    if not enabled():
+        return None
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(_path('.lock'), 'w') as lock:
+        # two workers publishing at once would race on the manifest
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = _load_manifest()
+        full = full or manifest is None
+        post_ids = set(post_ids)
+
+        with get_db_connection() as conn:
+            with tuple_cursor(conn) as cursor:
+                # one snapshot of the database for every file we write
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+                written = 0
+                if about or full:
+                    written += _publish_about(cursor)
+                if full:
+                    cursor.execute('SELECT id FROM posts WHERE is_visible')
+                    post_ids.update(row[0] for row in cursor.fetchall())
+                    # documents of posts deleted since the last publish must go too
+                    post_ids.update(_published_numbers('posts'))
+                written += _publish_posts(cursor, post_ids)
+                pages, feed_written = _publish_feed(cursor, manifest, post_ids, full)
+                written += feed_written
+
+        write_atomic(MANIFEST, payloads.dumps({
+            'version': MANIFEST_VERSION,
+            'page_size': SNAPSHOT_PAGE_SIZE,
+            'pages': pages,
+        }))
+    return {'full': full, 'posts': len(post_ids), 'pages': len(pages), 'written': written}
+
+
+if __name__ == '__main__':
+    if not enabled():
+        print("SNAPSHOT_DIR is not set", file=sys.stderr)
+        sys.exit(1)
+    print(publish(full=True))
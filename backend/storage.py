@@ -0,0 +1,315 @@
+import base64
+import os
+import re
+import shutil
+import threading
+import uuid
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+
+# "s3" for any S3-compatible service (AWS, MinIO, moto), "local" for dev disk
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+# set for MinIO / moto server; unset means AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+# base URL objects are served from (bucket website, CDN); defaults to the bucket URL
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")
+S3_PREFIX = os.getenv("S3_PREFIX", "uploads/")
+# where the app serves /uploads with local storage, as browsers reach it;
+# only URLs under it are treated as ours
+LOCAL_PUBLIC_URL = os.getenv("LOCAL_PUBLIC_URL", "http://localhost:5050/uploads")
+
+PRESIGN_EXPIRES = int(os.getenv("PRESIGN_EXPIRES", 300))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+
+# content types we accept, and the extension stored objects get
+UPLOAD_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'audio/mpeg': 'mp3',
+    'audio/wav': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/wave': 'wav',
+    'audio/ogg': 'ogg',
+}
+
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadRejected(ValueError):
+    pass
+
+
+def validate_upload(content_type, size):
+    """Check an upload request against the type and size limits; return the extension."""
+    ext = UPLOAD_TYPES.get((content_type or '').lower())
+    if ext is None:
+        raise UploadRejected(f"Unsupported content type: {content_type}")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadRejected("File size is required")
+    if size <= 0 or size > UPLOAD_MAX_BYTES:
+        raise UploadRejected(f"File must be between 1 byte and {UPLOAD_MAX_BYTES} bytes")
+    return ext
+
+
+def new_key(ext, prefix=''):
+    return f"{prefix}{uuid.uuid4().hex}.{ext}"
+
+
+def content_key(sha256, ext, prefix=''):
+    return f"{prefix}{sha256}.{ext}"
+
+
+class S3Storage:
+    """Objects in an S3-compatible bucket; clients upload straight to it."""
+
+    def __init__(self, bucket, region, endpoint_url=None, public_url=None, prefix=''):
+        self.bucket = bucket
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.prefix = prefix
+        if public_url:
+            self.public_base = public_url.rstrip('/')
+        elif endpoint_url:
+            self.public_base = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_base = f"https://{bucket}.s3.{region}.amazonaws.com"
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # boto3 clients are thread-safe but their connection pools aren't fork-safe
+        pid = os.getpid()
+        if self._client is None or self._client_pid != pid:
+            with self._lock:
+                if self._client is None or self._client_pid != pid:
+                    self._client = boto3.client(
+                        's3',
+                        region_name=self.region,
+                        endpoint_url=self.endpoint_url,
+                        config=Config(
+                            signature_version='s3v4',
+                            s3={'addressing_style': 'path' if self.endpoint_url else 'auto'}
+                        )
+                    )
+                    self._client_pid = pid
+        return self._client
+
+    def presign_upload(self, content_type, size, expires=PRESIGN_EXPIRES, sha256=None):
+        """A presigned PUT; with the file's sha256 the object is stored under
+        its content hash, and S3 checks the bytes against it."""
+        ext = validate_upload(content_type, size)
+        # ContentType and ContentLength are signed, so S3 rejects a PUT whose
+        # headers don't match what we validated here
+        params = {'Bucket': self.bucket, 'ContentType': content_type, 'ContentLength': int(size)}
+        headers = {'Content-Type': content_type}
+        if SHA256_RE.match(sha256 or ''):
+            key = content_key(sha256, ext, self.prefix)
+            checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+            # signed too, so only bytes with this hash can land under the key
+            params['ChecksumSHA256'] = checksum
+            headers['x-amz-checksum-sha256'] = checksum
+        else:
+            key = new_key(ext, self.prefix)
+        params['Key'] = key
+        upload_url = self.client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires)
+        return {
+            'key': key,
+            'upload_url': upload_url,
+            'public_url': self.public_url(key),
+            'method': 'PUT',
+            'headers': headers,
+            'expires_in': expires,
+        }
+
+    def public_url(self, key):
+        return f"{self.public_base}/{key}"
+
+    def key_for_url(self, url):
+        base = self.public_base + '/'
+        if url and url.startswith(base):
+            return url[len(base):]
+        return None
+
+    def download(self, key, dest_path):
+        self.client.download_file(self.bucket, key, dest_path)
+
+    def upload(self, key, src_path, content_type):
+        self.client.upload_file(src_path, self.bucket, key, ExtraArgs={'ContentType': content_type})
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def touch(self, key):
+        """Reset an object's LastModified, e.g. so media GC treats it as new."""
+        head = self.client.head_object(Bucket=self.bucket, Key=key)
+        # a copy onto itself happens inside S3; no bytes pass through us
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': key},
+            MetadataDirective='REPLACE', ContentType=head.get('ContentType', 'application/octet-stream'),
+            Metadata=head.get('Metadata', {}),
+        )
+
+    def mtime(self, key):
+        """LastModified as a timestamp, or None if there is no such object."""
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head['LastModified'].timestamp()
+
+    def list_objects(self):
+        """Yield (key, size, mtime) for every object under our prefix, a page at a time."""
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'], obj['Size'], obj['LastModified'].timestamp()
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+
+class LocalStorage:
+    """Objects on local disk, for development without an S3 service.
+
+    Presigned URLs point back at our own PUT route with a signed token, so the
+    frontend flow is identical to S3; bytes do pass through the app here.
+    """
+
+    def __init__(self, root, secret_key, upload_route, public_url):
+        self.root = root
+        # keys are bare filenames in root
+        self.prefix = ''
+        self.serializer = URLSafeTimedSerializer(secret_key, salt='local-upload')
+        # callable building the absolute upload URL for a key, supplied by the app
+        self.upload_route = upload_route
+        self.public_base = public_url.rstrip('/')
+        os.makedirs(root, exist_ok=True)
+
+    def presign_upload(self, content_type, size, expires=PRESIGN_EXPIRES):
+        ext = validate_upload(content_type, size)
+        key = new_key(ext)
+        token = self.serializer.dumps({'key': key, 'content_type': content_type, 'size': int(size)})
+        return {
+            'key': key,
+            'upload_url': self.upload_route(key, token),
+            'public_url': self.public_url(key),
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type},
+            'expires_in': expires,
+        }
+
+    def verify_token(self, key, token, expires=PRESIGN_EXPIRES):
+        try:
+            claims = self.serializer.loads(token, max_age=expires)
+        except SignatureExpired:
+            raise UploadRejected("Upload URL expired")
+        except BadSignature:
+            raise UploadRejected("Invalid upload URL")
+        if claims.get('key') != key:
+            raise UploadRejected("Invalid upload URL")
+        return claims
+
+    def write(self, key, stream, claims, content_type, chunk_size=64 * 1024):
+        """Stream a signed upload to disk, enforcing the signed type and size."""
+        if (content_type or '').lower() != claims['content_type'].lower():
+            raise UploadRejected("Content-Type does not match the presigned upload")
+
+        path = self.path(key)
+        tmp_path = path + '.part'
+        written = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > claims['size']:
+                        raise UploadRejected("Upload is larger than the presigned size")
+                    f.write(chunk)
+            if written != claims['size']:
+                raise UploadRejected("Upload size does not match the presigned size")
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return written
+
+    def path(self, key):
+        if '/' in key or key.startswith('.'):
+            raise UploadRejected("Invalid key")
+        return os.path.join(self.root, key)
+
+    def public_url(self, key):
+        return f"{self.public_base}/{key}"
+
+    def key_for_url(self, url):
+        # only our own base: an external link may contain /uploads/ too
+        base = self.public_base + '/'
+        if url and url.startswith(base):
+            return url[len(base):]
+        return None
+
+    def download(self, key, dest_path):
+        shutil.copyfile(self.path(key), dest_path)
+
+    def upload(self, key, src_path, content_type):
+        path = self.path(key)
+        tmp_path = path + '.part'
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def touch(self, key):
+        os.utime(self.path(key))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def mtime(self, key):
+        try:
+            return os.path.getmtime(self.path(key))
+        except FileNotFoundError:
+            return None
+
+    def list_objects(self):
+        """Yield (key, size, mtime) for every stored file, skipping in-flight writes."""
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or entry.name.endswith('.part') or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                yield entry.name, stat.st_size, stat.st_mtime
+
+
+def from_env(upload_folder, secret_key, upload_route):
+    if STORAGE_BACKEND == 's3':
+        if not S3_BUCKET:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        return S3Storage(S3_BUCKET, S3_REGION, S3_ENDPOINT_URL, S3_PUBLIC_URL, S3_PREFIX)
+    if STORAGE_BACKEND == 'local':
+        return LocalStorage(upload_folder, secret_key, upload_route, LOCAL_PUBLIC_URL)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
@@ -0,0 +1,59 @@
+"""Waveform peaks and the ffmpeg-less wav decoder (no database, no ffmpeg)."""
+import os
+import sys
+import wave
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio  # noqa: E402
+
+
+def test_no_samples_no_peaks():
+    assert audio.compute_peaks(np.array([], dtype=np.float32)) == []
+
+
+def test_each_bucket_keeps_its_loudest_sample():
+    samples = np.array([0.1, -0.5, 0.2, 1.0, 0.0, 0.0, -0.25, 0.0], dtype=np.float32)
+    assert audio.compute_peaks(samples, 4) == [128, 255, 0, 64]
+
+
+def test_uneven_buckets_cover_the_whole_clip():
+    samples = np.array([0.5, 0.5, 0.5, -1.0, 0.0], dtype=np.float32)
+    assert audio.compute_peaks(samples, 2) == [128, 255]
+
+
+def test_short_clips_give_one_peak_per_sample():
+    assert audio.compute_peaks(np.array([0.0, -1.0, 2.0], dtype=np.float32), 200) == [0, 255, 255]
+
+
+def test_peak_count_is_honoured_for_long_clips():
+    samples = np.sin(np.linspace(0, 200 * np.pi, 8001)).astype(np.float32)
+    peaks = audio.compute_peaks(samples, 200)
+    assert len(peaks) == 200
+    assert min(peaks) > 240
+
+
+@pytest.mark.parametrize("width", [1, 2, 3, 4])
+def test_wav_decodes_without_ffmpeg(tmp_path, monkeypatch, width):
+    monkeypatch.setattr(audio, "have_ffmpeg", lambda: False)
+    # stereo, silent on the left and half scale on the right
+    full = 1 << (8 * width - 1)
+    frames = b""
+    for value in (0, full // 2, 0, -(full // 2)):
+        if width == 1:
+            frames += bytes([value + 128])
+        else:
+            frames += value.to_bytes(width, "little", signed=True)
+    path = str(tmp_path / "clip.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(width)
+        f.setframerate(8000)
+        f.writeframes(frames)
+
+    samples, rate = audio._decode_mono(path)
+    assert rate == 8000
+    np.testing.assert_allclose(samples, [0.5, 0.5], atol=1e-6)
@@ -0,0 +1,60 @@
+"""Validation of batch post operations (no database)."""
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ADMIN_PASSWORD", "test")
+os.environ.setdefault("REQUEST_LOG", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import application  # noqa: E402
+from application import parse_batch  # noqa: E402
+
+
+def test_operations_are_normalized():
+    parsed = parse_batch({"operations": [
+        {"op": "set_visibility", "ids": [3, 1, 3], "is_visible": "false"},
+        {"op": "patch", "ids": [2], "fields": {"blurb": "b", "is_visible": 1}},
+        {"op": "delete", "ids": [5, 4]},
+    ]})
+    assert parsed == [
+        ("update", [1, 3], {"is_visible": False}),
+        ("update", [2], {"blurb": "b", "is_visible": True}),
+        ("delete", [4, 5], None),
+    ]
+
+
+@pytest.mark.parametrize("body", [
+    None,
+    [],
+    {},
+    {"operations": []},
+    {"operations": ["delete"]},
+    {"operations": [{"op": "delete"}]},
+    {"operations": [{"op": "delete", "ids": []}]},
+    {"operations": [{"op": "delete", "ids": ["1"]}]},
+    {"operations": [{"op": "delete", "ids": [True]}]},
+    {"operations": [{"op": "archive", "ids": [1]}]},
+    {"operations": [{"op": "set_visibility", "ids": [1]}]},
+    {"operations": [{"op": "patch", "ids": [1]}]},
+    {"operations": [{"op": "patch", "ids": [1], "fields": {}}]},
+    {"operations": [{"op": "patch", "ids": [1], "fields": {"media_href": "x"}}]},
+    {"operations": [{"op": "patch", "ids": [1], "fields": {"title": ""}}]},
+])
+def test_malformed_batches_are_refused(body):
+    with pytest.raises(ValueError):
+        parse_batch(body)
+
+
+def test_errors_name_the_operation():
+    body = {"operations": [{"op": "delete", "ids": [1]}, {"op": "delete", "ids": "all"}]}
+    with pytest.raises(ValueError, match=r"operations\[1\]\.ids"):
+        parse_batch(body)
+
+
+def test_batch_size_is_capped_across_operations():
+    half = list(range(application.BATCH_MAX_IDS // 2 + 1))
+    with pytest.raises(ValueError, match="at most"):
+        parse_batch({"operations": [{"op": "delete", "ids": half}, {"op": "delete", "ids": half}]})
@@ -0,0 +1,84 @@
+"""ResponseCache eviction, expiry and tag invalidation (no database)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+
+
+class FakeBus:
+    def __init__(self):
+        self.published = []
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+
+    def publish(self, tags):
+        self.published.append(tags)
+
+
+def test_least_recently_used_entry_is_evicted():
+    c = cache.ResponseCache(2, 60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert (c.get("a"), c.get("c")) == (1, 3)
+    assert c.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    c = cache.ResponseCache(10, 60)
+    c.set("fresh", 1)
+    c.set("stale", 2, ttl=-1)
+    assert c.get("fresh") == 1
+    assert c.get("stale") is None
+    stats = c.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 1)
+
+
+def test_invalidating_a_tag_drops_only_its_entries():
+    c = cache.ResponseCache(10, 60)
+    c.set("feed", 1, tags=("posts",))
+    c.set("post:1", 2, tags=("posts", "post:1"))
+    c.set("about", 3, tags=("about",))
+    c.invalidate("post:1")
+    assert c.get("post:1") is None
+    assert c.get("feed") == 1
+    c.invalidate("posts")
+    assert c.get("feed") is None
+    assert c.get("about") == 3
+    assert c.invalidated_within(["posts"], 5)
+    assert not c.invalidated_within(["about"], 5)
+
+
+def test_replacing_an_entry_drops_its_old_tags():
+    c = cache.ResponseCache(10, 60)
+    c.set("k", 1, tags=("old",))
+    c.set("k", 2, tags=("new",))
+    c.invalidate("old")
+    assert c.get("k") == 2
+    assert "old" not in c._tags
+
+
+def test_invalidations_go_out_on_the_bus_and_come_back_in():
+    bus = FakeBus()
+    c = cache.ResponseCache(10, 60, bus)
+    c.set("a", 1, tags=("posts",))
+    c.set("b", 2, tags=("about",))
+    c.invalidate("posts")
+    assert bus.published == [["posts"]]
+    # another worker's write arrives through the listener
+    bus.callback(["about"])
+    assert c.get("b") is None
+
+
+def test_clear_drops_everything():
+    c = cache.ResponseCache(10, 60)
+    c.set("a", 1, tags=("x",))
+    c.clear()
+    assert c.get("a") is None
+    assert c.stats()["size"] == 0
@@ -0,0 +1,95 @@
+"""Conditional GETs stay correct across workers that don't share a cache.
+
+Needs a migrated Postgres database (DB_HOST, DB_USER, DB_NAME, ...); the
+posts it creates are deleted again. Run from backend/:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+if not os.environ.get("DB_HOST"):
+    pytest.skip("DB_HOST is not set", allow_module_level=True)
+
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ADMIN_PASSWORD", "test")
+os.environ.setdefault("CACHE_BUS", "local")
+os.environ.setdefault("REQUEST_LOG", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrate  # noqa: E402
+
+migrate.migrate()
+
+import application  # noqa: E402
+import cache  # noqa: E402
+
+
+class Worker:
+    """A test client with a response cache of its own, as a gunicorn worker has."""
+
+    def __init__(self):
+        self.cache = cache.ResponseCache(cache.CACHE_MAX_ENTRIES, cache.CACHE_TTL)
+        self.client = application.app.test_client()
+
+    def request(self, method, *args, **kwargs):
+        cache._cache, cache._cache_pid = self.cache, os.getpid()
+        return getattr(self.client, method)(*args, **kwargs)
+
+    def login(self):
+        response = self.request('post', '/api/login', json={"password": os.environ["ADMIN_PASSWORD"]})
+        assert response.status_code == 200
+
+
+@pytest.fixture
+def post():
+    admin = Worker()
+    admin.login()
+    response = admin.request('post', '/api/posts', json={"title": "before", "blurb": "b", "media_type": "none"})
+    assert response.status_code == 201
+    post_id = response.get_json()["id"]
+    yield post_id
+    admin.request('delete', f'/api/posts/{post_id}')
+
+
+def test_write_on_another_worker_is_not_answered_with_304(post):
+    reader, writer = Worker(), Worker()
+    writer.login()
+
+    first = reader.request('get', f'/api/post/{post}')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    # only the writer's own cache hears about this write
+    assert writer.request('put', f'/api/posts/{post}', json={"title": "after"}).status_code == 200
+
+    again = reader.request('get', f'/api/post/{post}', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.get_json()["title"] == "after"
+    assert again.headers['ETag'] != etag
+
+
+def test_admin_hidden_read_sees_other_workers_write(post):
+    reader, writer = Worker(), Worker()
+    reader.login()
+    writer.login()
+
+    url = f'/api/post/{post}?include_hidden=1'
+    etag = reader.request('get', url).headers['ETag']
+    assert writer.request('put', f'/api/posts/{post}', json={"title": "edited", "is_visible": False}).status_code == 200
+
+    again = reader.request('get', url, headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.get_json()["title"] == "edited"
+
+
+def test_feed_body_cached_before_a_write_is_not_served_after_it(post):
+    reader, writer = Worker(), Worker()
+    writer.login()
+
+    assert any(p["id"] == post for p in reader.request('get', '/api/posts').get_json())
+    assert writer.request('delete', f'/api/posts/{post}').status_code == 200
+
+    assert all(p["id"] != post for p in reader.request('get', '/api/posts').get_json())
@@ -0,0 +1,56 @@
+"""Feed query parameters: cursors, page limits and field lists (no database)."""
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("ADMIN_PASSWORD", "test")
+os.environ.setdefault("REQUEST_LOG", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import application  # noqa: E402
+
+
+def test_cursor_round_trips():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = application.encode_cursor(timestamp, 42)
+    assert "=" not in cursor
+    assert application.decode_cursor(cursor) == (timestamp, 42)
+
+
+def test_missing_cursor_starts_at_the_newest_post():
+    assert application.decode_cursor(None) is None
+    assert application.decode_cursor("") is None
+
+
+@pytest.mark.parametrize("value", ["not-a-cursor", "e30", "WzEsMiwzXQ", "WyJ4IiwgMV0"])
+def test_bad_cursors_are_refused(value):
+    # garbage, {}, [1, 2, 3] and ["x", 1]
+    with pytest.raises(ValueError):
+        application.decode_cursor(value)
+
+
+def test_limit_defaults_and_is_capped():
+    assert application.parse_limit(None) is None
+    assert application.parse_limit("", 20) == 20
+    assert application.parse_limit("5") == 5
+    assert application.parse_limit("100000") == application.POSTS_PAGE_MAX
+
+
+@pytest.mark.parametrize("value", ["0", "-3", "ten", "1.5"])
+def test_bad_limits_are_refused(value):
+    with pytest.raises(ValueError):
+        application.parse_limit(value)
+
+
+def test_fields_are_deduplicated_in_order():
+    assert application.parse_fields(None) is None
+    assert application.parse_fields("") is None
+    assert application.parse_fields(" title, id ,title,,") == ["title", "id"]
+
+
+def test_unknown_fields_are_named():
+    with pytest.raises(ValueError, match="password"):
+        application.parse_fields("id,password")
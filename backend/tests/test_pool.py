@@ -0,0 +1,151 @@
+"""ConnectionPool behaviour, against stand-in connections (no database)."""
+import os
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+class FakeInfo:
+    transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    def __init__(self, fail_rollback=False):
+        self.closed = 0
+        self.info = FakeInfo()
+        self.rollbacks = 0
+        self.fail_rollback = fail_rollback
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.fail_rollback:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(maxconn=3, timeout=1.0, minconn=0, connect=FakeConnection):
+    return db.ConnectionPool(connect, minconn, maxconn, timeout, recycle=0, ping_after=0)
+
+
+def test_reuses_idle_connections():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()["size"] == 1
+
+
+def test_times_out_when_exhausted():
+    pool = make_pool(maxconn=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(db.PoolExhausted):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["waiting"] == 0
+
+
+def test_rolls_back_an_open_transaction_on_return():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert pool.getconn() is conn
+
+
+def test_failed_rollback_discards_the_connection():
+    pool = make_pool(connect=lambda: FakeConnection(fail_rollback=True))
+    conn = pool.getconn()
+    conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INERROR
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()["broken"] == 1
+    assert pool.getconn() is not conn
+
+
+def test_closed_connection_frees_a_slot_for_a_waiter():
+    pool = make_pool(maxconn=1)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    while pool.stats()["waiting"] == 0:
+        time.sleep(0.001)
+    pool.putconn(conn, close=True)
+    waiter.join(1)
+    assert got and got[0] is not conn
+    assert pool.stats()["size"] == 1
+
+
+def test_failed_connect_releases_its_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise psycopg2.OperationalError("could not connect")
+        return FakeConnection()
+
+    pool = make_pool(maxconn=1, connect=connect)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn()
+    assert pool.getconn() is not None
+
+
+def test_waiters_are_served_in_arrival_order():
+    pool = make_pool(maxconn=1)
+    held = pool.getconn()
+    order = []
+
+    def wait(n):
+        conn = pool.getconn()
+        order.append(n)
+        pool.putconn(conn)
+
+    threads = []
+    for n in range(5):
+        thread = threading.Thread(target=wait, args=(n,))
+        thread.start()
+        threads.append(thread)
+        while pool.stats()["waiting"] < n + 1:
+            time.sleep(0.001)
+    pool.putconn(held)
+    for thread in threads:
+        thread.join(1)
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_newcomers_cannot_starve_waiters():
+    # short holds on a small pool: every caller gets through well within
+    # the timeout, since a released connection goes to the oldest waiter
+    pool = make_pool(maxconn=3, timeout=0.2)
+    errors = []
+
+    def work():
+        for _ in range(200):
+            try:
+                conn = pool.getconn()
+            except db.PoolExhausted as e:
+                errors.append(e)
+                continue
+            time.sleep(0.0005)
+            pool.putconn(conn)
+
+    threads = [threading.Thread(target=work) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert pool.stats()["size"] <= 3
@@ -0,0 +1,135 @@
+"""Resumable uploads against local storage in a temporary directory (no database)."""
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resumable  # noqa: E402
+import storage  # noqa: E402
+from storage import UploadRejected  # noqa: E402
+
+
+class BrokenStream:
+    """Yields `data`, then fails as a dropped connection would."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size):
+        if self.data:
+            block, self.data = self.data[:size], self.data[size:]
+            return block
+        raise ConnectionResetError("client went away")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(resumable, "UPLOAD_STAGING_DIR", str(tmp_path / "staging"))
+    resumable._hashers.clear()
+    return storage.LocalStorage(str(tmp_path / "uploads"), "test", lambda key, token: key, "http://test/uploads")
+
+
+def start(data):
+    return resumable.create_session("image/png", len(data))["upload_id"]
+
+
+def test_chunks_append_at_the_acknowledged_offset(store):
+    data = b"abcdefghij"
+    upload_id = start(data)
+    assert resumable.append_chunk(upload_id, 0, io.BytesIO(data[:4]), 4) == 4
+    assert resumable.append_chunk(upload_id, 4, io.BytesIO(data[4:])) == 10
+    assert resumable.session_state(upload_id)["offset"] == 10
+
+
+def test_chunk_at_the_wrong_offset_is_refused(store):
+    upload_id = start(b"abcdefghij")
+    resumable.append_chunk(upload_id, 0, io.BytesIO(b"abcd"))
+    with pytest.raises(resumable.OffsetMismatch) as e:
+        resumable.append_chunk(upload_id, 2, io.BytesIO(b"cdef"))
+    assert e.value.offset == 4
+    assert resumable.session_state(upload_id)["offset"] == 4
+
+
+def test_failed_chunk_is_cut_back_off(store):
+    upload_id = start(b"abcdefghij")
+    resumable.append_chunk(upload_id, 0, io.BytesIO(b"abc"))
+    with pytest.raises(ConnectionResetError):
+        resumable.append_chunk(upload_id, 3, BrokenStream(b"def"))
+    assert resumable.session_state(upload_id)["offset"] == 3
+
+
+def test_short_or_oversized_chunks_are_cut_back_off(store):
+    upload_id = start(b"abcdef")
+    with pytest.raises(UploadRejected):
+        resumable.append_chunk(upload_id, 0, io.BytesIO(b"abc"), 5)
+    with pytest.raises(UploadRejected):
+        resumable.append_chunk(upload_id, 0, io.BytesIO(b"abcdefgh"))
+    assert resumable.session_state(upload_id)["offset"] == 0
+
+
+def test_resumed_upload_hashes_every_byte(store):
+    data = b"0123456789" * 1000
+    upload_id = start(data)
+    resumable.append_chunk(upload_id, 0, io.BytesIO(data[:3000]))
+    # another process picks the session up with none of our hash state
+    resumable._hashers.clear()
+    offset = resumable.session_state(upload_id)["offset"]
+    resumable.append_chunk(upload_id, offset, io.BytesIO(data[offset:]))
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    key, digest, deduplicated = resumable.finalize(store, upload_id, sha256)
+    assert (key, digest, deduplicated) == (f"{sha256}.png", sha256, False)
+    with open(store.path(key), "rb") as f:
+        assert f.read() == data
+    with pytest.raises(resumable.SessionNotFound):
+        resumable.session_state(upload_id)
+
+
+def test_finalize_needs_every_byte(store):
+    upload_id = start(b"abcdef")
+    resumable.append_chunk(upload_id, 0, io.BytesIO(b"abc"))
+    with pytest.raises(resumable.OffsetMismatch):
+        resumable.finalize(store, upload_id)
+
+
+def test_checksum_mismatch_discards_the_upload(store):
+    upload_id = start(b"abcdef")
+    resumable.append_chunk(upload_id, 0, io.BytesIO(b"abcdef"))
+    with pytest.raises(UploadRejected):
+        resumable.finalize(store, upload_id, "0" * 64)
+    with pytest.raises(resumable.SessionNotFound):
+        resumable.session_state(upload_id)
+    assert list(store.list_objects()) == []
+
+
+def test_same_content_is_stored_once(store):
+    keys = []
+    for _ in range(2):
+        upload_id = start(b"same bytes")
+        resumable.append_chunk(upload_id, 0, io.BytesIO(b"same bytes"))
+        key, _, deduplicated = resumable.finalize(store, upload_id)
+        keys.append((key, deduplicated))
+    assert keys[0][0] == keys[1][0]
+    assert [d for _, d in keys] == [False, True]
+    assert len(list(store.list_objects())) == 1
+
+
+def test_store_file_reuses_an_existing_object(store, tmp_path):
+    path = tmp_path / "media.png"
+    path.write_bytes(b"png bytes")
+    sha256 = resumable.file_sha256(str(path))
+    assert resumable.existing_key(store, sha256, "png") is None
+    assert resumable.store_file(store, str(path), sha256, "png", "image/png") == (f"{sha256}.png", False)
+    assert resumable.store_file(store, str(path), sha256, "png", "image/png") == (f"{sha256}.png", True)
+    assert resumable.existing_key(store, "not a hash", "png") is None
+
+
+def test_unknown_session_ids_are_refused(store):
+    with pytest.raises(resumable.SessionNotFound):
+        resumable.session_state("../../etc/passwd")
+    with pytest.raises(resumable.SessionNotFound):
+        resumable.append_chunk("0" * 32, 0, io.BytesIO(b"x"))
@@ -0,0 +1,133 @@
+"""Incremental feed paging in snapshots, against a stand-in cursor (no database)."""
+import json
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot  # noqa: E402
+
+Column = namedtuple('Column', 'name')
+START = datetime(2024, 1, 1)
+
+
+class FakeCursor:
+    """Answers the two queries _publish_feed makes from a list of posts."""
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.rows = []
+        self.description = None
+
+    def execute(self, query, params=None):
+        if query.startswith('SELECT id FROM posts'):
+            visible = sorted((p for p in self.posts if p['is_visible']), key=lambda p: (p['timestamp'], p['id']))
+            self.rows = [(p['id'],) for p in visible]
+        else:
+            wanted = set(params[0])
+            self.rows = [(p['id'], p['title']) for p in self.posts if p['id'] in wanted and p['is_visible']]
+            self.description = [Column('id'), Column('title')]
+
+    def fetchall(self):
+        return self.rows
+
+
+def make_posts(count):
+    return [
+        {'id': n, 'title': f"post {n}", 'timestamp': START + timedelta(minutes=n), 'is_visible': True}
+        for n in range(1, count + 1)
+    ]
+
+
+def read(name):
+    with open(os.path.join(snapshot.SNAPSHOT_DIR, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path))
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_PAGE_SIZE', 3)
+    written = []
+    write_atomic = snapshot.write_atomic
+
+    def spy(name, body):
+        changed = write_atomic(name, body)
+        if changed:
+            written.append(name)
+        return changed
+
+    monkeypatch.setattr(snapshot, 'write_atomic', spy)
+
+    def publish(posts, manifest=None, changed_ids=(), full=False):
+        written.clear()
+        pages, _ = snapshot._publish_feed(FakeCursor(posts), manifest, set(changed_ids), full)
+        return {'pages': pages}, sorted(written)
+
+    return publish
+
+
+def ids(document):
+    return [post['id'] for post in document['posts']]
+
+
+def test_full_build_pages_from_the_oldest_post(feed):
+    manifest, written = feed(make_posts(8), full=True)
+    assert manifest['pages'] == [[1, 2, 3], [4, 5, 6], [7, 8]]
+    assert written == ['feed/1.json', 'feed/2.json', 'feed/3.json', 'feed/index.json']
+
+    index = read('feed/index.json')
+    # the newest page plus the one before it, so it never shows just a post or two
+    assert ids(index) == [8, 7, 6, 5, 4]
+    assert (index['next'], index['pages']) == ('1.json', 3)
+    assert ids(read('feed/1.json')) == [3, 2, 1]
+    assert read('feed/1.json')['next'] is None
+    assert read('feed/2.json')['next'] == '1.json'
+
+
+def test_new_post_only_rewrites_the_newest_page_and_the_index(feed):
+    posts = make_posts(8)
+    manifest, _ = feed(posts, full=True)
+    posts.append(make_posts(9)[-1])
+    _, written = feed(posts, manifest, changed_ids=[9])
+    assert written == ['feed/3.json', 'feed/index.json']
+    assert ids(read('feed/index.json')) == [9, 8, 7, 6, 5, 4]
+
+
+def test_editing_an_old_post_leaves_the_index_alone(feed):
+    posts = make_posts(8)
+    manifest, _ = feed(posts, full=True)
+    posts[1]['title'] = "edited"
+    _, written = feed(posts, manifest, changed_ids=[2])
+    assert written == ['feed/1.json']
+    assert read('feed/1.json')['posts'][1]['title'] == "edited"
+
+
+def test_hiding_a_post_moves_the_pages_after_it(feed):
+    posts = make_posts(8)
+    manifest, _ = feed(posts, full=True)
+    posts[4]['is_visible'] = False
+    manifest, written = feed(posts, manifest, changed_ids=[5])
+    assert manifest['pages'] == [[1, 2, 3], [4, 6, 7], [8]]
+    assert written == ['feed/2.json', 'feed/3.json', 'feed/index.json']
+    assert 5 not in ids(read('feed/index.json'))
+
+
+def test_pages_past_the_end_are_removed(feed):
+    posts = make_posts(8)
+    manifest, _ = feed(posts, full=True)
+    del posts[5:]
+    manifest, _ = feed(posts, manifest, changed_ids=[6, 7, 8])
+    assert manifest['pages'] == [[1, 2, 3], [4, 5]]
+    assert not os.path.exists(os.path.join(snapshot.SNAPSHOT_DIR, 'feed/3.json'))
+    assert read('feed/index.json')['next'] is None
+
+
+def test_leftover_pages_are_removed_without_a_manifest(feed):
+    feed(make_posts(8), full=True)
+    feed(make_posts(2), full=True)
+    assert sorted(os.listdir(os.path.join(snapshot.SNAPSHOT_DIR, 'feed'))) == ['1.json', 'index.json']
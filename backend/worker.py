@@ -0,0 +1,15 @@
+"""Job worker: runs the side effects post writes queue up (see jobs.py).
+
+    python worker.py
+
+Importing the app registers the job handlers; the schema must already be
+migrated (`python migrate.py`, the Procfile's release step). Run as many
+of these as the queue needs; they coordinate through SKIP LOCKED, not
+through each other.
+"""
+from application import application  # noqa: F401
+import jobs
+
+
+if __name__ == '__main__':
+    jobs.run_worker()
@@ -0,0 +1,157 @@
+import contextvars
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from cache import ResponseCache
+
+
+YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+# overridable so the checker can be pointed at a local stub server
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3/videos")
+YOUTUBE_OEMBED_URL = os.getenv("YOUTUBE_OEMBED_URL", "https://www.youtube.com/oembed")
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", 5))
+YOUTUBE_CACHE_TTL = float(os.getenv("YOUTUBE_CACHE_TTL", 6 * 3600))
+# not-found answers are cached too, but briefly, in case the video goes public
+YOUTUBE_NEGATIVE_TTL = float(os.getenv("YOUTUBE_NEGATIVE_TTL", 600))
+YOUTUBE_CACHE_SIZE = 2048
+# the Data API accepts at most 50 ids per videos.list call
+YOUTUBE_BATCH_MAX = 50
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+VIDEO_URL_RE = re.compile(
+    r'(?:youtube\.com/(?:[^/]+/.+/|(?:v|embed|shorts)/|.*[?&]v=)|youtu\.be/)([A-Za-z0-9_-]{11})',
+    re.IGNORECASE
+)
+
+
+class YoutubeError(Exception):
+    pass
+
+
+_state = None
+_state_pid = None
+_state_lock = threading.Lock()
+
+
+def _get_state():
+    # sockets and threads must not be shared with a forked parent
+    global _state, _state_pid
+    pid = os.getpid()
+    if _state is None or _state_pid != pid:
+        with _state_lock:
+            if _state is None or _state_pid != pid:
+                session = metrics.TimedSession()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _state = {
+                    'session': session,
+                    'executor': ThreadPoolExecutor(max_workers=8, thread_name_prefix='youtube'),
+                    'results': ResponseCache(YOUTUBE_CACHE_SIZE, YOUTUBE_CACHE_TTL),
+                }
+                _state_pid = pid
+    return _state
+
+
+def is_video_id(value):
+    return bool(value and VIDEO_ID_RE.match(value))
+
+
+def extract_video_id(url):
+    if not url:
+        return None
+    match = VIDEO_URL_RE.search(url)
+    return match.group(1) if match else None
+
+
+def _status_embeddable(item):
+    status = item.get("status", {})
+    content_details = item.get("contentDetails", {})
+
+    can_embed = status.get("embeddable", False) and status.get("privacyStatus", "") == "public"
+
+    # Block region- or age-restricted videos
+    if content_details.get("regionRestriction") or \
+            content_details.get("contentRating", {}).get("ytRating") == "ytAgeRestricted":
+        can_embed = False
+    return can_embed
+
+
+def _fetch_statuses(session, video_ids):
+    response = session.get(
+        YOUTUBE_API_URL,
+        params={'part': 'status,contentDetails', 'id': ','.join(video_ids), 'key': YOUTUBE_API_KEY},
+        timeout=YOUTUBE_TIMEOUT
+    )
+    data = response.json()
+    if 'error' in data:
+        raise YoutubeError(data['error'].get('message', 'YouTube Data API error'))
+    return {item['id']: _status_embeddable(item) for item in data.get('items', [])}
+
+
+def _oembed_ok(session, video_id):
+    try:
+        response = session.get(
+            YOUTUBE_OEMBED_URL,
+            params={'url': f'https://www.youtube.com/watch?v={video_id}', 'format': 'json'},
+            timeout=YOUTUBE_TIMEOUT
+        )
+        return response.status_code == 200
+    except requests.RequestException as e:
+        print("oEmbed check failed:", e, file=sys.stderr)
+        return False
+
+
+def check_videos(video_ids):
+    """Return {video_id: {"embeddable": bool, "found": bool}} for up to 50 ids.
+
+    Uncached ids cost one Data API call between them, with their oEmbed
+    checks running concurrently alongside it.
+    """
+    state = _get_state()
+    results = {}
+    missing = []
+    for video_id in dict.fromkeys(video_ids):
+        hit = state['results'].get(video_id)
+        if hit is not None:
+            results[video_id] = hit
+        else:
+            missing.append(video_id)
+
+    if not missing:
+        return results
+    if len(missing) > YOUTUBE_BATCH_MAX:
+        raise YoutubeError(f"At most {YOUTUBE_BATCH_MAX} video ids per request")
+    if not YOUTUBE_API_KEY:
+        raise YoutubeError("No API key")
+
+    session = state['session']
+    # each check runs in a copy of our context, so its HTTP time is still
+    # counted against the request that asked (see metrics.observe_http)
+    oembeds = {
+        video_id: state['executor'].submit(contextvars.copy_context().run, _oembed_ok, session, video_id)
+        for video_id in missing
+    }
+    statuses = _fetch_statuses(session, missing)
+
+    for video_id in missing:
+        if video_id in statuses:
+            result = {"embeddable": statuses[video_id] and oembeds[video_id].result(), "found": True}
+            state['results'].set(video_id, result, ttl=YOUTUBE_CACHE_TTL)
+        else:
+            oembeds[video_id].cancel()
+            result = {"embeddable": False, "found": False}
+            state['results'].set(video_id, result, ttl=YOUTUBE_NEGATIVE_TTL)
+        results[video_id] = result
+    return results
+
+
+def check_video(video_id):
+    return check_videos([video_id])[video_id]
@@ -1,5 +1,6 @@
 import { useEffect, useState } from "react";
 import { deletePost } from "../utils/postActions";
+import { followPostChanges } from "../utils/postChanges";
 import { useNavigate } from "react-router-dom";
 
 
@@ -7,49 +8,74 @@ import { useNavigate } from "react-router-dom";
 export default function AboutEditor() {
     const [status, setStatus] = useState("");
     const [posts, setPosts] = useState([]);
+    const [selected, setSelected] = useState(new Set());
 
     const navigate = useNavigate();
 
-    // Fetch current about info
-    useEffect(() => {
-        fetch(`${import.meta.env.VITE_API_URL}/api/posts`, { credentials: "include" })
+    // load every post once, then apply changes as the stream reports them
+    useEffect(() => followPostChanges({
+        load: () => fetch(`${import.meta.env.VITE_API_URL}/api/posts?include_hidden=1`, { credentials: "include" })
             .then((res) => {
                 if (!res.ok) throw new Error("Network response was not ok");
                 return res.json();
-            })
-            .then(setPosts)
-            .catch(() => setStatus("Failed to load posts data."));
-    }, []);
+            }),
+        setPosts,
+        includeHidden: true,
+        onError: () => setStatus("Failed to load posts data.")
+    }), []);
 
-    const handleVisibilityChange = async (postId, newValue) => {
+    // applies operations in one request and merges the returned rows,
+    // so nothing needs re-fetching afterwards
+    const runBatch = async (operations) => {
         setStatus("Updating...");
         try {
-            const res = await fetch(`${import.meta.env.VITE_API_URL}/api/posts/${postId}`, {
-                method: "PUT",
+            const res = await fetch(`${import.meta.env.VITE_API_URL}/api/posts/batch`, {
+                method: "POST",
                 credentials: "include",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({
-                    is_visible: newValue ? 1 : 0
-                })
+                body: JSON.stringify({ operations })
             });
 
-            if (res.ok) {
-                setStatus("Updated successfully!");
-                const updatedPost = await fetch(`${import.meta.env.VITE_API_URL}/api/post/${postId}`, { credentials: "include" }).then(r => r.json());
-                setPosts((prev) => prev.map(
-                    p => p.id === postId ? updatedPost : p
-                ));
-
-            } else {
+            if (!res.ok) {
                 const text = await res.text();
                 setStatus(`Failed: ${text || "Server error"}`);
+                return;
             }
+
+            const { posts: updated, deleted } = await res.json();
+            const byId = new Map(updated.map((p) => [p.id, p]));
+            const gone = new Set(deleted);
+            setPosts((prev) => prev
+                .filter((p) => !gone.has(p.id))
+                .map((p) => byId.get(p.id) ?? p));
+            setSelected(new Set());
+            setStatus("Updated successfully!");
         } catch (error) {
             console.error("Update failed:", error);
             setStatus("Network error");
         }
     };
 
+    const handleVisibilityChange = (postId, newValue) =>
+        runBatch([{ op: "set_visibility", ids: [postId], is_visible: newValue }]);
+
+    const toggleSelected = (postId) => {
+        setSelected((prev) => {
+            const next = new Set(prev);
+            if (next.has(postId)) next.delete(postId);
+            else next.add(postId);
+            return next;
+        });
+    };
+
+    const handleBulkVisibility = (isVisible) =>
+        runBatch([{ op: "set_visibility", ids: [...selected], is_visible: isVisible }]);
+
+    const handleBulkDelete = () => {
+        if (!confirm(`Delete ${selected.size} posts?`)) return;
+        runBatch([{ op: "delete", ids: [...selected] }]);
+    };
+
     const handleDelete = async (postId) => deletePost(postId, setPosts);
 
     return (
@@ -60,9 +86,25 @@ export default function AboutEditor() {
                 <h3 className="text-2xl">Visibility</h3>
                 
             </div>          
+            {selected.size > 0 && (
+                <div className="flex flex-row gap-5 items-center">
+                    <span>{selected.size} selected</span>
+                    <button onClick={() => handleBulkVisibility(true)} className="hover:underline cursor-pointer">Show</button>
+                    <button onClick={() => handleBulkVisibility(false)} className="hover:underline cursor-pointer">Hide</button>
+                    <button onClick={handleBulkDelete} className="hover:underline cursor-pointer">Delete</button>
+                </div>
+            )}
             {posts.map((post) => (
                 <div key={post.id} className="grid grid-cols-4 items-center border-b border-gray-200 py-2 text-center">
-                    <h3 className="text-xl text-left">{post.title}</h3>
+                    <label className="flex items-center gap-2 text-left">
+                        <input
+                            type="checkbox"
+                            checked={selected.has(post.id)}
+                            onChange={() => toggleSelected(post.id)}
+                            className="cursor-pointer"
+                        />
+                        <h3 className="text-xl">{post.title}</h3>
+                    </label>
 
                     <button onClick={(id) => navigate(`/edit/${post.id}`)} className="hover:underline cursor-pointer">Edit</button>
                     <button onClick={() => handleDelete(post.id)} className="hover:underline cursor-pointer">Delete</button>
@@ -71,7 +113,7 @@ export default function AboutEditor() {
                     <label className="flex items-center gap-2 ml-auto">
                         <input
                             type="checkbox"
-                            checked={post.is_visible === 1}
+                            checked={Boolean(post.is_visible)}
                             onChange={(e) =>
                                 handleVisibilityChange(post.id, e.target.checked)
                             }
@@ -2,6 +2,30 @@ import { Link } from "react-router-dom";
 import React, { useEffect, useState } from "react";
 import YoutubeVideo from "./YoutubeVideo";
 
+const IMAGE_TYPES = { webp: "image/webp", avif: "image/avif", jpg: "image/jpeg", png: "image/png" };
+
+// one <source> per format, avif first, each listing every width we generated
+function imageSources(meta) {
+    const byFormat = {};
+    for (const v of meta?.variants || []) {
+        (byFormat[v.format] = byFormat[v.format] || []).push(`${v.href} ${v.width}w`);
+    }
+    return ["avif", "webp", "jpg", "png"]
+        .filter((format) => byFormat[format])
+        .map((format) => ({ type: IMAGE_TYPES[format], srcSet: byFormat[format].join(", ") }));
+}
+
+// peaks are 0-255 amplitudes precomputed by the backend, drawn as bars
+function Waveform({ peaks }) {
+    return (
+        <svg viewBox={`0 0 ${peaks.length} 255`} preserveAspectRatio="none" className="w-full h-12 text-gray-500" aria-hidden="true">
+            {peaks.map((peak, i) => (
+                <rect key={i} x={i} y={(255 - peak) / 2} width={0.8} height={Math.max(peak, 1)} fill="currentColor" />
+            ))}
+        </svg>
+    );
+}
+
 export default function PostCard({ post, isAuthenticated = false, onEdit, onDelete }) {
     return (
         <section name="post-card" className="flex flex-col gap-4 w-[90vw] md:w-[66vw] p-[1vw] border cursor-default">
@@ -11,14 +35,23 @@ export default function PostCard({ post, isAuthenticated = false, onEdit, onDele
 
             <div name="post-media" className={`min-w-0 ${post.media_type === 'video' || post.media_type === 'image' ? "self-center " : ""} ${post.media_type === 'none' ? "hidden" : ""}`}>
                 {post.media_type === "image" && post.media_href && (
-                    <img
-                        src={post.media_href}
-                        alt={post.title}
-                        className="w-[30vw]"
-                    />
+                    <picture>
+                        {imageSources(post.media_meta).map(({ type, srcSet }) => (
+                            <source key={type} type={type} srcSet={srcSet} sizes="30vw" />
+                        ))}
+                        <img
+                            src={post.media_href}
+                            alt={post.title}
+                            width={post.media_meta?.width}
+                            height={post.media_meta?.height}
+                            loading="lazy"
+                            decoding="async"
+                            className="w-[30vw] h-auto"
+                        />
+                    </picture>
                 )}
                 {post.media_type === "video" && post.media_href && (
-                    <YoutubeVideo url={post.media_href} parentStyling="w-[65vw] h-[40vw] sm:w-[65vw] sm:h-[40vw] md:w-[55vw] md:h-[35vw] lg:w-[45vw] lg:h-[30vw] [&_*]:w-full [&_*]:h-full "/>
+                    <YoutubeVideo url={post.media_href} embeddable={post.embeddable} parentStyling="w-[65vw] h-[40vw] sm:w-[65vw] sm:h-[40vw] md:w-[55vw] md:h-[35vw] lg:w-[45vw] lg:h-[30vw] [&_*]:w-full [&_*]:h-full "/>
                 )}
                 {post.media_type === "link" && post.media_href && (
                     <a href={post.media_href} target="_blank" rel="noopener noreferrer" className="underline hover:underline cursor-pointer text-gray-700 hover:text-gray-900 break-all">
@@ -26,11 +59,19 @@ export default function PostCard({ post, isAuthenticated = false, onEdit, onDele
                     </a>
                 )}
                 {post.media_type === "audio" && post.media_href && (
-                    <audio src={post.media_href} controls className="w-full rounded-lg bg-gray-100 " />
+                    <div className="flex flex-col gap-2 w-full">
+                        {post.media_meta?.peaks?.length > 0 && <Waveform peaks={post.media_meta.peaks} />}
+                        <audio controls preload="none" className="w-full rounded-lg bg-gray-100 ">
+                            {(post.media_meta?.renditions || []).map((r) => (
+                                <source key={r.href} src={r.href} type={r.content_type} />
+                            ))}
+                            <source src={post.media_href} />
+                        </audio>
+                    </div>
                 )}
             </div>
             <div className="mt-auto flex flex-row cursor-auto">
-                {post.writeup && (
+                {(post.writeup || post.has_writeup) && (
                     <Link to={`/post/${post.id}`} className="hover:underline italic cursor-pointer">Read More</Link>
                 )}
                 {isAuthenticated && (
@@ -11,15 +11,16 @@ function extractYouTubeId(url) {
     return match ? match[1] : null;
 }
 
-export default function YoutubeVideo({ url , parentStyling }) {
+export default function YoutubeVideo({ url , parentStyling, embeddable }) {
     const [videoId, setVideoId] = useState(null);
-    const [canEmbed, setCanEmbed] = useState(true);
+    // embeddable comes from the check the backend ran when the post was saved
+    const [canEmbed, setCanEmbed] = useState(embeddable !== false);
 
     useEffect(() => {
         const id = extractYouTubeId(url);
         setVideoId(id);
-        setCanEmbed(true); // Reset on URL change
-    }, [url]);
+        setCanEmbed(embeddable !== false); // Reset on URL change
+    }, [url, embeddable]);
 
     const options = {
         width: "100%",
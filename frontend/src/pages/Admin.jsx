@@ -4,6 +4,7 @@ import { useNavigate } from "react-router-dom";
 import { useOutletContext } from "react-router-dom";
 import AboutEditor from "../components/AboutEditor";
 import AllPostsEditor from "../components/AllPostsEditor";
+import { uploadMedia } from "../utils/uploadMedia";
 
 
 export default function Admin({setIsAuthenticated}) {
@@ -19,44 +20,6 @@ export default function Admin({setIsAuthenticated}) {
 
     const [tab, setTab] = useState("post");
 
-    const uploadToS3 = async (file) => {
-        const ext = file.name.split(".").pop();
-
-        const presignRes = await fetch(
-            `${import.meta.env.VITE_API_URL}/api/uploads/presign`,
-            {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                credentials: "include",
-                body: JSON.stringify({
-                    content_type: file.type,
-                    file_ext: ext
-                })
-            }
-        );
-
-        if (!presignRes.ok) {
-            throw new Error("Failed to get presigned URL");
-        }
-
-        const { upload_url, public_url } = await presignRes.json();
-
-        const uploadRes = await fetch(upload_url, {
-            method: "PUT",
-            headers: {
-                "Content-Type": file.type
-            },
-            body: file
-        });
-
-        if (!uploadRes.ok) {
-            throw new Error("S3 upload failed");
-        }
-
-        return public_url;
-    };
-
-
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -65,12 +28,12 @@ export default function Admin({setIsAuthenticated}) {
         try {
             let finalMediaHref = mediaHref || null;
 
-            // 1. Upload image/audio directly to S3
+            // 1. Upload image/audio (chunked, deduplicated by content hash)
             if (
                 (mediaType === "image" || mediaType === "audio") &&
                 mediaFile
             ) {
-                finalMediaHref = await uploadToS3(mediaFile);
+                finalMediaHref = await uploadMedia(mediaFile);
             }
 
             // 2. Create post (JSON only)
@@ -1,5 +1,6 @@
 import { useParams, useNavigate, useOutletContext } from "react-router-dom";
 import { useState, useEffect } from "react";
+import { uploadMedia } from "../utils/uploadMedia";
 
 export default function EditPost() {
     const { postId } = useParams();
@@ -15,7 +16,7 @@ export default function EditPost() {
     const [isVisible, setIsVisible] = useState(false);
 
     useEffect(() => {
-        fetch(`${import.meta.env.VITE_API_URL}/api/post/${postId}`, {
+        fetch(`${import.meta.env.VITE_API_URL}/api/post/${postId}?include_hidden=1`, {
             credentials: "include"
         })
         .then(res => {
@@ -62,45 +63,6 @@ export default function EditPost() {
     };
 
 
-    const uploadToS3 = async (file) => {
-        const ext = file.name.split(".").pop();
-
-        const presignRes = await fetch(
-            `${import.meta.env.VITE_API_URL}/api/uploads/presign`,
-            {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                credentials: "include",
-                body: JSON.stringify({
-                    content_type: file.type,
-                    file_ext: ext
-                })
-            }
-        );
-
-        if (!presignRes.ok) {
-            throw new Error("Failed to get presigned URL");
-        }
-
-        const { upload_url, public_url } = await presignRes.json();
-
-        const uploadRes = await fetch(upload_url, {
-            method: "PUT",
-            headers: {
-                "Content-Type": file.type || "application/octet-stream"
-            },
-            body: file
-        });
-
-        if (!uploadRes.ok) {
-            throw new Error("S3 upload failed");
-        }
-
-        return public_url;
-    };
-
-
-
     const handleSubmit = async (e) => {
         e.preventDefault();
         setGlobalLoading(true);
@@ -113,7 +75,7 @@ export default function EditPost() {
                 (mediaType === "image" || mediaType === "audio") &&
                 mediaFile
             ) {
-                finalMediaHref = await uploadToS3(mediaFile);
+                finalMediaHref = await uploadMedia(mediaFile);
             }
 
             // Explicitly clear media
@@ -1,27 +1,69 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import PostCard from "../components/PostCard";
 import { deletePost } from "../utils/postActions";
+import { fetchFeedPage } from "../utils/publicContent";
+import { byNewest, followPostChanges, mergeOlderPosts } from "../utils/postChanges";
 import { useOutletContext } from "react-router-dom";
 
+// the feed never shows writeups, so only ask for the card fields
+const FIELDS = "id,title,blurb,media_type,media_href,timestamp,is_visible,embeddable,media_meta,has_writeup";
+
 export default function Home({ isAuthenticated }) {
     const [posts, setPosts] = useState([]);
+    // the next older page, and the oldest post of the pages loaded so far
+    const [next, setNext] = useState(null);
+    const [oldest, setOldest] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [margins, setMargins] = useState([]);    
     const [screenWidth, setScreenWidth] = useState(window.innerWidth);
+    const moreRef = useRef(null);
 
     const navigate = useNavigate();
     const { setGlobalLoading } = useOutletContext();
 
     useEffect(() => {
-        
-        fetch(`${ import.meta.env.VITE_API_URL}/api/posts`, { credentials: "include" })
-            .then((res) => {
-                if (!res.ok) throw new Error("Network response was not ok");
-                return res.json();
-            })
-            .then(setPosts)
-            .catch((err) => console.error("Fetch posts failed:", err));
-    }, []);
+        // the newest page is loaded first, then kept current from the change
+        // stream where the server offers one; a visitor turned away with 204
+        // isn't retried
+        return followPostChanges({
+            load: async () => {
+                const page = await fetchFeedPage(FIELDS, isAuthenticated);
+                setNext(page.next);
+                setOldest(page.posts[page.posts.length - 1] || null);
+                return page.posts;
+            },
+            setPosts,
+            fields: FIELDS,
+            reopen: isAuthenticated,
+            onError: (err) => console.error("Fetch posts failed:", err)
+        });
+    }, [isAuthenticated]);
+
+    // older pages load only when the reader gets to the end of the list
+    const loadMore = async () => {
+        if (!next || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchFeedPage(FIELDS, isAuthenticated, next);
+            setPosts((current) => mergeOlderPosts(current, page.posts));
+            setNext(page.next);
+            if (page.posts.length) setOldest(page.posts[page.posts.length - 1]);
+        } catch (err) {
+            console.error("Fetch older posts failed:", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    useEffect(() => {
+        if (!next || !moreRef.current || typeof IntersectionObserver === "undefined") return;
+        const observer = new IntersectionObserver((entries) => {
+            if (entries[0].isIntersecting) loadMore();
+        });
+        observer.observe(moreRef.current);
+        return () => observer.disconnect();
+    });
 
     useEffect(() => {
         const onResize = () => setScreenWidth(window.innerWidth);
@@ -42,10 +84,13 @@ export default function Home({ isAuthenticated }) {
 
     const handleDelete = (postId) => deletePost(postId, setPosts);
 
+    // a change to a post on a page we haven't loaded waits for that page
+    const shown = next && oldest ? posts.filter((post) => byNewest(post, oldest) <= 0) : posts;
+
     return (
         <div className="posts my-[2vw] mx-[2vw] md:mx-[1vw] lg:mx-[2vw] flex flex-col gap-5">
-            {posts.map((post, index) => {
-                if (post.is_visible !== 1) return null;
+            {shown.map((post, index) => {
+                if (!post.is_visible) return null;
 
                 const style =
                     screenWidth < 768
@@ -63,6 +108,16 @@ export default function Home({ isAuthenticated }) {
                     </div>
                 );
             })}
+            {next && (
+                <button
+                    ref={moreRef}
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="self-center border cursor-pointer p-2 bg-gray-100 hover:bg-gray-200 rounded-md"
+                >
+                    {loadingMore ? "Loading..." : "Load more"}
+                </button>
+            )}
         </div>
     );
 }
@@ -3,6 +3,7 @@ import { useEffect, useState } from "react";
 import { useParams } from "react-router-dom";
 import YoutubeVideo from "../components/YoutubeVideo";
 import { deletePost } from "../utils/postActions";
+import { fetchPost } from "../utils/publicContent";
 import { useNavigate } from "react-router-dom";
 
 
@@ -18,10 +19,10 @@ export default function PostPage({ isAuthenticated = false, onEdit, onDelete })
     };
 
     useEffect(() => {
-        fetch(`${ import.meta.env.VITE_API_URL }/api/post/${id}`, { credentials: "include" })
-            .then((res) => res.json())
-            .then(setPost);
-        }, [id]);
+        fetchPost(id, isAuthenticated)
+            .then(setPost)
+            .catch(() => setPost(null));
+        }, [id, isAuthenticated]);
 
     if (!post) return <p className="m-[5vw] text-center">NO POST FOUND</p>;
 
@@ -0,0 +1,99 @@
+// src/utils/postChanges.js
+// Keeps a loaded post list current from /api/posts/changes instead of
+// re-fetching it. The stream opens before the list loads and its events
+// are held until the list arrives, so nothing written in between is lost.
+// Visitors only get a stream where the server offers one to them (gevent
+// workers); otherwise it answers 204 and the list stays as it loaded.
+const API = import.meta.env.VITE_API_URL;
+// the browser doesn't reconnect after an error response, e.g. a 401 once
+// the admin's session expired
+const REOPEN_MS = 30000;
+
+export function byNewest(a, b) {
+    return new Date(b.timestamp) - new Date(a.timestamp) || b.id - a.id;
+}
+
+// created/updated carry the post as it is now, so both are upserts
+export function applyPostChange(posts, type, change) {
+    const rest = posts.filter((p) => p.id !== change.id);
+    if (type === "deleted") return rest;
+    const previous = posts.find((p) => p.id === change.id);
+    return [...rest, { ...previous, ...change }].sort(byNewest);
+}
+
+// an older page only adds posts we don't have; ours may be more recent
+export function mergeOlderPosts(posts, older) {
+    const known = new Set(posts.map((p) => p.id));
+    return [...posts, ...older.filter((p) => !known.has(p.id))].sort(byNewest);
+}
+
+export function followPostChanges({ load, setPosts, fields = null, includeHidden = false, onError = null, reopen = true }) {
+    if (typeof EventSource === "undefined") {
+        load().then(setPosts).catch(onError);
+        return () => {};
+    }
+
+    let source = null;
+    let pending = [];
+    let closed = false;
+    let lastId = null;
+    let reopenTimer = null;
+    // a stream that failed before its first "ready" (e.g. a full server sent
+    // just a retry delay) starts later than the list loaded, so reload then
+    let ready = false;
+    let interrupted = false;
+
+    const reload = () => {
+        pending = [];
+        load()
+            .then((posts) => {
+                if (closed) return;
+                const held = pending;
+                pending = null;
+                setPosts(held.reduce((list, [type, change]) => applyPostChange(list, type, change), posts));
+            })
+            .catch((err) => onError?.(err));
+    };
+
+    const onChange = (event) => {
+        lastId = event.lastEventId;
+        const change = JSON.parse(event.data);
+        if (pending) pending.push([event.type, change]);
+        else setPosts((posts) => applyPostChange(posts, event.type, change));
+    };
+
+    const open = () => {
+        const params = new URLSearchParams();
+        if (fields) params.set("fields", fields);
+        if (includeHidden) params.set("include_hidden", "1");
+        // a new EventSource doesn't send Last-Event-ID, so say where we were
+        if (lastId) params.set("since", lastId);
+        source = new EventSource(`${API}/api/posts/changes?${params}`, { withCredentials: true });
+        source.addEventListener("ready", (event) => {
+            lastId = event.lastEventId;
+            if (!ready && interrupted && !pending) reload();
+            ready = true;
+        });
+        source.addEventListener("created", onChange);
+        source.addEventListener("updated", onChange);
+        source.addEventListener("deleted", onChange);
+        // we fell further behind than the server's change log goes back
+        source.addEventListener("reset", (event) => {
+            lastId = event.lastEventId;
+            reload();
+        });
+        source.onerror = () => {
+            if (!ready) interrupted = true;
+            if (source.readyState !== EventSource.CLOSED || closed || !reopen) return;
+            reopenTimer = setTimeout(open, REOPEN_MS);
+        };
+    };
+
+    open();
+    reload();
+    return () => {
+        closed = true;
+        clearTimeout(reopenTimer);
+        source.close();
+    };
+}
@@ -0,0 +1,82 @@
+// src/utils/publicContent.js
+// Public pages read the static snapshots (backend/snapshot.py) when
+// VITE_SNAPSHOT_URL is set, so visitors never hit the API. The admin reads
+// the API, to see hidden posts and their own edits at once, and so does
+// anyone whose snapshot fetch fails (e.g. before the first publish).
+const API = import.meta.env.VITE_API_URL;
+const SNAPSHOT_URL = import.meta.env.VITE_SNAPSHOT_URL;
+const snapshotBase = SNAPSHOT_URL
+    ? new URL(SNAPSHOT_URL.replace(/\/?$/, "/"), window.location.href)
+    : null;
+
+async function getJson(url, options) {
+    const res = await fetch(url, options);
+    if (!res.ok) {
+        const err = new Error(`Fetching ${url} failed: ${res.status}`);
+        err.status = res.status;
+        throw err;
+    }
+    return res.json();
+}
+
+async function fromSnapshot(isAuthenticated, read) {
+    if (!snapshotBase || isAuthenticated) return undefined;
+    try {
+        return await read();
+    } catch (err) {
+        console.warn("Snapshot read failed, using the API:", err);
+        return undefined;
+    }
+}
+
+// same page size as the API's default
+const FEED_PAGE_SIZE = 20;
+
+async function snapshotFeedPage(url) {
+    const page = await getJson(url);
+    return { posts: page.posts, next: page.next ? { snapshot: new URL(page.next, url).href } : null };
+}
+
+// keyset pages: the next one is the same query with the cursor it returned
+async function apiFeedPage(url) {
+    const res = await fetch(url, { credentials: "include" });
+    if (!res.ok) {
+        const err = new Error(`Fetching ${url} failed: ${res.status}`);
+        err.status = res.status;
+        throw err;
+    }
+    const posts = await res.json();
+    const cursor = res.headers.get("X-Next-Cursor");
+    if (!cursor) return { posts, next: null };
+    const next = new URL(url, window.location.href);
+    next.searchParams.set("cursor", cursor);
+    return { posts, next: { api: next.href } };
+}
+
+// One page of the feed, newest first, as {posts, next}. Without `next` it
+// is the first page; pass a page's `next` for the one after it, which
+// comes from the same source. next is null on the last page.
+export async function fetchFeedPage(fields, isAuthenticated = false, next = null) {
+    if (next?.snapshot) return snapshotFeedPage(next.snapshot);
+    if (next?.api) return apiFeedPage(next.api);
+    const page = await fromSnapshot(isAuthenticated, () => snapshotFeedPage(new URL("feed/index.json", snapshotBase)));
+    if (page !== undefined) return page;
+    return apiFeedPage(`${API}/api/posts?fields=${fields}&limit=${FEED_PAGE_SIZE}`);
+}
+
+export async function fetchPost(id, isAuthenticated = false) {
+    const post = await fromSnapshot(isAuthenticated, () => getJson(new URL(`posts/${id}.json`, snapshotBase)));
+    if (post !== undefined) return post;
+    try {
+        return await getJson(`${API}/api/post/${id}`, { credentials: "include" });
+    } catch (err) {
+        if (err.status === 404) return null;
+        throw err;
+    }
+}
+
+export async function fetchAbout(isAuthenticated = false) {
+    const about = await fromSnapshot(isAuthenticated, () => getJson(new URL("about.json", snapshotBase)));
+    if (about !== undefined) return about;
+    return getJson(`${API}/api/about`, { credentials: "include" });
+}
@@ -0,0 +1,118 @@
+// src/utils/uploadMedia.js
+// Uploads through /api/uploads. Files are stored under their sha256, so
+// media the server already has completes without sending bytes. With S3
+// storage the file goes straight to the bucket on a presigned PUT; with
+// local storage it is sent in chunks, and a dropped chunk is retried from
+// the last offset the server acknowledged.
+const API = import.meta.env.VITE_API_URL;
+const MAX_RETRIES = 5;
+
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+
+async function sha256Hex(file) {
+    // crypto.subtle only exists on https and localhost; without it the
+    // server still hashes the file, we just can't skip the upload
+    if (!window.crypto?.subtle) return null;
+    const digest = await crypto.subtle.digest("SHA-256", await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+async function request(path, options = {}) {
+    const res = await fetch(`${API}${path}`, { credentials: "include", ...options });
+    const body = res.status === 204 ? null : await res.json().catch(() => null);
+    return { res, body };
+}
+
+async function currentOffset(uploadId) {
+    const { res, body } = await request(`/api/uploads/${uploadId}`);
+    if (!res.ok) throw new Error(body?.error || "Upload session lost");
+    return body.offset;
+}
+
+// the whole file in one PUT to the bucket, never through our API
+async function uploadDirect(file, { upload_url, method, headers, public_url }, onProgress) {
+    let failures = 0;
+    for (;;) {
+        let res;
+        try {
+            res = await fetch(upload_url, { method, headers, body: file });
+        } catch (err) {
+            if (++failures > MAX_RETRIES) throw err;
+            await sleep(500 * 2 ** failures);
+            continue;
+        }
+        if (res.ok) break;
+        if (res.status < 500 || ++failures > MAX_RETRIES) {
+            throw new Error(`Upload failed: ${res.status}`);
+        }
+        await sleep(500 * 2 ** failures);
+    }
+    onProgress?.(1);
+    return public_url;
+}
+
+export async function uploadMedia(file, onProgress = null) {
+    const sha256 = await sha256Hex(file);
+
+    const started = await request("/api/uploads", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ content_type: file.type, size: file.size, sha256 })
+    });
+    if (!started.res.ok) {
+        throw new Error(started.body?.error || "Failed to start upload");
+    }
+    if (started.body.complete) {
+        onProgress?.(1);
+        return started.body.public_url;
+    }
+    if (started.body.direct) {
+        return uploadDirect(file, started.body, onProgress);
+    }
+
+    const { upload_id: uploadId, chunk_size: chunkSize } = started.body;
+    let offset = started.body.offset;
+    let failures = 0;
+
+    while (offset < file.size) {
+        let res, body;
+        try {
+            ({ res, body } = await request(`/api/uploads/${uploadId}`, {
+                method: "PATCH",
+                headers: {
+                    "Content-Type": "application/offset+octet-stream",
+                    "Upload-Offset": String(offset)
+                },
+                body: file.slice(offset, offset + chunkSize)
+            }));
+        } catch (err) {
+            // network error: back off, then resume wherever the server got to
+            if (++failures > MAX_RETRIES) throw err;
+            await sleep(500 * 2 ** failures);
+            offset = await currentOffset(uploadId);
+            continue;
+        }
+
+        if (res.ok || res.status === 409) {
+            // 409 means we were out of step; the body says where to resume
+            offset = body.offset;
+            failures = 0;
+            onProgress?.(offset / file.size);
+        } else if (res.status >= 500 && ++failures <= MAX_RETRIES) {
+            await sleep(500 * 2 ** failures);
+            offset = await currentOffset(uploadId);
+        } else {
+            throw new Error(body?.error || "Upload failed");
+        }
+    }
+
+    const finished = await request(`/api/uploads/${uploadId}/finalize`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ sha256 })
+    });
+    if (!finished.res.ok) {
+        throw new Error(finished.body?.error || "Failed to finish upload");
+    }
+    return finished.body.public_url;
+}